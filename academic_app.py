@@ -1,12 +1,20 @@
 import streamlit as st
-import google.generativeai as genai
-import requests
 import pandas as pd
-import re
 import json
-from urllib.parse import unquote
 import time
 
+from s2_crawler import SORT_KEYS, EdgePageError
+from segment_prefetch import SegmentPrefetcher
+from citation_graph import crawl_citation_graph
+from graph_rank import ORDERINGS, lineage_scores
+from lineage_delta import extract_summary, merge_report
+from stream_render import render_stream
+from lineage_index import LineageIndex
+from academic_core import (s2, store, llm_cache, build_author_prompt, build_deep_analysis_prompt, build_historian_prompt,
+                           build_incremental_prompt, enrich_segment, fetch_author_profile, fetch_network_skeleton,
+                           generate_multilingual_abstract, make_window_loader, reopen_frontiers, search_broad_papers,
+                           stream_gemini)
+
 # ==========================================
 # 0. 基礎設定與 CSS
 # ==========================================
@@ -56,203 +64,33 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==========================================
-# 1. 核心搜尋引擎
+# 1. 串流渲染與存檔 (需要 Streamlit；其餘邏輯在 academic_core.py)
 # ==========================================
-HEADERS = {"User-Agent": "AcademicRadar/12.9"}
-
-LIGHT_FIELDS = "paperId,title,year,citationCount,venue,authors.name,references.paperId,references.citationCount,references.year,citations.paperId,citations.citationCount,citations.year"
-RICH_FIELDS = "paperId,title,year,citationCount,venue,authors.name,authors.authorId,abstract,tldr"
-BROAD_FIELDS = "paperId,title,year,citationCount,venue,authors.name,abstract,tldr"
-AUTHOR_FIELDS = "authorId,name,citationCount,hIndex,paperCount,papers.title,papers.year,papers.citationCount,papers.venue"
-
-@st.cache_data(ttl=3600, show_spinner=False)
-def search_broad_papers(query, limit=10):
-    if not query: return []
-    try:
-        r = requests.get("https://api.semanticscholar.org/graph/v1/paper/search", params={"query": query, "limit": limit, "fields": BROAD_FIELDS}, headers=HEADERS, timeout=10)
-        if r.status_code == 200: return r.json().get('data', [])
-    except: pass
-    return []
-
-@st.cache_data(ttl=3600, show_spinner=False)
-def fetch_network_skeleton(user_input):
-    clean_input = unquote(user_input).strip().replace('"', '')
-    lookup_id = None
-    doi_match = re.search(r'(10\.\d{4,9}/[-._;()/:a-zA-Z0-9]+)', clean_input)
-    arxiv_match = re.search(r'(\d{4}\.\d{4,5})', clean_input)
-    
-    if doi_match: lookup_id = f"DOI:{doi_match.group(1)}"
-    elif arxiv_match: lookup_id = f"arXiv:{arxiv_match.group(1)}"
-    
-    def fetch(pid):
-        try:
-            r = requests.get(f"https://api.semanticscholar.org/graph/v1/paper/{pid}", params={"fields": LIGHT_FIELDS}, headers=HEADERS, timeout=10)
-            if r.status_code == 200: return r.json()
-        except: pass
-        return None
-
-    hero = fetch(lookup_id) if lookup_id else None
-    if not hero:
-        try:
-            r = requests.get("https://api.semanticscholar.org/graph/v1/paper/search", params={"query": clean_input, "limit": 1, "fields": "paperId"}, headers=HEADERS)
-            if r.status_code == 200 and r.json().get('data'):
-                hero = fetch(r.json()['data'][0]['paperId'])
-        except: pass
-        
-    if not hero or not hero.get('paperId'): return None
-    
-    refs = sorted([r for r in (hero.get('references') or []) if r.get('paperId')], key=lambda x: (x.get('citationCount') or 0), reverse=True)
-    cites = sorted([c for c in (hero.get('citations') or []) if c.get('paperId')], key=lambda x: (x.get('year') or 0), reverse=True)
-    
-    return {'hero': hero, 'all_ancestors': refs, 'all_descendants': cites}
-
-def enrich_segment(paper_objects):
-    if not paper_objects: return []
-    ids = [p['paperId'] for p in paper_objects if p.get('paperId')]
-    if not ids: return paper_objects
-    
-    enriched_map = {}
-    try:
-        r = requests.post("https://api.semanticscholar.org/graph/v1/paper/batch", params={"fields": RICH_FIELDS}, json={"ids": ids}, headers=HEADERS, timeout=10)
-        if r.status_code == 200:
-            for p in r.json():
-                if p: enriched_map[p['paperId']] = p
-    except: pass
-        
-    enriched_list = []
-    for p in paper_objects:
-        pid = p['paperId']
-        if pid in enriched_map:
-            full_data = enriched_map[pid]
-            if 'code' in p: full_data['code'] = p['code']
-            enriched_list.append(full_data)
-        else:
-            enriched_list.append(p)
-    return enriched_list
-
-def fetch_author_profile_no_cache(author_id):
-    try:
-        r = requests.get(f"https://api.semanticscholar.org/graph/v1/author/{author_id}", params={"fields": AUTHOR_FIELDS}, headers=HEADERS, timeout=10)
-        if r.status_code == 200: return r.json()
-    except: pass
-    return None
-
-# ==========================================
-# 2. AI Prompt
-# ==========================================
-def generate_deep_analysis_classic(hero, ancestors, descendants, api_key, model_name):
-    genai.configure(api_key=api_key)
-    
-    def format_paper(p, code):
-        title = p.get('title', 'Unknown Title')
-        year = p.get('year', 'N/A')
-        cite = p.get('citationCount', 0)
-        
-        auth_list = p.get('authors', [])
-        if not auth_list: auth_str = "Unknown"
-        elif len(auth_list) <= 4:
-            auth_str = ", ".join([a.get('name','?') for a in auth_list])
-        else:
-            first = auth_list[0].get('name', '?')
-            last_3 = [a.get('name','?') for a in auth_list[-3:]]
-            auth_str = f"First:{first} ... Last3:{', '.join(last_3)}"
-        
-        return f"[{code}] {title} ({year}) | {auth_str} | Cited:{cite}"
-
-    context = f"主角論文: {format_paper(hero, 'Hero')}\n\n"
-    context += "【祖先文獻】:\n" + "\n".join([format_paper(a, a.get('code','A')) for a in ancestors]) + "\n\n"
-    context += "【後代文獻】:\n" + "\n".join([format_paper(d, d.get('code','D')) for d in descendants])
-
-    system_prompt = """
-    你是一位精通「學術系譜學」的 AI 專家。
-    請基於提供的論文列表，進行深度的數據推論、概念流變分析，並預測未來的可能性。
-    
-    【重要指令】：
-    1. **語言**：所有輸出必須使用 **繁體中文 (Traditional Chinese, Taiwan)**。
-    2. **表格呈現**：概念流變請務必使用 **Markdown 表格** 呈現。
-    
-    【輸出報告格式】：
-    ### 📜 學術雷達深度報告
-    
-    #### 1. 🌊 概念流變表 (Concept Flow Table)
-    | 階段 | 核心關鍵詞 | 演變描述 |
-    | :--- | :--- | :--- |
-    | **A系列 (起源)** | ... | ... |
-    | **Hero (轉折)** | ... | ... |
-    | **D系列 (應用)** | ... | ... |
-    
-    #### 2. 🧩 領域分類與聚類
-    * **群組 A (理論基石)**：[A1], [A3]...
-    * **群組 B (方法突破)**：[Hero], [D1]...
-    
-    #### 3. 👑 領域領袖與師承
-    * **核心實驗室 (PI)**：(觀察作者群的最後幾位，推論核心實驗室)
-    * **第一作者 (執行者)**：(觀察第一作者的貢獻)
-    
-    #### 4. 🔗 技術演進詳解
-    **4.1 ⏪ 向前溯源**
-    * **[A?]** (PI: ...): **[貢獻]** ... 
-    
-    **4.2 ⏩ 向後展望**
-    * **[D?]** (PI: ...): **[貢獻]** ... 
-    
-    #### 5. 🔮 未來可能性圓錐 (The Cone of Possibilities)
-    *(針對 Hero 論文，預測未來)*
-    * **🎯 核心 (Probable)**：...
-    * **🚀 擴展 (Plausible)**：...
-    * **🌌 邊界 (Possible)**：...
+def stream_into(placeholder, prompt, api_key, model_name, wrap=lambda t: t):
     """
-    try:
-        model = genai.GenerativeModel(model_name)
-        return model.generate_content(system_prompt + context).text
-    except Exception as e: return f"分析失敗: {str(e)}"
-
-def generate_author_analysis(author_name, selected_papers, api_key, model_name):
-    genai.configure(api_key=api_key)
-    
-    papers_str = "\n".join([f"- {p.get('title', 'Unknown')} ({p.get('year', 'N/A')}) | Cited: {p.get('citationCount', 0)}" for p in selected_papers])
-    
-    system_prompt = f"""
-    你是一位「學術星探」。請分析這位 PI (或研究員)。
-    【注意】：**已排除同名同姓的干擾資料**，以下提供的論文確定皆為同一人所著。
-    
-    【檔案】姓名: {author_name}
-    【經確認的代表作】:
-    {papers_str}
-    
-    【任務】：請用**條列式**分析：
-    1. **學術江湖地位** (是資深大佬、實驗室主持人，還是新銳研究員？)
-    2. **核心研究版圖** (根據上述論文，精準定位其專長)
-    3. **研究風格與專長**
+    把 Gemini 串流節流渲染到 placeholder，回傳 (全文, 例外或 None)。
+    中途出錯時全文為已產生的部分加上錯誤說明，不會整份報告丟失。
     """
+    def render(text, done):
+        visible = extract_summary(text)[0]
+        placeholder.markdown(wrap(visible if done else visible + "▌"), unsafe_allow_html=True)
     try:
-        model = genai.GenerativeModel(model_name)
-        return model.generate_content(system_prompt).text
-    except Exception as e: return f"分析失敗: {str(e)}"
+        chunks = stream_gemini(prompt, api_key, model_name)
+    except Exception as e:
+        render(f"分析失敗: {str(e)}", True)
+        return f"分析失敗: {str(e)}", e
+    return render_stream(chunks, render)
 
-def ask_historian(question, context_data, api_key, model_name):
-    genai.configure(api_key=api_key)
-    prompt = f"""你是一位學術顧問。請用繁體中文回答。\n背景：{str(context_data)[:3000]}\n問題：「{question}」"""
-    try:
-        model = genai.GenerativeModel(model_name)
-        return model.generate_content(prompt).text
-    except: return "回答失敗"
-
-def generate_multilingual_abstract(text_content, api_key, model_name):
-    genai.configure(api_key=api_key)
-    prompt = f"""請將報告總結為 **100 字摘要**。輸出：繁體中文、English、日本語。\n內容：\n{text_content[:2000]}"""
-    try:
-        model = genai.GenerativeModel(model_name)
-        return model.generate_content(prompt).text
-    except: return "摘要生成失敗"
+def report_html(text):
+    return f'<div class="report-container">{text}</div>'
 
 # 存檔功能
 def export_state_to_json():
-    data = {k: st.session_state[k] for k in ['skeleton', 'full_lineage', 'offsets', 'deep_dive_result', 'pi_analysis_result'] if k in st.session_state}
+    data = {k: st.session_state[k] for k in ['skeleton', 'full_lineage', 'offsets', 'deep_dive_result', 'pi_analysis_result', 'lineage_summary'] if k in st.session_state}
     return json.dumps(data, default=str)
 
 # ==========================================
-# 3. UI 邏輯
+# 2. UI 邏輯
 # ==========================================
 if 'skeleton' not in st.session_state: st.session_state.skeleton = None
 if 'full_lineage' not in st.session_state: st.session_state.full_lineage = {'hero': {}, 'ancestors': [], 'descendants': []}
@@ -263,6 +101,11 @@ if 'chat_history' not in st.session_state: st.session_state.chat_history = []
 if 'pre_fill_doi' not in st.session_state: st.session_state.pre_fill_doi = ""
 if 'read_only_mode' not in st.session_state: st.session_state.read_only_mode = False
 if 'pi_raw_data' not in st.session_state: st.session_state.pi_raw_data = None 
+if 'frontiers' not in st.session_state: st.session_state.frontiers = {}
+if 'prefetcher' not in st.session_state: st.session_state.prefetcher = SegmentPrefetcher(enrich_segment)
+if 'citation_graph' not in st.session_state: st.session_state.citation_graph = None
+if 'lineage_ordering' not in st.session_state: st.session_state.lineage_ordering = "default"
+if 'lineage_summary' not in st.session_state: st.session_state.lineage_summary = None
 
 with st.sidebar:
     st.title("🔬 參數設定")
@@ -277,6 +120,16 @@ with st.sidebar:
         api_key = st.text_input("Gemini API Key", type="password")
     
     model_name = st.selectbox("模型", ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.5-flash-lite"], index=0)
+    incremental_mode = st.toggle("⚡ 增量分析", value=True, help="擴展祖先/後代時，只把新增論文與系譜摘要送給 AI，再併回原報告")
+    st.session_state.prefetcher.depth = st.slider("背景預取段數", 0, 5, 2, help="初次挖掘後，先在背景準備好接下來幾段祖先/後代 (每段 5 篇)")
+    
+    with st.expander("📶 Semantic Scholar 連線狀態", expanded=False):
+        s2_stats = s2.stats()
+        st.caption(f"請求 {s2_stats['requests']} | 成功 {s2_stats['hits']} | 重試 {s2_stats['retries']} | 節流 (429) {s2_stats['throttles']} | 錯誤 {s2_stats['errors']}")
+        store_stats = store.stats()
+        st.caption(f"本地快取：{store_stats['entries']} 筆 / {store_stats['bytes'] / 1024 / 1024:.1f} MB")
+        llm_stats = llm_cache.hit_stats()
+        st.caption(f"AI 回應快取：命中 {llm_stats['hits']} / 未命中 {llm_stats['misses']}")
     
     st.divider()
     st.markdown("### 📥 知識庫存檔")
@@ -291,6 +144,10 @@ with st.sidebar:
                 if uploaded_file.name.endswith(".json"):
                     data = json.load(uploaded_file)
                     for k, v in data.items(): st.session_state[k] = v
+                    st.session_state.frontiers = reopen_frontiers(st.session_state.get('skeleton'))
+                    st.session_state.prefetcher.reset(None, None)
+                    st.session_state.citation_graph = None
+                    st.session_state.lineage_ordering = "default"
                     st.session_state.read_only_mode = False
                     st.toast("✅ JSON 進度還原成功！")
                     time.sleep(1)
@@ -309,6 +166,41 @@ st.title("🧬 學術雷達 V12.9 (Future Proof)")
 st.caption("核心：**同名同姓篩選** + **Streamlit 參數修正** + **Secrets 管理**。")
 
 # === 核心處理邏輯 ===
+def get_lineage_index():
+    """full_lineage 的代號編排與視圖快取；full_lineage 被整個換掉 (新主角 / JSON 還原) 時重建。"""
+    idx = st.session_state.get('lineage_index')
+    if idx is None or idx.lineage is not st.session_state.full_lineage:
+        idx = LineageIndex(st.session_state.full_lineage)
+        st.session_state.lineage_index = idx
+    return idx
+
+def fetch_window(side, start):
+    """優先取用背景預取好的分段，沒有才同步 enrich。"""
+    pf = st.session_state.prefetcher
+    enriched = pf.take(side, start)
+    if enriched is None:
+        enriched = enrich_segment(make_window_loader(st.session_state.skeleton, st.session_state.frontiers)(side, start))
+    return enriched
+
+def apply_lineage_ordering(ordering):
+    """依多跳引用網絡的分數重排「尚未展開」的祖先 / 後代；已展開的代號不變。"""
+    sk = st.session_state.skeleton
+    hero_id = sk['hero'].get('paperId')
+    off = st.session_state.offsets
+    scores = lineage_scores(st.session_state.citation_graph, hero_id, ordering)
+    for side, key, base in (('a', 'all_ancestors', SORT_KEYS['citationCount']), ('d', 'all_descendants', SORT_KEYS['year'])):
+        frontier = st.session_state.frontiers.get(side)
+        if frontier and frontier.paper_id == hero_id:
+            frontier.set_priority(scores[side], keep=off[side])
+        else:
+            side_scores = scores[side]
+            sk[key][off[side]:] = sorted(sk[key][off[side]:], key=lambda p: (side_scores.get(p['paperId'], 0.0), base(p)), reverse=True)
+    # 預取的分段是舊順序，作廢後依新順序重排
+    pf = st.session_state.prefetcher
+    pf.reset(hero_id, make_window_loader(sk, st.session_state.frontiers))
+    pf.schedule(off)
+    st.session_state.lineage_ordering = ordering
+
 def process_mining(doi_target, action='init'):
     with st.status("正在啟動 V10.2 經典引擎...", expanded=True) as status:
         if action == 'init':
@@ -318,55 +210,83 @@ def process_mining(doi_target, action='init'):
                 status.update(label="❌ 找不到資料", state="error")
                 st.error("找不到資料。")
                 return
+            st.session_state.frontiers = skeleton.pop('frontiers', {})
             st.session_state.skeleton = skeleton
             st.session_state.offsets = {'a': 0, 'd': 0}
+            st.session_state.prefetcher.reset(skeleton['hero']['paperId'], make_window_loader(skeleton, st.session_state.frontiers))
             hero_enriched = enrich_segment([skeleton['hero']])[0]
             st.session_state.full_lineage = {'hero': hero_enriched, 'ancestors': [], 'descendants': []}
             st.session_state.chat_history = []
             st.session_state.pi_analysis_result = None
             st.session_state.pi_raw_data = None
             st.session_state.read_only_mode = False
+            st.session_state.citation_graph = None
+            st.session_state.lineage_ordering = "default"
+            st.session_state.lineage_summary = None
         
         st.write("🔍 擴充詳細資料 (PI、摘要)...")
-        sk = st.session_state.skeleton
         off = st.session_state.offsets
+        pf = st.session_state.prefetcher
+        hero_id = st.session_state.skeleton['hero'].get('paperId')
+        if pf.hero_id != hero_id:
+            pf.reset(hero_id, make_window_loader(st.session_state.skeleton, st.session_state.frontiers))
         
-        new_a_objs, new_d_objs = [], []
-        if action == 'init':
-            new_a_objs = sk['all_ancestors'][0:5]
-            new_d_objs = sk['all_descendants'][0:5]
-            st.session_state.offsets = {'a': 5, 'd': 5}
-        elif action == 'older':
-            new_a_objs = sk['all_ancestors'][off['a'] : off['a']+5]
-            st.session_state.offsets['a'] += 5
-        elif action == 'newer':
-            new_d_objs = sk['all_descendants'][off['d'] : off['d']+5]
-            st.session_state.offsets['d'] += 5
-        elif action == 'expand_both':
-            new_a_objs = sk['all_ancestors'][off['a'] : off['a']+5]
-            new_d_objs = sk['all_descendants'][off['d'] : off['d']+5]
-            st.session_state.offsets['a'] += 5
-            st.session_state.offsets['d'] += 5
-            
-        enriched_a = enrich_segment(new_a_objs)
-        enriched_d = enrich_segment(new_d_objs)
+        enriched_a, enriched_d = [], []
+        try:
+            if action == 'init':
+                enriched_a = fetch_window('a', 0)
+                enriched_d = fetch_window('d', 0)
+                st.session_state.offsets = {'a': 5, 'd': 5}
+            elif action == 'older':
+                enriched_a = fetch_window('a', off['a'])
+                st.session_state.offsets['a'] += 5
+            elif action == 'newer':
+                enriched_d = fetch_window('d', off['d'])
+                st.session_state.offsets['d'] += 5
+            elif action == 'expand_both':
+                enriched_a = fetch_window('a', off['a'])
+                enriched_d = fetch_window('d', off['d'])
+                st.session_state.offsets['a'] += 5
+                st.session_state.offsets['d'] += 5
+        except EdgePageError:
+            # 翻頁失敗不算資料結束：offsets 沒有前進，再按一次會從同一頁重試
+            status.update(label="❌ Semantic Scholar 暫時無法連線", state="error")
+            st.error("引用列表翻頁失敗 (重試已用盡)，請稍後再試一次。")
+            return
         
-        exist_a = len(st.session_state.full_lineage['ancestors'])
-        for i, p in enumerate(enriched_a): p['code'] = f"A{exist_a + i + 1}"
-        exist_d = len(st.session_state.full_lineage['descendants'])
-        for i, p in enumerate(enriched_d): p['code'] = f"D{exist_d + i + 1}"
+        # AI 分析期間，背景先把接下來幾段準備好
+        pf.schedule(st.session_state.offsets)
         
-        st.session_state.full_lineage['ancestors'].extend(enriched_a)
-        st.session_state.full_lineage['descendants'].extend(enriched_d)
+        lineage = get_lineage_index()
+        lineage.extend('a', enriched_a)
+        lineage.extend('d', enriched_d)
         
-        st.write("🧠 AI 正在進行深度推論...")
-        analysis = generate_deep_analysis_classic(
-            st.session_state.full_lineage['hero'],
-            st.session_state.full_lineage['ancestors'],
-            st.session_state.full_lineage['descendants'],
-            api_key, model_name
-        )
-        st.session_state.deep_dive_result = analysis
+        merged = None
+        if action != 'init' and incremental_mode and st.session_state.lineage_summary and st.session_state.deep_dive_result:
+            if not enriched_a and not enriched_d:
+                merged = st.session_state.deep_dive_result
+            else:
+                st.write("🧠 AI 正在進行增量推論 (僅新增論文)...")
+                prompt = build_incremental_prompt(
+                    st.session_state.full_lineage['hero'], enriched_a, enriched_d,
+                    st.session_state.lineage_summary
+                )
+                raw, err = stream_into(st.empty(), prompt, api_key, model_name, wrap=report_html)
+                if err is None:
+                    delta, summary = extract_summary(raw)
+                    merged = merge_report(st.session_state.deep_dive_result, delta)
+                    if merged is not None and summary: st.session_state.lineage_summary = summary
+        
+        if merged is None:
+            st.write("🧠 AI 正在進行深度推論...")
+            prompt = build_deep_analysis_prompt(
+                st.session_state.full_lineage['hero'],
+                st.session_state.full_lineage['ancestors'],
+                st.session_state.full_lineage['descendants']
+            )
+            analysis, _ = stream_into(st.empty(), prompt, api_key, model_name, wrap=report_html)
+            merged, st.session_state.lineage_summary = extract_summary(analysis)
+        st.session_state.deep_dive_result = merged
         status.update(label="✅ 分析完成", state="complete", expanded=False)
         
         time.sleep(0.5)
@@ -394,6 +314,8 @@ else:
         if st.session_state.skeleton:
             st.divider()
             st.caption("🔄 擴展搜尋範圍")
+            hero_meta = st.session_state.skeleton.get('hero', {})
+            st.caption(f"已展開祖先 {st.session_state.offsets['a']} / {hero_meta.get('referenceCount') or '?'} 篇 | 後代 {st.session_state.offsets['d']} / {hero_meta.get('citationCount') or '?'} 篇")
             cb1, cb2, cb3 = st.columns([1, 1, 1])
             btn_older = cb1.button("⬅️ 找更早祖先", use_container_width=True)
             btn_both = cb2.button("↔️ 雙向同時擴展", use_container_width=True)
@@ -402,6 +324,31 @@ else:
             if btn_older: process_mining(doi_input, 'older')
             if btn_newer: process_mining(doi_input, 'newer')
             if btn_both: process_mining(doi_input, 'expand_both')
+            
+            with st.expander("🕸️ 多跳引用網絡 (Multi-hop)", expanded=False):
+                g1, g2, g3 = st.columns(3)
+                graph_depth = g1.slider("擴展深度 (跳)", 1, 3, 2)
+                graph_max_nodes = g2.number_input("節點上限", min_value=100, max_value=20000, value=2000, step=100)
+                graph_max_requests = g3.number_input("API 請求上限", min_value=10, max_value=2000, value=200, step=10)
+                if st.button("建立多跳引用網絡", use_container_width=True):
+                    with st.spinner("正在向外擴展引用網絡..."):
+                        graph, graph_stats = crawl_citation_graph(
+                            st.session_state.skeleton['hero'], depth=graph_depth,
+                            max_nodes=int(graph_max_nodes), max_requests=int(graph_max_requests))
+                        st.session_state.citation_graph = graph
+                        st.session_state.graph_stats = graph_stats
+                if st.session_state.citation_graph is not None:
+                    gs = st.session_state.graph_stats
+                    st.caption(f"節點 {gs['nodes']} | 引用邊 {gs['edges']} | 實際深度 {gs['levels']} | API 請求 {gs['requests']} | 記憶體 {gs['bytes'] / 1024:.0f} KB")
+                
+                ordering = st.selectbox("後續祖先 / 後代的展開順序", options=list(ORDERINGS.keys()), format_func=ORDERINGS.get,
+                                        index=list(ORDERINGS.keys()).index(st.session_state.lineage_ordering))
+                if ordering != st.session_state.lineage_ordering:
+                    if ordering != "default" and st.session_state.citation_graph is None:
+                        st.info("請先建立多跳引用網絡，才能使用網絡排序。")
+                    else:
+                        apply_lineage_ordering(ordering)
+                        st.toast(f"✅ 已改用「{ORDERINGS[ordering]}」排序尚未展開的論文")
 
         if btn_analyze and doi_input and api_key:
             process_mining(doi_input, 'init')
@@ -414,22 +361,8 @@ else:
             st.markdown("### 🕵️‍♂️ PI 深度偵探 (Identity Verification)")
             st.caption("同名同姓是資料庫常見錯誤。請在下方 **「驗明正身」**，剔除不屬於該作者的論文。")
             
-            all_papers = st.session_state.full_lineage['ancestors'] + [st.session_state.full_lineage['hero']] + st.session_state.full_lineage['descendants']
-            pi_options = {}
-            
-            for p in all_papers:
-                auths = p.get('authors', [])
-                if not auths: continue
-                safe_title = p.get('title', 'Unknown')[:20] + "..."
-                def add_opt(a_obj, role):
-                    if a_obj.get('authorId'):
-                        lbl = f"[{role}] {a_obj.get('name')} (from {safe_title})"
-                        if lbl not in pi_options: pi_options[lbl] = a_obj['authorId']
-
-                add_opt(auths[0], "第一作者")
-                if len(auths) > 1: add_opt(auths[-1], "最後作者")
-                if len(auths) >= 3: add_opt(auths[-2], "倒數第二")
-                if len(auths) >= 4: add_opt(auths[-3], "倒數第三")
+            lineage_views = get_lineage_index().views()
+            pi_options = lineage_views['pi_options']
             
             col_pi_sel, col_pi_btn = st.columns([3, 1])
             with col_pi_sel:
@@ -438,7 +371,7 @@ else:
             if st.button("2️⃣ 載入論文列表 (驗明正身)", use_container_width=True) and selected_pi_label:
                 target_author_id = pi_options[selected_pi_label]
                 with st.spinner("正在調閱學術檔案..."):
-                    raw_data = fetch_author_profile_no_cache(target_author_id)
+                    raw_data = fetch_author_profile(target_author_id)
                     st.session_state.pi_raw_data = raw_data
                     st.session_state.pi_analysis_result = None
 
@@ -479,9 +412,11 @@ else:
                             st.error("請至少選擇一篇論文！")
                         else:
                             selected_paper_list = selected_rows.to_dict('records')
-                            with st.spinner(f"AI 正在閱讀這 {count_sel} 篇論文並分析風格..."):
-                                pi_report = generate_author_analysis(author_name, selected_paper_list, api_key, model_name)
-                                st.session_state.pi_analysis_result = pi_report
+                            st.caption(f"AI 正在閱讀這 {count_sel} 篇論文並分析風格...")
+                            pi_placeholder = st.empty()
+                            pi_report, _ = stream_into(pi_placeholder, build_author_prompt(author_name, selected_paper_list), api_key, model_name)
+                            st.session_state.pi_analysis_result = pi_report
+                            pi_placeholder.empty()
                 else:
                     st.warning("此作者沒有找到相關論文資料。")
 
@@ -492,57 +427,25 @@ else:
 
             st.divider()
             st.subheader("⏳ 技術與作者演進表")
-            table_data = []
-            
-            def get_auth_display(p):
-                auths = p.get('authors', [])
-                if not auths: return "Unknown"
-                if len(auths) == 1: return auths[0].get('name')
-                if len(auths) == 2: return f"{auths[0].get('name')} & {auths[1].get('name')}"
-                first = auths[0].get('name')
-                last = auths[-1].get('name')
-                last_2 = auths[-2].get('name')
-                return f"{first} ... {last_2}, {last}"
-
-            for p in all_papers:
-                role = "🟨 主角" if p == st.session_state.full_lineage['hero'] else ("🟦 基石" if p in st.session_state.full_lineage['ancestors'] else "🟩 後續")
-                tldr_text = (p.get('tldr') or {}).get('text')
-                abs_text = p.get('abstract')
-                smry = (tldr_text or abs_text or "")[:100]
-                table_data.append({
-                    "角色": role, "代號": p.get('code',''), "年份": p.get('year'), 
-                    "關鍵作者群": get_auth_display(p), "標題": p.get('title'), "摘要重點": smry
-                })
-            
             # [Fix] Replace use_container_width with width='stretch'
-            st.dataframe(pd.DataFrame(table_data), width='stretch', hide_index=True)
+            st.dataframe(pd.DataFrame(lineage_views['table']), width='stretch', hide_index=True)
 
             st.subheader("💬 追問歷史學家")
             user_q = st.text_input("有疑問嗎？", key="chat_input")
             if st.button("送出") and user_q and api_key:
-                with st.spinner("AI 思考中..."):
-                    ctx = [{"code": p.get('code','Hero'), "title": p.get('title','Unknown'), "year": p.get('year','N/A')} for p in all_papers]
-                    ans = ask_historian(user_q, ctx, api_key, model_name)
-                    st.session_state.chat_history.append({"q": user_q, "a": ans})
+                ctx = lineage_views['context']
+                chat_placeholder = st.empty()
+                ans, _ = stream_into(chat_placeholder, build_historian_prompt(user_q, ctx), api_key, model_name,
+                                     wrap=lambda t: f"<div class='chat-box'><b>Q: {user_q}</b><br>A: {t}</div>")
+                st.session_state.chat_history.append({"q": user_q, "a": ans})
+                chat_placeholder.empty()
             for chat in reversed(st.session_state.chat_history):
                 st.markdown(f"<div class='chat-box'><b>Q: {chat['q']}</b><br>A: {chat['a']}</div>", unsafe_allow_html=True)
 
             st.markdown("#### 📚 完整文獻詳情")
             st.markdown('<div class="bib-container">', unsafe_allow_html=True)
-            for p in all_papers:
-                auth_html = ""
-                auths = p.get('authors', [])
-                if auths:
-                    auth_html += f"<span class='auth-tag-first'>{auths[0].get('name','Unknown')} (1st)</span>"
-                    if len(auths) > 1:
-                        if len(auths) > 3:
-                            auth_html += ", ... "
-                            auth_html += f", {auths[-2].get('name')} (2nd Last)"
-                        auth_html += f", <span class='auth-tag-last'>{auths[-1].get('name')} (Last)</span>"
-                else: auth_html = "Unknown"
-                
-                st.markdown(f"**[{p.get('code','Hero')}]** {p.get('title','Unknown')} ({p.get('year','N/A')})<br>🏛️ {p.get('venue','N/A')} | 🔗 Cited: {p.get('citationCount',0)}<br>👤 {auth_html}", unsafe_allow_html=True)
-                st.markdown("---")
+            # 整份文獻列表一次送出，不再每篇兩個 markdown 元件
+            st.markdown("\n\n---\n\n".join(lineage_views['bibliography']) + "\n\n---", unsafe_allow_html=True)
             st.markdown('</div>', unsafe_allow_html=True)
             
             if st.button("🌍 生成中/英/日 總結卡"):
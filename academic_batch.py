@@ -0,0 +1,142 @@
+# ==========================================
+# 學術雷達：批次挖掘 DOI / arXiv 清單 (不需要 Streamlit)
+# ==========================================
+# 每篇依序經過 academic_core 的三個階段：skeleton (骨架) → enrich (擴充 PI、摘要) → analysis (深度分析)。
+# - 多篇同時執行 (--workers)，用執行緒而不是子行程：S2 的 token bucket、provider_slot 的併發上限
+#   都是行程層級的，同一行程內的所有工作才會共用同一個速率限制；論文與 AI 回應快取 (SQLite) 本來就跨行程共用
+# - 每完成一個階段寫入 <out>/checkpoints/<輸入>.json；重跑同一個指令時已完成的階段直接沿用
+# - 每篇完成就寫出 <out>/papers/<輸入>.json (與介面「下載進度 (JSON)」相同，可從側欄讀回去繼續展開)，
+#   並重寫合併的 <out>/report.md；結束時輸出 summary.json 與每分鐘完成篇數
+# S2 速率用 S2_RATE_LIMIT / S2_BURST / S2_API_KEY 調整，Gemini 併發用 RADAR_LIMIT_GEMINI。
+# 用法：python academic_batch.py dois.txt -o lineage_out --workers 4
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import concurrent.futures
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from academic_core import (SKELETON_KEEP, WINDOW, analyse_lineage, enrich_lineage, lineage_state, llm_cache,
+                           mine_skeleton, s2)
+from stage_checkpoint import StageCheckpoint, read_list, safe_name, write_atomic
+
+STAGES = ("skeleton", "enrich", "analysis")
+
+_print_lock = threading.Lock()
+
+def log(msg: str):
+    with _print_lock: print(f"[{datetime.now():%H:%M:%S}] {msg}", flush=True)
+
+
+class PaperRun(StageCheckpoint):
+    """單篇論文的階段檢查點，存在 <out>/checkpoints/<輸入>.json。"""
+
+    def __init__(self, target: str, out_dir: str, config: Dict[str, Any], fresh: bool = False):
+        self.target = target
+        self.name = safe_name(target)
+        super().__init__(os.path.join(out_dir, "checkpoints", f"{self.name}.json"), [target, config], STAGES, fresh)
+
+
+def mine_paper(run: PaperRun, args) -> Dict[str, Any]:
+    keep = max(SKELETON_KEEP, args.segments * WINDOW)
+
+    def skeleton():
+        found = mine_skeleton(run.target, keep)
+        if found is None: raise LookupError("找不到這篇論文")
+        return found
+    sk = run.stage("skeleton", skeleton)
+    lineage = run.stage("enrich", lambda: enrich_lineage(sk, args.segments))
+    report, summary = run.stage("analysis", lambda: list(analyse_lineage(lineage, args.api_key, args.model)))
+
+    state = lineage_state(sk, lineage, report, summary, args.segments)
+    write_atomic(os.path.join(args.out, "papers", f"{run.name}.json"), json.dumps(state, default=str, ensure_ascii=False))
+    hero = lineage['hero']
+    return {"paper_id": hero.get('paperId'), "title": hero.get('title'), "year": hero.get('year'), "report": report}
+
+
+def write_report(path: str, targets: List[str], rows: Dict[str, Dict[str, Any]]):
+    """依輸入順序合併已完成的報告；每篇完成就重寫一次。"""
+    parts = [f"# 學術雷達批次報告\n產生時間: {datetime.now()}\n"]
+    for i, target in enumerate(targets, 1):
+        row = rows.get(target)
+        if not row or row["status"] != "ok": continue
+        parts.append(f"## [{i}] {row['title']} ({row.get('year') or 'N/A'})\n輸入: `{target}` | paperId: `{row['paper_id']}`\n\n{row['report']}\n")
+    write_atomic(path, "\n---\n\n".join(parts))
+
+
+def run_batch(targets: List[str], args) -> Dict[str, Any]:
+    config = {"segments": args.segments, "model": args.model}
+    runs = [PaperRun(t, args.out, config, args.fresh) for t in targets]
+    report_path = os.path.join(args.out, "report.md")
+    rows: Dict[str, Dict[str, Any]] = {}
+    started = time.time()
+    mined = 0
+
+    def work(run: PaperRun) -> Dict[str, Any]:
+        t0 = time.time()
+        row = {"target": run.target, "status": "ok", "error": None}
+        try:
+            row.update(mine_paper(run, args))
+        except Exception as e:
+            row.update(status="failed", error=f"{type(e).__name__}: {e}")
+        row.update(elapsed=round(time.time() - t0, 2), stages=run.timing(), resumed=list(run.resumed))
+        return row
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(args.workers, 1), thread_name_prefix="lineage") as pool:
+        for fut in concurrent.futures.as_completed([pool.submit(work, r) for r in runs]):
+            row = fut.result()
+            rows[row["target"]] = row
+            if row["status"] == "ok" and len(row["resumed"]) < len(STAGES): mined += 1
+            write_report(report_path, targets, rows)
+            rate = mined / max(time.time() - started, 1e-6) * 60
+            label = (row.get("title") or row["target"])[:50]
+            log(f"[{len(rows)}/{len(targets)}] {'✅' if row['status'] == 'ok' else '❌'} {label} ({row['elapsed']:.1f}s)"
+                + (f" — {row['error']}" if row["error"] else "") + f" | {rate:.1f} 篇/分鐘")
+
+    wall = time.time() - started
+    return {
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "wall": round(wall, 2),
+        "mined": mined,
+        "papers_per_minute": round(mined / max(wall, 1e-6) * 60, 2),
+        "s2": s2.stats(),
+        "llm_cache": llm_cache.hit_stats(),
+        "papers": [{k: v for k, v in rows[t].items() if k != "report"} for t in targets],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="學術雷達：批次挖掘 DOI / arXiv 清單的學術系譜")
+    parser.add_argument("targets", help="DOI / arXiv ID / 網址 / 標題清單 (.txt 一行一個，或 .json 字串陣列)")
+    parser.add_argument("-o", "--out", default="lineage_out", help="輸出資料夾 (含各篇的檢查點)")
+    parser.add_argument("--workers", type=int, default=4, help="同時挖掘的篇數")
+    parser.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY", ""))
+    parser.add_argument("--model", default="gemini-2.5-flash", choices=["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.5-flash-lite"])
+    parser.add_argument("--segments", type=int, default=1, help=f"祖先 / 後代各展開幾段 (每段 {WINDOW} 篇)")
+    parser.add_argument("--fresh", action="store_true", help="忽略既有檢查點，全部重跑")
+    args = parser.parse_args(argv)
+
+    if not args.api_key: parser.error("需要 Gemini Key (--api-key 或 GOOGLE_API_KEY)")
+    if args.segments < 1: parser.error("--segments 至少為 1")
+    targets = read_list(args.targets)
+    if not targets: parser.error("清單是空的")
+    os.makedirs(os.path.join(args.out, "papers"), exist_ok=True)
+    log(f"共 {len(targets)} 篇，同時挖掘 {args.workers} 篇 → {args.out}")
+
+    summary = run_batch(targets, args)
+    write_atomic(os.path.join(args.out, "summary.json"), json.dumps(summary, ensure_ascii=False, indent=2))
+    failed = [p for p in summary["papers"] if p["status"] != "ok"]
+    s2_stats = summary["s2"]
+    print(f"完成 {len(targets) - len(failed)}/{len(targets)} 篇 (本次挖掘 {summary['mined']} 篇)，"
+          f"總耗時 {summary['wall']:.1f}s，{summary['papers_per_minute']:.1f} 篇/分鐘")
+    print(f"S2 請求 {s2_stats['requests']} | 節流 (429) {s2_stats['throttles']} | 錯誤 {s2_stats['errors']}；"
+          f"AI 回應快取命中 {summary['llm_cache']['hits']} / 未命中 {summary['llm_cache']['misses']}")
+    for p in failed: print(f"❌ {p['target']}：{p['error']}")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# ==========================================
+# 學術雷達：不依賴 Streamlit 的核心邏輯
+# ==========================================
+# academic_app.py (互動介面) 與 academic_batch.py (批次挖掘 DOI 清單) 共用：
+# Semantic Scholar 查詢與擴充、Gemini 提示與呼叫、以及「骨架 → 擴充 → 分析」的系譜挖掘流程。
+# 這個模組不可以呼叫任何 st.*；S2 速率限制、論文快取、AI 回應快取都是行程層級的單例，
+# 同一行程裡的所有 session / 批次工作共用。
+import re
+from urllib.parse import unquote
+from typing import Dict, Optional, Tuple
+
+from s2_client import get_s2_client
+from paper_store import get_paper_store
+from s2_crawler import open_frontiers
+from llm_cache import get_llm_cache
+from gemini_pool import get_gemini_pool
+from concurrency import provider_slot, slotted_stream
+from lineage_delta import SUMMARY_MARKER, extract_summary
+from lineage_index import LineageIndex
+
+# ==========================================
+# 1. 核心搜尋引擎
+# ==========================================
+s2 = get_s2_client()
+store = get_paper_store()
+
+LIGHT_FIELDS = "paperId,title,year,citationCount,referenceCount,venue,authors.name"
+RICH_FIELDS = "paperId,title,year,citationCount,venue,authors.name,authors.authorId,abstract,tldr"
+BROAD_FIELDS = "paperId,title,year,citationCount,venue,authors.name,abstract,tldr"
+AUTHOR_FIELDS = "authorId,name,citationCount,hIndex,paperCount,papers.title,papers.year,papers.citationCount,papers.venue"
+
+def search_broad_papers(query, limit=10):
+    if not query: return []
+    cache_key = f"{query.strip().lower()}|{limit}"
+    cached = store.get("search", cache_key)
+    if cached is not None: return cached
+    data = s2.get("/paper/search", params={"query": query, "limit": limit, "fields": BROAD_FIELDS})
+    if data is None: return []
+    results = data.get('data', [])
+    store.put("search", cache_key, results)
+    return results
+
+def fetch_network_skeleton(user_input):
+    clean_input = unquote(user_input).strip().replace('"', '')
+    lookup_id = None
+    doi_match = re.search(r'(10\.\d{4,9}/[-._;()/:a-zA-Z0-9]+)', clean_input)
+    arxiv_match = re.search(r'(\d{4}\.\d{4,5})', clean_input)
+    
+    if doi_match: lookup_id = f"DOI:{doi_match.group(1)}"
+    elif arxiv_match: lookup_id = f"arXiv:{arxiv_match.group(1)}"
+    
+    # 落地快取：輸入 -> paperId -> 主角
+    lookup_key = lookup_id or clean_input.lower()
+    cached_pid = store.get("lookup", lookup_key)
+    hero = store.get("paper_light", cached_pid) if cached_pid else None
+    
+    def fetch(pid):
+        return s2.get(f"/paper/{pid}", params={"fields": LIGHT_FIELDS})
+
+    if not hero and lookup_id: hero = fetch(lookup_id)
+    if not hero:
+        found = s2.get("/paper/search", params={"query": clean_input, "limit": 1, "fields": "paperId"})
+        if found and found.get('data'):
+            hero = fetch(found['data'][0]['paperId'])
+        
+    if not hero or not hero.get('paperId'): return None
+    
+    pid = hero['paperId']
+    store.put("lookup", lookup_key, pid)
+    store.put("paper_light", pid, hero)
+    
+    # 引用邊改走分頁端點，按下 A/D 按鈕時才繼續翻頁 (見 s2_crawler)
+    frontiers = open_frontiers(pid)
+    return {'hero': hero, 'all_ancestors': frontiers['a'].ranked, 'all_descendants': frontiers['d'].ranked, 'frontiers': frontiers}
+
+def enrich_segment(paper_objects):
+    if not paper_objects: return []
+    ids = [p['paperId'] for p in paper_objects if p.get('paperId')]
+    if not ids: return paper_objects
+    
+    enriched_map = store.get_papers(ids)
+    missing = [pid for pid in dict.fromkeys(ids) if pid not in enriched_map]
+    if missing:
+        fetched = [p for p in (s2.post("/paper/batch", params={"fields": RICH_FIELDS}, json={"ids": missing}) or []) if p]
+        store.put_papers(fetched)
+        for p in fetched: enriched_map[p['paperId']] = p
+        
+    enriched_list = []
+    for p in paper_objects:
+        pid = p['paperId']
+        if pid in enriched_map:
+            full_data = enriched_map[pid]
+            if 'code' in p: full_data['code'] = p['code']
+            enriched_list.append(full_data)
+        else:
+            enriched_list.append(p)
+    return enriched_list
+
+def fetch_author_profile(author_id):
+    cached = store.get_author(author_id)
+    if cached is not None: return cached
+    profile = s2.get(f"/author/{author_id}", params={"fields": AUTHOR_FIELDS})
+    if profile: store.put_author(profile)
+    return profile
+
+# ==========================================
+# 2. AI Prompt
+# ==========================================
+llm_cache = get_llm_cache()
+gemini_pool = get_gemini_pool()
+
+def run_gemini(prompt, api_key, model_name):
+    model = gemini_pool.model(api_key, model_name)
+    def produce():
+        with provider_slot("gemini"):
+            return model.generate_content(prompt).text
+    return llm_cache.cached_call(model_name, prompt, None, produce)
+
+def stream_gemini(prompt, api_key, model_name):
+    """逐段產生回應文字 (與 run_gemini 共用同一份快取，命中時依原分段重播)。"""
+    model = gemini_pool.model(api_key, model_name)
+    def produce():
+        # 與 run_gemini 相同佔用 gemini 名額；第一段之前失敗 (429 / 5xx) 重試一次
+        return slotted_stream("gemini", lambda: (chunk.text for chunk in model.generate_content(prompt, stream=True) if chunk.text))
+    return llm_cache.cached_stream(model_name, prompt, None, produce)
+
+def format_paper(p, code):
+    title = p.get('title', 'Unknown Title')
+    year = p.get('year', 'N/A')
+    cite = p.get('citationCount', 0)
+    
+    auth_list = p.get('authors', [])
+    if not auth_list: auth_str = "Unknown"
+    elif len(auth_list) <= 4:
+        auth_str = ", ".join([a.get('name','?') for a in auth_list])
+    else:
+        first = auth_list[0].get('name', '?')
+        last_3 = [a.get('name','?') for a in auth_list[-3:]]
+        auth_str = f"First:{first} ... Last3:{', '.join(last_3)}"
+    
+    return f"[{code}] {title} ({year}) | {auth_str} | Cited:{cite}"
+
+SUMMARY_INSTRUCTION = f"""
+    {SUMMARY_MARKER}
+    (報告最後，請以 150 字內濃縮整條系譜：主角定位、各 A/D 代號的關鍵貢獻與演進主軸。此段供系統後續增量分析使用)
+    """
+
+def build_deep_analysis_prompt(hero, ancestors, descendants):
+    context = f"主角論文: {format_paper(hero, 'Hero')}\n\n"
+    context += "【祖先文獻】:\n" + "\n".join([format_paper(a, a.get('code','A')) for a in ancestors]) + "\n\n"
+    context += "【後代文獻】:\n" + "\n".join([format_paper(d, d.get('code','D')) for d in descendants])
+
+    system_prompt = """
+    你是一位精通「學術系譜學」的 AI 專家。
+    請基於提供的論文列表，進行深度的數據推論、概念流變分析，並預測未來的可能性。
+    
+    【重要指令】：
+    1. **語言**：所有輸出必須使用 **繁體中文 (Traditional Chinese, Taiwan)**。
+    2. **表格呈現**：概念流變請務必使用 **Markdown 表格** 呈現。
+    
+    【輸出報告格式】：
+    ### 📜 學術雷達深度報告
+    
+    #### 1. 🌊 概念流變表 (Concept Flow Table)
+    | 階段 | 核心關鍵詞 | 演變描述 |
+    | :--- | :--- | :--- |
+    | **A系列 (起源)** | ... | ... |
+    | **Hero (轉折)** | ... | ... |
+    | **D系列 (應用)** | ... | ... |
+    
+    #### 2. 🧩 領域分類與聚類
+    * **群組 A (理論基石)**：[A1], [A3]...
+    * **群組 B (方法突破)**：[Hero], [D1]...
+    
+    #### 3. 👑 領域領袖與師承
+    * **核心實驗室 (PI)**：(觀察作者群的最後幾位，推論核心實驗室)
+    * **第一作者 (執行者)**：(觀察第一作者的貢獻)
+    
+    #### 4. 🔗 技術演進詳解
+    **4.1 ⏪ 向前溯源**
+    * **[A?]** (PI: ...): **[貢獻]** ... 
+    
+    **4.2 ⏩ 向後展望**
+    * **[D?]** (PI: ...): **[貢獻]** ... 
+    
+    #### 5. 🔮 未來可能性圓錐 (The Cone of Possibilities)
+    *(針對 Hero 論文，預測未來)*
+    * **🎯 核心 (Probable)**：...
+    * **🚀 擴展 (Plausible)**：...
+    * **🌌 邊界 (Possible)**：...
+    """ + SUMMARY_INSTRUCTION
+    return system_prompt + context
+
+def build_incremental_prompt(hero, new_ancestors, new_descendants, lineage_summary):
+    """只送「新增論文 + 系譜摘要」，模型回傳可由 merge_report 併回原報告的增量章節。"""
+    context = f"主角論文: {format_paper(hero, 'Hero')}\n\n"
+    context += f"【目前系譜摘要】:\n{lineage_summary}\n\n"
+    context += "【本次新增祖先】:\n" + ("\n".join([format_paper(a, a.get('code','A')) for a in new_ancestors]) or "(無)") + "\n\n"
+    context += "【本次新增後代】:\n" + ("\n".join([format_paper(d, d.get('code','D')) for d in new_descendants]) or "(無)")
+
+    system_prompt = """
+    你是一位精通「學術系譜學」的 AI 專家，正在「增量更新」一份既有的學術雷達報告。
+    你只會看到目前系譜的摘要與本次新增的論文，請把新論文整合進既有脈絡。
+    
+    【重要指令】：
+    1. **語言**：所有輸出必須使用 **繁體中文 (Traditional Chinese, Taiwan)**。
+    2. **只輸出下列章節**，標題必須與範例完全相同 (系統會依章節編號合併)。
+    
+    【輸出格式】：
+    #### 1. 🌊 概念流變表 (Concept Flow Table)
+    (整合新論文後的完整新版 Markdown 表格)
+    | 階段 | 核心關鍵詞 | 演變描述 |
+    | :--- | :--- | :--- |
+    
+    #### 2. 🧩 領域分類與聚類
+    (整合新論文後的完整新版)
+    
+    #### 3. 👑 領域領袖與師承
+    (整合新論文後的完整新版)
+    
+    #### 4. 🔗 技術演進詳解
+    **4.1 ⏪ 向前溯源**
+    * (只寫本次新增的 [A?]，沒有則留空)
+    
+    **4.2 ⏩ 向後展望**
+    * (只寫本次新增的 [D?]，沒有則留空)
+    
+    #### 5. 🔮 未來可能性圓錐 (The Cone of Possibilities)
+    (整合新論文後的完整新版)
+    """ + SUMMARY_INSTRUCTION
+    return system_prompt + context
+
+def build_author_prompt(author_name, selected_papers):
+    papers_str = "\n".join([f"- {p.get('title', 'Unknown')} ({p.get('year', 'N/A')}) | Cited: {p.get('citationCount', 0)}" for p in selected_papers])
+    
+    system_prompt = f"""
+    你是一位「學術星探」。請分析這位 PI (或研究員)。
+    【注意】：**已排除同名同姓的干擾資料**，以下提供的論文確定皆為同一人所著。
+    
+    【檔案】姓名: {author_name}
+    【經確認的代表作】:
+    {papers_str}
+    
+    【任務】：請用**條列式**分析：
+    1. **學術江湖地位** (是資深大佬、實驗室主持人，還是新銳研究員？)
+    2. **核心研究版圖** (根據上述論文，精準定位其專長)
+    3. **研究風格與專長**
+    """
+    return system_prompt
+
+def build_historian_prompt(question, context_data):
+    return f"""你是一位學術顧問。請用繁體中文回答。\n背景：{str(context_data)[:3000]}\n問題：「{question}」"""
+
+def generate_multilingual_abstract(text_content, api_key, model_name):
+    prompt = f"""請將報告總結為 **100 字摘要**。輸出：繁體中文、English、日本語。\n內容：\n{text_content[:2000]}"""
+    try: return run_gemini(prompt, api_key, model_name)
+    except: return "摘要生成失敗"
+
+def reopen_frontiers(skeleton):
+    """JSON 還原的進度：以主角重開分頁前緣並接上存檔的名次，展開時可以超出存檔的範圍。"""
+    hero_id = ((skeleton or {}).get('hero') or {}).get('paperId')
+    if not hero_id: return {}
+    frontiers = open_frontiers(hero_id)
+    for side, key in (('a', 'all_ancestors'), ('d', 'all_descendants')):
+        frontiers[side].restore(skeleton.get(key) or [])
+        skeleton[key] = frontiers[side].ranked
+    return frontiers
+
+def make_window_loader(skeleton, frontiers):
+    """取出祖先 (a) / 後代 (d) 的某一段；有分頁前緣時才向 API 翻頁，沒有時 (批次擴充) 直接切片骨架。
+    不碰 st.session_state，可在背景預取執行緒中使用。"""
+    hero_id = skeleton['hero'].get('paperId')
+    def load(side, start, size=5):
+        frontier = (frontiers or {}).get(side)
+        if frontier and frontier.paper_id == hero_id:
+            return frontier.window(start, size)
+        key = 'all_ancestors' if side == 'a' else 'all_descendants'
+        return skeleton[key][start:start+size]
+    return load
+
+# ==========================================
+# 3. 系譜挖掘流程 (無介面)：骨架 → 擴充 → 分析
+# ==========================================
+# 與 process_mining('init') 相同的三個階段，拆成可個別呼叫、結果可 JSON 序列化的函式；
+# 批次工作可以在每個階段之後存檢查點。
+WINDOW = 5                # 每段篇數 (與介面的展開按鈕相同)
+SKELETON_KEEP = 50        # 骨架保留的排序候選數：讀回介面後仍可繼續「找更早祖先 / 更新後代」
+
+def mine_skeleton(target: str, keep: int = SKELETON_KEEP) -> Optional[Dict]:
+    """找出主角並排好前 keep 名祖先 / 後代，回傳不含分頁前緣的骨架；找不到時回傳 None。"""
+    skeleton = fetch_network_skeleton(target)
+    if not skeleton: return None
+    for frontier in skeleton.pop('frontiers', {}).values(): frontier.ensure(keep)
+    return skeleton
+
+def enrich_lineage(skeleton: Dict, segments: int = 1) -> Dict:
+    """擴充主角與前 segments 段祖先 / 後代 (PI、摘要)，回傳已編好 A1/D1... 代號的 full_lineage。"""
+    load = make_window_loader(skeleton, None)
+    lineage = {'hero': enrich_segment([skeleton['hero']])[0], 'ancestors': [], 'descendants': []}
+    index = LineageIndex(lineage)
+    for side in ('a', 'd'):
+        index.extend(side, enrich_segment(load(side, 0, segments * WINDOW)))
+    return lineage
+
+def analyse_lineage(lineage: Dict, api_key: str, model_name: str) -> Tuple[str, Optional[str]]:
+    """深度分析，回傳 (報告本文, 系譜摘要)；呼叫失敗時拋出例外，不轉成「分析失敗」文字。"""
+    prompt = build_deep_analysis_prompt(lineage['hero'], lineage['ancestors'], lineage['descendants'])
+    return extract_summary(run_gemini(prompt, api_key, model_name))
+
+def lineage_state(skeleton: Dict, lineage: Dict, report: str, summary: Optional[str], segments: int = 1) -> Dict:
+    """與介面「下載進度 (JSON)」相同的欄位，可以從側欄讀回去繼續展開或追問。"""
+    return {
+        'skeleton': skeleton,
+        'full_lineage': lineage,
+        'offsets': {'a': segments * WINDOW, 'd': segments * WINDOW},
+        'deep_dive_result': report,
+        'lineage_summary': summary,
+    }
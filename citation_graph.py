@@ -0,0 +1,227 @@
+# ==========================================
+# 多跳引用網絡：BFS 爬取 + CSR 緊湊鄰接表
+# ==========================================
+# 以 s2_crawler 的分頁端點 (也就是 fetch_network_skeleton 使用的同一層) 為基礎，
+# 從主角論文向外做 depth-k 的廣度優先擴展：
+# - 同一層的節點並行展開，全域去重
+# - 以 max_nodes / max_requests 控制預算 (只計算真正打到 API 的請求)
+# 圖以整數索引的 CSR 陣列儲存 (offsets + targets + paperId<->int 對照)，
+# 取代 session_state 中層層巢狀的 dict，數千篇論文也只佔幾百 KB。
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from s2_crawler import EdgePageError, iter_edge_pages
+from concurrency import bounded_as_completed
+
+DIRECTIONS = ("references", "citations")
+
+
+def gather_rows(offsets: np.ndarray, targets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """一次取出多列的鄰居 (向量化的 CSR 列串接)，結果可能含重複。"""
+    rows = np.asarray(rows, dtype=np.int64)
+    if rows.size == 0: return np.empty(0, dtype=targets.dtype)
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0: return np.empty(0, dtype=targets.dtype)
+    # 每個元素的索引 = 所屬列的起點 + 在該列內的位置
+    shift = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return targets[np.arange(total, dtype=np.int64) + shift]
+
+
+class CitationGraph:
+    """
+    有向引用圖：邊 i -> j 代表「論文 i 引用了論文 j」。
+    offsets/targets 為正向 CSR (列 i 的參考文獻)，反向 CSR (被誰引用) 在第一次需要時才建立。
+    """
+
+    def __init__(self, ids: List[str], offsets: np.ndarray, targets: np.ndarray,
+                 years: np.ndarray, citation_counts: np.ndarray, expanded: np.ndarray):
+        self.ids = ids
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.years = years
+        self.citation_counts = citation_counts
+        self.expanded = expanded          # 是否真的抓過這個節點的邊 (否則只是葉節點)
+        self._reverse: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def from_edges(cls, ids: List[str], src: np.ndarray, dst: np.ndarray,
+                   years: np.ndarray, citation_counts: np.ndarray, expanded: np.ndarray) -> "CitationGraph":
+        n = len(ids)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if src.size:
+            keys = np.unique(src * n + dst)          # 去除重複邊並依 (src, dst) 排序
+            src, dst = keys // n, keys % n
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        return cls(ids, offsets, dst.astype(np.int32), years, citation_counts, expanded)
+
+    # ---------- 基本屬性 ----------
+    @property
+    def n_nodes(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_edges(self) -> int:
+        return int(self.targets.size)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.offsets, self.targets, self.years, self.citation_counts, self.expanded]
+        if self._reverse: arrays.extend(self._reverse)
+        return int(sum(a.nbytes for a in arrays))
+
+    def reverse_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._reverse is None:
+            n = self.n_nodes
+            src = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.offsets))
+            order = np.argsort(self.targets, kind="stable")
+            r_offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=n), out=r_offsets[1:])
+            self._reverse = (r_offsets, src[order].astype(np.int32))
+        return self._reverse
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.targets, minlength=self.n_nodes)
+
+    # ---------- 查詢 ----------
+    def references(self, paper_id: str) -> List[str]:
+        i = self.index[paper_id]
+        return [self.ids[j] for j in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+    def citations(self, paper_id: str) -> List[str]:
+        r_offsets, r_targets = self.reverse_csr()
+        i = self.index[paper_id]
+        return [self.ids[j] for j in r_targets[r_offsets[i]:r_offsets[i + 1]]]
+
+    def k_hop(self, paper_id: str, k: int, direction: str = "references") -> np.ndarray:
+        """回傳 k 跳內可到達的節點索引 (不含自己)。direction: references 往祖先、citations 往後代。"""
+        offsets, targets = (self.offsets, self.targets) if direction == "references" else self.reverse_csr()
+        seen = np.zeros(self.n_nodes, dtype=bool)
+        start = self.index[paper_id]
+        seen[start] = True
+        frontier = np.array([start], dtype=np.int64)
+        for _ in range(k):
+            nxt = np.unique(gather_rows(offsets, targets, frontier))
+            nxt = nxt[~seen[nxt]]
+            if nxt.size == 0: break
+            seen[nxt] = True
+            frontier = nxt
+        seen[start] = False
+        return np.flatnonzero(seen)
+
+
+class GraphBuilder:
+    """爬取期間累積節點與邊 (array 模組的緊湊整數陣列)，最後一次轉成 CSR。"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.years = array("h")
+        self.citation_counts = array("i")
+        self.expanded = array("b")
+        self.src = array("i")
+        self.dst = array("i")
+
+    def add_node(self, paper: Dict) -> int:
+        pid = paper["paperId"]
+        i = self.index.get(pid)
+        if i is None:
+            i = len(self.ids)
+            self.index[pid] = i
+            self.ids.append(pid)
+            self.years.append(paper.get("year") or 0)
+            self.citation_counts.append(paper.get("citationCount") or 0)
+            self.expanded.append(0)
+        return i
+
+    def add_edge(self, citing: int, cited: int):
+        self.src.append(citing)
+        self.dst.append(cited)
+
+    def build(self) -> CitationGraph:
+        return CitationGraph.from_edges(
+            list(self.ids),
+            np.frombuffer(self.src, dtype=np.int32) if self.src else np.empty(0, dtype=np.int32),
+            np.frombuffer(self.dst, dtype=np.int32) if self.dst else np.empty(0, dtype=np.int32),
+            np.array(self.years, dtype=np.int16),
+            np.array(self.citation_counts, dtype=np.int32),
+            np.array(self.expanded, dtype=bool),
+        )
+
+
+class RequestBudget:
+    def __init__(self, max_requests: int):
+        self.max_requests = max_requests
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.used >= self.max_requests: return False
+            self.used += 1
+            return True
+
+
+def _fetch_neighbors(paper_id: str, direction: str, limit: int, budget: RequestBudget) -> List[Dict]:
+    out: List[Dict] = []
+    try:
+        for page in iter_edge_pages(paper_id, direction, page_size=min(max(limit, 1), 1000), allow_request=budget.try_spend):
+            out.extend(page)
+            if len(out) >= limit: break
+    except EdgePageError: pass  # 網絡排序只是參考分數：某個節點翻頁失敗就用已抓到的鄰居，不中斷整個爬取
+    return out[:limit]
+
+
+def crawl_citation_graph(seed: Dict, depth: int = 2, max_nodes: int = 2000, max_requests: int = 200,
+                         per_node_edges: int = 100, seed_edges: int = 1000, workers: int = 4,
+                         directions: Iterable[str] = DIRECTIONS) -> Tuple[CitationGraph, Dict[str, int]]:
+    """
+    從 seed (fetch_network_skeleton 回傳的 hero) 出發做 depth 層 BFS。
+    主角取 seed_edges 條、其他節點最多取 per_node_edges 條參考 / 被引用邊 (主角的直接鄰居
+    是 graph_rank 要排序的對象，所以抓得比較完整)；節點總數超過 max_nodes 或
+    API 請求用完 max_requests 即停止擴展。回傳 (CitationGraph, 統計)。
+    """
+    directions = tuple(directions)
+    builder = GraphBuilder()
+    budget = RequestBudget(max_requests)
+    frontier = [builder.add_node(seed)]
+    levels = 0
+
+    def fetch(job):
+        i, d, pid = job
+        return _fetch_neighbors(pid, d, seed_edges if i == 0 else per_node_edges, budget)
+
+    for _ in range(depth):
+        if not frontier or budget.used >= max_requests: break
+        jobs = [(i, d, builder.ids[i]) for i in frontier for d in directions]
+        next_frontier = []
+        # 在共用執行緒池上最多 workers 個同時跑；結果回到主執行緒後才寫入 builder，不需要額外加鎖
+        for (i, d, _pid), fut in bounded_as_completed(fetch, jobs, workers):
+            builder.expanded[i] = 1
+            for p in fut.result():
+                pid = p.get("paperId")
+                if not pid: continue
+                j = builder.index.get(pid)
+                if j is None:
+                    if len(builder.ids) >= max_nodes: continue
+                    j = builder.add_node(p)
+                    next_frontier.append(j)
+                if d == "references": builder.add_edge(i, j)
+                else: builder.add_edge(j, i)
+        frontier = next_frontier
+        levels += 1
+
+    graph = builder.build()
+    stats = {"nodes": graph.n_nodes, "edges": graph.n_edges, "levels": levels,
+             "requests": budget.used, "bytes": graph.nbytes}
+    return graph, stats
@@ -0,0 +1,271 @@
+# ==========================================
+# Cofacts 查核資料庫的本地鏡像 (SQLite FTS5)
+# ==========================================
+# search_cofacts 原本每次掃描都即時呼叫 cofacts-api.g0v.tw 的 GraphQL (3 秒逾時)，
+# 只拿前 3 筆，逾時就什麼都沒有。這裡把 Cofacts 公開資料集 (github.com/cofacts/opendata)
+# 的 articles / replies / article_replies 三個 CSV (或 .csv.zip) 匯入本地 SQLite：
+# - 文章本文建 FTS5 trigram 索引 (中文不需要斷詞)，查詢以 bm25 排序，毫秒級
+# - 匯入是增量的：每張表記錄已匯入的最大 updatedAt / createdAt，再次匯入新的資料集時
+#   只寫入不早於這個時間的列 (與上次最後一列同一秒更新的也算；寫入都是 upsert，重寫無害)
+# - 只保留 status 為 NORMAL 的文章 / 回應關聯，被封鎖或刪除的會從鏡像移除
+# 用法：python cofacts_mirror.py import <資料夾或網址>
+import os
+import io
+import csv
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import requests
+
+from local_db import LocalDB, db_path, span_coverage, tokens, trigram_match, trigrams
+
+TABLES = ("articles", "replies", "article_replies")
+REPLY_TYPES = {
+    "RUMOR": "含有不實訊息",
+    "NOT_RUMOR": "含有正確訊息",
+    "OPINIONATED": "含有個人意見",
+    "NOT_ARTICLE": "不在查證範圍",
+}
+BATCH = 2000
+MIN_COVERAGE = 0.5       # 查詢至少一半的字要被命中的 trigram 蓋到 (見 span_coverage)，擋掉只沾到一個詞的文章
+CANDIDATES = 3           # 先取 top_k 的幾倍候選，再依涵蓋率過濾
+
+COFACTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    pk INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS replies (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS article_replies (
+    article_id TEXT NOT NULL,
+    reply_id TEXT NOT NULL,
+    reply_type TEXT NOT NULL,
+    score INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (article_id, reply_id)
+);
+CREATE INDEX IF NOT EXISTS idx_article_replies_type ON article_replies(article_id, reply_type);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(text, content='articles', content_rowid='pk', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, text) VALUES (new.pk, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, text) VALUES ('delete', old.pk, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE OF text ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, text) VALUES ('delete', old.pk, old.text);
+    INSERT INTO articles_fts(rowid, text) VALUES (new.pk, new.text);
+END;
+"""
+
+# ---------- 讀取資料集 ----------
+def _open_source(source: str, table: str, workdir: str) -> Optional[str]:
+    """在資料夾或網址下找 <table>.csv 或 <table>.csv.zip，回傳本地檔案路徑；找不到時回傳 None。"""
+    for name in (f"{table}.csv", f"{table}.csv.zip"):
+        if source.startswith(("http://", "https://")):
+            local = os.path.join(workdir, name)
+            with requests.get(f"{source.rstrip('/')}/{name}", stream=True, timeout=60) as resp:
+                if resp.status_code != 200: continue
+                with open(local, "wb") as f: shutil.copyfileobj(resp.raw, f)
+            return local
+        path = os.path.join(source, name)
+        if os.path.exists(path): return path
+    return None
+
+
+def _iter_csv(path: str) -> Iterator[Dict[str, str]]:
+    csv.field_size_limit(sys.maxsize)
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            member = next(n for n in zf.namelist() if n.endswith(".csv"))
+            with zf.open(member) as raw:
+                yield from csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8", newline=""))
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def _batches(rows: Iterable, size: int = BATCH) -> Iterator[List]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+
+class CofactsMirror:
+    def __init__(self, path: str):
+        self.db = LocalDB(path, COFACTS_SCHEMA)
+
+    # ---------- 匯入 ----------
+    def _watermark(self, table: str) -> str:
+        row = self.db.execute("SELECT value FROM meta WHERE name=?", (f"watermark:{table}",)).fetchone()
+        return row[0] if row else ""
+
+    def _set_meta(self, conn, name: str, value: str):
+        conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _import_table(self, table: str, rows: Iterable[Dict[str, str]]) -> int:
+        since = self._watermark(table)
+        stamp_field = "createdAt" if table == "replies" else "updatedAt"
+        newest, written = since, 0
+        fresh = (r for r in rows if (r.get(stamp_field) or r.get("createdAt") or "") >= since)
+        for batch in _batches(fresh):
+            with self.db.transaction() as conn:
+                for r in batch:
+                    stamp = r.get(stamp_field) or r.get("createdAt") or ""
+                    newest = max(newest, stamp)
+                    if table == "articles":
+                        if r.get("status", "NORMAL") != "NORMAL" or not r.get("text"):
+                            conn.execute("DELETE FROM articles WHERE id=?", (r["id"],))
+                            continue
+                        conn.execute(
+                            "INSERT INTO articles (id, text, updated_at) VALUES (?,?,?) "
+                            "ON CONFLICT(id) DO UPDATE SET text=excluded.text, updated_at=excluded.updated_at",
+                            (r["id"], r["text"], stamp))
+                    elif table == "replies":
+                        conn.execute("INSERT OR REPLACE INTO replies (id, type, text, created_at) VALUES (?,?,?,?)",
+                                     (r["id"], r.get("type", ""), r.get("text", ""), stamp))
+                    else:
+                        if r.get("status", "NORMAL") != "NORMAL":
+                            conn.execute("DELETE FROM article_replies WHERE article_id=? AND reply_id=?",
+                                         (r["articleId"], r["replyId"]))
+                            continue
+                        score = int(r.get("positiveFeedbackCount") or 0) - int(r.get("negativeFeedbackCount") or 0)
+                        conn.execute(
+                            "INSERT OR REPLACE INTO article_replies (article_id, reply_id, reply_type, score, updated_at) VALUES (?,?,?,?,?)",
+                            (r["articleId"], r["replyId"], r.get("replyType", ""), score, stamp))
+                    written += 1
+                self._set_meta(conn, f"watermark:{table}", newest)
+        return written
+
+    def import_dump(self, source: str, on_progress=None) -> Dict[str, int]:
+        """
+        從資料夾或網址匯入 (或增量更新) Cofacts 資料集。
+        回傳各表這次寫入的列數；資料集裡沒有的表略過。
+        """
+        counts: Dict[str, int] = {}
+        workdir = tempfile.mkdtemp(prefix="cofacts_")
+        try:
+            for table in TABLES:
+                path = _open_source(source, table, workdir)
+                if path is None: continue
+                started = time.time()
+                counts[table] = self._import_table(table, _iter_csv(path))
+                if on_progress: on_progress(table, counts[table], time.time() - started)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        with self.db.transaction() as conn:
+            self._set_meta(conn, "imported_at", str(time.time()))
+        self.db.execute("INSERT INTO articles_fts(articles_fts) VALUES ('optimize')")
+        return counts
+
+    # ---------- 查詢 ----------
+    def available(self) -> bool:
+        """
+        已經匯入過資料集才使用鏡像。每次都重查 (meta 以主鍵查詢，成本可忽略)：
+        匯入通常是另一個行程 (python cofacts_mirror.py import)，執行中的 app 不用重啟就能改用鏡像。
+        """
+        return self.db.execute("SELECT 1 FROM meta WHERE name='imported_at'").fetchone() is not None
+
+    def search(self, query: str, top_k: int = 3, reply_types: Optional[Sequence[str]] = None,
+               min_coverage: float = MIN_COVERAGE) -> List[Dict]:
+        """
+        全文檢索有查核回應的文章，依 bm25 取前 top_k 篇，每篇要蓋到查詢 min_coverage 比例的字 (見 span_coverage)。
+        查詢裡沒有 3 個字以上的詞 (例如「颱風 停班」) 時 trigram 索引查不到，改以 LIKE 掃描 (每個詞都要出現)，
+        依更新時間排序。
+        reply_types 限定回應類型 (RUMOR / NOT_RUMOR / OPINIONATED / NOT_ARTICLE)，None 為不限。
+        回傳 [{"id", "text", "replies": [{"type", "text"}, ...]}]，回應依使用者回饋分數排序。
+        """
+        words = tokens(query)
+        if not words or top_k <= 0: return []
+        types = list(reply_types) if reply_types else list(REPLY_TYPES)
+        marks = ",".join("?" * len(types))
+        has_reply = f"EXISTS (SELECT 1 FROM article_replies ar WHERE ar.article_id = a.id AND ar.reply_type IN ({marks}))"
+        grams = trigrams(query)
+        if grams:
+            rows = self.db.execute(
+                f"""SELECT a.id, a.text FROM articles_fts
+                    JOIN articles a ON a.pk = articles_fts.rowid
+                    WHERE articles_fts MATCH ? AND {has_reply}
+                    ORDER BY bm25(articles_fts) LIMIT ?""",
+                [trigram_match(query), *types, top_k * CANDIDATES]).fetchall()
+            rows = [(aid, text) for aid, text in rows if span_coverage(query, text) >= min_coverage][:top_k]
+        else:
+            likes = " AND ".join("a.text LIKE ?" for _ in words)
+            rows = self.db.execute(
+                f"""SELECT a.id, a.text FROM articles a
+                    WHERE {likes} AND {has_reply}
+                    ORDER BY a.updated_at DESC LIMIT ?""",
+                [*(f"%{w}%" for w in words), *types, top_k]).fetchall()
+        hits = []
+        for article_id, text in rows:
+            replies = self.db.execute(
+                f"""SELECT ar.reply_type, COALESCE(r.text, '') FROM article_replies ar
+                    LEFT JOIN replies r ON r.id = ar.reply_id
+                    WHERE ar.article_id = ? AND ar.reply_type IN ({marks})
+                    ORDER BY ar.score DESC, ar.updated_at DESC""",
+                [article_id, *types]).fetchall()
+            hits.append({"id": article_id, "text": text,
+                         "replies": [{"type": t, "text": rt} for t, rt in replies]})
+        return hits
+
+    def stats(self) -> Dict[str, int]:
+        out = {t: self.db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in TABLES}
+        out["available"] = int(self.available())
+        return out
+
+
+_mirror: Optional[CofactsMirror] = None
+_mirror_lock = threading.Lock()
+
+def get_cofacts_mirror() -> CofactsMirror:
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = CofactsMirror(db_path("cofacts.sqlite3"))
+    return _mirror
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Cofacts 資料集本地鏡像")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_import = sub.add_parser("import", help="匯入或增量更新資料集")
+    p_import.add_argument("source", help="含 articles.csv(.zip) 等檔案的資料夾或網址")
+    p_search = sub.add_parser("search", help="測試查詢")
+    p_search.add_argument("query")
+    p_search.add_argument("-k", type=int, default=3)
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    mirror = get_cofacts_mirror()
+    if args.cmd == "import":
+        counts = mirror.import_dump(args.source, lambda t, n, s: print(f"{t}: {n} 列 ({s:.1f}s)"))
+        print(counts)
+    elif args.cmd == "search":
+        started = time.time()
+        for hit in mirror.search(args.query, args.k):
+            print(f"- {hit['text'][:60]} ({', '.join(r['type'] for r in hit['replies'])})")
+        print(f"{(time.time() - started) * 1000:.1f} ms")
+    else:
+        print(mirror.stats())
@@ -0,0 +1,173 @@
+# ==========================================
+# 行程層級的共用執行緒池、各服務的併發上限、相同請求合併 (singleflight)
+# ==========================================
+# Streamlit 每個 session 都跑在同一個 Python 行程裡；若每次掃描 / 爬取都自己開
+# ThreadPoolExecutor，同時在線的人一多，執行緒數就沒有上限。這裡統一：
+# - get_executor()：整個行程共用一個有上限的執行緒池 (RADAR_MAX_WORKERS，預設 32)
+# - provider_slot(name)：對同一外部服務 (Tavily / S2 / Cofacts / Gemini) 的同時連線數上限；
+#   slotted_stream() 是串流呼叫的版本 (整段串流佔住名額，第一段之前失敗可重試)
+# - coalesce(key, fn)：同一個鍵同時只會真正執行一次，其餘呼叫者等待並共用結果 / 例外
+import os
+import time
+import threading
+import concurrent.futures
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_WORKERS = int(os.environ.get("RADAR_MAX_WORKERS", "32"))
+
+# 服務名稱 -> 同時連線上限；可用環境變數 RADAR_LIMIT_<NAME> 覆寫
+PROVIDER_LIMITS = {
+    "tavily": 8,
+    "s2": 8,
+    "cofacts": 4,
+    "gemini": 8,
+}
+DEFAULT_PROVIDER_LIMIT = 8
+
+
+# ---------- 共用執行緒池 ----------
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """記錄排隊中 / 執行中的工作數 (給 stats() 用)，不讀 ThreadPoolExecutor 的內部欄位。"""
+
+    def __init__(self, max_workers: int, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self.max_workers = max_workers
+        self.queued = 0
+        self.running = 0
+        self._count_lock = threading.Lock()
+
+    def _shift(self, queued: int, running: int):
+        with self._count_lock:
+            self.queued += queued
+            self.running += running
+
+    def counts(self) -> Dict[str, int]:
+        with self._count_lock:
+            return {"workers": self.max_workers, "running": self.running, "queued": self.queued}
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        def run():
+            self._shift(-1, 1)
+            try: return fn(*args, **kwargs)
+            finally: self._shift(0, -1)
+
+        self._shift(1, 0)
+        try: fut = super().submit(run)
+        except BaseException:
+            self._shift(-1, 0)
+            raise
+        # 被取消的工作不會執行 run，要在這裡扣掉排隊數
+        fut.add_done_callback(lambda f: self._shift(-1, 0) if f.cancelled() else None)
+        return fut
+
+
+_executor: Optional[CountingExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> CountingExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = CountingExecutor(DEFAULT_WORKERS, thread_name_prefix="radar")
+    return _executor
+
+
+_DONE = object()
+
+def bounded_as_completed(fn: Callable[[Any], Any], items: Iterable[Any],
+                         limit: int) -> Iterator[Tuple[Any, concurrent.futures.Future]]:
+    """
+    在共用池上執行 fn(item)，同一批最多 limit 個同時在跑 (避免一次塞滿共用池的佇列)。
+    依完成順序產出 (item, future)；提交與取結果都在呼叫端執行緒。
+    """
+    executor = get_executor()
+    pending = iter(items)
+    running: Dict[concurrent.futures.Future, Any] = {}
+
+    def fill():
+        while len(running) < max(limit, 1):
+            item = next(pending, _DONE)
+            if item is _DONE: return
+            running[executor.submit(fn, item)] = item
+
+    fill()
+    while running:
+        done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for fut in done:
+            yield running.pop(fut), fut
+        fill()
+
+
+# ---------- 各服務的併發上限 ----------
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+_slots_lock = threading.Lock()
+
+def provider_slot(provider: str) -> threading.BoundedSemaphore:
+    """用法：with provider_slot("tavily"): ..."""
+    sem = _slots.get(provider)
+    if sem is None:
+        with _slots_lock:
+            sem = _slots.get(provider)
+            if sem is None:
+                limit = int(os.environ.get(f"RADAR_LIMIT_{provider.upper()}",
+                                           PROVIDER_LIMITS.get(provider, DEFAULT_PROVIDER_LIMIT)))
+                sem = _slots[provider] = threading.BoundedSemaphore(max(limit, 1))
+    return sem
+
+
+def slotted_stream(provider: str, open_stream: Callable[[], Iterable[Any]], attempts: int = 2,
+                   wait: float = 2.0) -> Iterator[Any]:
+    """
+    串流呼叫的 provider_slot + 重試：open_stream() 開始到串流結束都佔住名額。
+    還沒產生任何一段就失敗 (429 / 5xx) 時等 wait 秒 (之後每次加倍) 重試，最多 attempts 次；
+    已經產生內容後才失敗就直接往外拋 (重試會讓前面的內容重複)。
+    """
+    for attempt in range(attempts):
+        started = False
+        try:
+            with provider_slot(provider):
+                for chunk in open_stream():
+                    started = True
+                    yield chunk
+            return
+        except Exception:
+            if started or attempt >= attempts - 1: raise
+        time.sleep(wait * 2 ** attempt)
+
+
+# ---------- singleflight ----------
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = concurrent.futures.Future()
+            else:
+                self.coalesced += 1
+        if not leader: return fut.result()
+        try:
+            result = fn()
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+_flight = SingleFlight()
+
+def coalesce(key: Hashable, fn: Callable[[], Any]) -> Any:
+    return _flight.do(key, fn)
+
+
+def stats() -> Dict[str, int]:
+    return {**get_executor().counts(), "coalesced": _flight.coalesced}
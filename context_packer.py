@@ -0,0 +1,109 @@
+# ==========================================
+# 依 token 預算挑選每篇來源的重點句
+# ==========================================
+# get_search_context 原本把每篇 content[:3000] 全部接起來，100 篇就是 30 萬字，
+# 完全不管模型的 context 長度與費用。這裡改成：
+# 1. 每篇切成句子，以 BM25 對「議題 + 動態關鍵字」計分 (詞項矩陣以 numpy 一次算完)
+#    中文沒有空白，詞項用「中文字 bigram + 英數單字」
+# 2. 先保證每篇都有導言 (第一句)，再依分數由高到低把句子放進預算
+# 3. 每篇選中的句子依原文順序輸出，中間被略過的地方以「…」標示
+# 回傳的清單與輸入一一對應，Source N 的編號不會因為打包而改變。
+import re
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+GAP = "…"
+
+_SENT_RE = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s+|\n+")
+_CJK = r"\u3400-\u9fff\uf900-\ufaff"
+_CJK_RE = re.compile(f"[{_CJK}]")
+_CJK_RUN_RE = re.compile(f"[{_CJK}]+")
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：中文字約 1 token，其餘約 4 個字元 1 token。"""
+    if not text: return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def terms(text: str) -> List[str]:
+    """中文字 bigram + 小寫英數單字。"""
+    text = text or ""
+    out = [w.lower() for w in _WORD_RE.findall(text)]
+    for run in _CJK_RUN_RE.findall(text):
+        if len(run) == 1: out.append(run)
+        out.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return out
+
+
+def split_sentences(text: str) -> List[str]:
+    """切句並去掉同一篇內重複的句子 (轉載稿常見)。"""
+    return list(dict.fromkeys(s.strip() for s in _SENT_RE.split(text or "") if s and s.strip()))
+
+
+def bm25_scores(sentences: Sequence[str], query_terms: Sequence[str]) -> np.ndarray:
+    """以句子為文件、只針對查詢詞項建矩陣 (句數 x 詞項數) 計算 BM25。"""
+    vocab = {t: j for j, t in enumerate(dict.fromkeys(query_terms))}
+    n = len(sentences)
+    if n == 0 or not vocab: return np.zeros(n)
+    tf = np.zeros((n, len(vocab)), dtype=np.float32)
+    lengths = np.zeros(n, dtype=np.float32)
+    for i, s in enumerate(sentences):
+        toks = terms(s)
+        lengths[i] = len(toks)
+        for t in toks:
+            j = vocab.get(t)
+            if j is not None: tf[i, j] += 1
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+    return ((tf * (BM25_K1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def pack_passages(contents: Sequence[str], query_texts: Sequence[str], token_budget: int,
+                  reserved_tokens: int = 0, max_chars: int = 3000) -> List[str]:
+    """
+    在 token_budget (扣掉 reserved_tokens，例如每篇的標頭) 內，為每篇來源挑出最相關的句子。
+    回傳與 contents 等長的清單；預算用完的來源可能只剩導言或空字串。
+    """
+    budget = token_budget - reserved_tokens
+    clipped = [(c or "")[:max_chars] for c in contents]
+    if sum(estimate_tokens(c) for c in clipped) <= budget: return clipped
+    query_terms = [t for q in query_texts for t in terms(q)]
+    doc_sents: List[List[str]] = [split_sentences(c) for c in clipped]
+    flat = [(d, k, s) for d, sents in enumerate(doc_sents) for k, s in enumerate(sents)]
+    if not flat: return ["" for _ in contents]
+
+    scores = bm25_scores([s for _, _, s in flat], query_terms)
+    costs = np.array([estimate_tokens(s) + 1 for _, _, s in flat])
+    chosen: Dict[int, List[int]] = {d: [] for d in range(len(contents))}
+
+    # 1. 每篇先保留導言 (新聞的第一句通常就是 5W1H)
+    order = [i for i, (_, k, _) in enumerate(flat) if k == 0]
+    # 2. 其餘依分數高到低
+    rest = np.argsort(-scores, kind="stable")
+    order += [int(i) for i in rest if flat[i][1] != 0]
+
+    used = 0
+    for i in order:
+        if used + costs[i] > budget: continue
+        d, k, _ = flat[i]
+        chosen[d].append(k)
+        used += int(costs[i])
+
+    packed = []
+    for d, sents in enumerate(doc_sents):
+        picks = sorted(chosen[d])
+        parts, prev = [], -1
+        for k in picks:
+            if parts and k != prev + 1: parts.append(GAP)
+            parts.append(sents[k])
+            prev = k
+        if picks and picks[-1] != len(sents) - 1: parts.append(GAP)
+        packed.append(" ".join(parts))
+    return packed
@@ -0,0 +1,90 @@
+# ==========================================
+# 來源網域分類索引
+# ==========================================
+# classify_source 原本對每個來源、每次渲染都逐一掃過 DB_MAP 的每個關鍵字，
+# 媒體名稱則在三個地方各自掃過整份 DOMAIN_NAME_MAP。這裡一次編譯好：
+# - 媒體名稱：以「反轉標籤」建的後綴樹 (com -> udn)，查詢成本只和網址的標籤數有關，
+#   與名單長短無關；名單再大 (數千個網域) 也一樣快
+# - 立場分類：DB_MAP 的關鍵字是網域片段 (如 "ltn"、"rti.org")，保留原本的子字串語意，
+#   每個分類編成一個 regex，依 DB_MAP 順序比對，第一個命中的分類勝出
+# 結果以 netloc 為鍵做 LRU 記憶，同一個網域只算一次。
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_META = ("📄 其他來源", "#9e9e9e")
+
+
+class SourceInfo(NamedTuple):
+    category: str
+    label: str
+    color: str
+    emoji: str
+    name: str        # 媒體名稱；名單上沒有時為網域本身
+
+
+class DomainTrie:
+    """以反轉標籤儲存網域 (news.udn.com -> com / udn / news)。"""
+
+    def __init__(self, mapping: Optional[Dict[str, str]] = None):
+        self.root: Dict = {}
+        for domain, value in (mapping or {}).items(): self.add(domain, value)
+
+    def add(self, domain: str, value: str):
+        node = self.root
+        for label in reversed(domain.lower().strip(".").split(".")):
+            node = node.setdefault(label, {})
+        node[None] = value
+
+    def match(self, host: str) -> Optional[str]:
+        """
+        找出 host 中以完整標籤對齊的最長名單網域。
+        除了一般的後綴 (news.udn.com)，也允許後面多接一個兩碼國碼 (yahoo.com 可比中 tw.news.yahoo.com.tw)；
+        同樣長度時以真正的後綴優先。
+        """
+        labels = host.lower().strip(".").split(".")
+        ends = [len(labels)]
+        if len(labels) > 2 and len(labels[-1]) == 2: ends.append(len(labels) - 1)
+        best, best_len = None, 0
+        for end in ends:
+            node = self.root
+            depth = 0
+            for label in reversed(labels[:end]):
+                node = node.get(label)
+                if node is None: break
+                depth += 1
+                if None in node and depth > best_len: best, best_len = node[None], depth
+        return best
+
+
+class DomainClassifier:
+    def __init__(self, db_map: Dict[str, List[str]], name_map: Dict[str, str],
+                 category_meta: Dict[str, Tuple[str, str]], category_emoji: Dict[str, str],
+                 cache_size: int = 4096):
+        self.patterns = [(cat, re.compile("|".join(re.escape(kw.lower()) for kw in kws)))
+                         for cat, kws in db_map.items() if kws]
+        self.names = DomainTrie(name_map)
+        self.category_meta = category_meta
+        self.category_emoji = category_emoji
+        self._lookup_host = lru_cache(maxsize=cache_size)(self._classify_host)
+
+    def category(self, netloc: str) -> str:
+        for cat, pattern in self.patterns:
+            if pattern.search(netloc): return cat
+        return "OTHER"
+
+    def _classify_host(self, netloc: str) -> SourceInfo:
+        host = netloc.lower()
+        cat = self.category(host) if host else "OTHER"
+        label, color = self.category_meta.get(cat, DEFAULT_META)
+        domain = netloc.replace("www.", "")
+        name = (self.names.match(host.split(":")[0]) if host else None) or domain
+        return SourceInfo(cat, label, color, self.category_emoji.get(cat, "⚪"), name)
+
+    def lookup(self, url: Optional[str]) -> SourceInfo:
+        """一次取得 (分類, 標籤, 顏色, emoji, 媒體名稱)。"""
+        if not url or url == "#": return self._lookup_host("")
+        try: netloc = urlparse(url).netloc
+        except Exception: netloc = ""
+        return self._lookup_host(netloc)
@@ -0,0 +1,87 @@
+# ==========================================
+# 行程層級的 Gemini 用戶端池
+# ==========================================
+# 原本每次呼叫都重新建構用戶端，而且金鑰是靠 genai.configure(api_key=...) 或寫入
+# os.environ["GOOGLE_API_KEY"] 傳進去的，兩者都是整個行程共用的全域狀態：
+# 同時有兩位使用者帶不同金鑰時，A 的請求可能用 B 的金鑰送出。這裡改成：
+# - 每個用戶端都以明確的金鑰建立 (langchain 傳 google_api_key；google.generativeai
+#   則給 GenerativeModel 掛上自己的 GenerativeServiceClient)，不碰任何全域設定
+# - 以 (種類, api_key, model, temperature) 為鍵保留建好的用戶端，LRU 上限
+#   RADAR_GEMINI_POOL (預設 16)，超過時淘汰最久沒用的
+# 用戶端本身沒有每次呼叫的狀態，可以在多個執行緒之間共用。
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+DEFAULT_POOL_SIZE = int(os.environ.get("RADAR_GEMINI_POOL", "16"))
+
+
+class GeminiPool:
+    def __init__(self, max_size: int = DEFAULT_POOL_SIZE):
+        self.max_size = max(max_size, 1)
+        self._clients: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return client
+        # 建構可能要花一點時間 (載入 transport)，不持有鎖；同時建好兩份時保留先放進去的
+        client = factory()
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                self.reused += 1
+                return existing
+            self._clients[key] = client
+            self.created += 1
+            while len(self._clients) > self.max_size: self._clients.popitem(last=False)
+        return client
+
+    def chat(self, api_key: str, model: str, temperature: Optional[float] = None) -> ChatGoogleGenerativeAI:
+        """langchain 的 ChatGoogleGenerativeAI (news_app 使用)。"""
+        def build():
+            kwargs = {"model": model, "google_api_key": api_key}
+            if temperature is not None: kwargs["temperature"] = temperature
+            return ChatGoogleGenerativeAI(**kwargs)
+        return self._get(("chat", api_key, model, temperature), build)
+
+    def model(self, api_key: str, model_name: str) -> genai.GenerativeModel:
+        """google.generativeai 的 GenerativeModel，綁定自己的金鑰 (academic_app / search 使用)。"""
+        def build():
+            model = genai.GenerativeModel(model_name)
+            # GenerativeModel 沒有傳入 client 的參數；預設會在第一次呼叫時取全域 client，
+            # 這裡先掛上以這把金鑰建立的 client，之後就不會再讀 genai.configure 的設定。
+            # _client 是 SDK 內部欄位：依 google-generativeai 0.8.6 確認 (__init__ 設為 None，
+            # generate_content / count_tokens 為 None 時才取全域 client)，requirements.txt 已釘住這個版本。
+            # 升級後欄位不存在就直接報錯，不要默默退回全域金鑰
+            if not hasattr(model, "_client"):
+                raise RuntimeError(f"google-generativeai {genai.__version__} 的 GenerativeModel 沒有 _client，請重新確認 gemini_pool")
+            model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+            return model
+        return self._get(("genai", api_key, model_name, None), build)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"clients": len(self._clients), "created": self.created, "reused": self.reused}
+
+
+_pool: Optional[GeminiPool] = None
+_pool_lock = threading.Lock()
+
+def get_gemini_pool() -> GeminiPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None: _pool = GeminiPool()
+    return _pool
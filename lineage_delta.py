@@ -0,0 +1,74 @@
+# ==========================================
+# 增量系譜分析：報告分段、摘要抽取與合併
+# ==========================================
+# 每次擴展只把「新增論文 + 一段精簡的系譜摘要」送給 Gemini，
+# 模型回傳的增量報告再依章節編號合併回既有報告：
+# - 第 1、2、3、5 節 (概念流變、聚類、領袖、未來圓錐) 以新版整節取代
+# - 第 4 節的 4.1 / 4.2 只附加新論文的條目
+# 如此 prompt 與輸出長度不會隨展開次數線性成長。
+import re
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+SUMMARY_MARKER = "### [LINEAGE_SUMMARY]"
+APPEND_SECTIONS = {"4"}
+
+SECTION_RE = re.compile(r"^####\s*(\d+)\.", re.M)
+SUBSECTION_RE = re.compile(r"^\*\*\s*(\d+\.\d+)", re.M)
+
+
+def extract_summary(text: str) -> Tuple[str, Optional[str]]:
+    """把模型輸出的 [LINEAGE_SUMMARY] 區塊切出來；回傳 (報告本文, 摘要或 None)。"""
+    if not text or SUMMARY_MARKER not in text: return text, None
+    body, summary = text.split(SUMMARY_MARKER, 1)
+    return body.rstrip(), summary.strip()
+
+
+def split_sections(report: str) -> "OrderedDict[str, str]":
+    """依 '#### N.' 標題切段；鍵為章節編號，'' 為第一個標題之前的前言。"""
+    sections: "OrderedDict[str, str]" = OrderedDict()
+    matches = list(SECTION_RE.finditer(report))
+    sections[""] = report[:matches[0].start()] if matches else report
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        sections[m.group(1)] = report[m.start():nxt.start() if nxt else len(report)]
+    return sections
+
+
+def _append_subsections(old: str, new: str) -> str:
+    """把 new 中各小節 (如 **4.1**) 標題以下的條目，接到 old 對應小節的尾端。"""
+    new_parts = list(SUBSECTION_RE.finditer(new))
+    if not new_parts: return old
+    result = old
+    for m, nxt in zip(new_parts, new_parts[1:] + [None]):
+        block = new[m.end():nxt.start() if nxt else len(new)]
+        # 去掉小節標題那一行剩下的文字，只保留條目
+        items = block.split("\n", 1)[1].strip() if "\n" in block else ""
+        if not items: continue
+        old_parts = list(SUBSECTION_RE.finditer(result))
+        target = next((i for i, om in enumerate(old_parts) if om.group(1) == m.group(1)), None)
+        if target is None:
+            result = result.rstrip() + "\n\n" + new[m.start():nxt.start() if nxt else len(new)].strip() + "\n"
+            continue
+        end = old_parts[target + 1].start() if target + 1 < len(old_parts) else len(result)
+        result = result[:end].rstrip() + "\n" + items + "\n\n" + result[end:]
+    return result
+
+
+def merge_report(report: str, delta: str) -> Optional[str]:
+    """
+    依章節編號合併增量報告。既有報告或增量報告抓不到章節結構時回傳 None，
+    呼叫端應改用完整重新分析。
+    """
+    old_sections = split_sections(report)
+    new_sections = split_sections(delta)
+    if len(old_sections) <= 1 or len(new_sections) <= 1: return None
+    for num, text in new_sections.items():
+        if not num: continue
+        if num not in old_sections:
+            old_sections[num] = text
+        elif num in APPEND_SECTIONS:
+            old_sections[num] = _append_subsections(old_sections[num], text)
+        else:
+            old_sections[num] = text
+    merged = "".join(text if text.endswith("\n") else text + "\n" for text in old_sections.values())
+    return merged.rstrip() + "\n"
@@ -0,0 +1,100 @@
+# ==========================================
+# 系譜索引：full_lineage 的代號編排與衍生視圖
+# ==========================================
+# 演進表、PI 選單、文獻詳情原本在每次 rerun 都用 `p == hero`、`p in ancestors`
+# 做整份 dict 比對 (O(n²))。這裡在論文加入時就編好代號，角色直接由所在的列表 (祖先 / 主角 / 後代) 決定，
+# 表格 / 選單 / 文獻列表在同一次線性走訪中產生，並依版本號記憶，系譜沒變就不重算。
+# full_lineage 本身 (匯出 JSON 用的格式) 不變，索引只包住同一個 dict。
+from typing import Dict, List, Optional
+
+SIDES = {"a": "ancestors", "d": "descendants"}
+CODE_PREFIX = {"a": "A", "d": "D"}
+ROLES = {"a": "🟦 基石", "hero": "🟨 主角", "d": "🟩 後續"}
+
+
+def author_display(p: Dict) -> str:
+    """演進表用的作者縮寫：第一作者 ... 倒數兩位。"""
+    auths = p.get('authors', [])
+    if not auths: return "Unknown"
+    if len(auths) == 1: return auths[0].get('name')
+    if len(auths) == 2: return f"{auths[0].get('name')} & {auths[1].get('name')}"
+    return f"{auths[0].get('name')} ... {auths[-2].get('name')}, {auths[-1].get('name')}"
+
+
+def author_html(p: Dict) -> str:
+    """文獻詳情用的作者標籤 (第一作者 / 倒數第二 / 最後作者)。"""
+    auths = p.get('authors', [])
+    if not auths: return "Unknown"
+    html = f"<span class='auth-tag-first'>{auths[0].get('name','Unknown')} (1st)</span>"
+    if len(auths) > 1:
+        if len(auths) > 3:
+            html += ", ... "
+            html += f", {auths[-2].get('name')} (2nd Last)"
+        html += f", <span class='auth-tag-last'>{auths[-1].get('name')} (Last)</span>"
+    return html
+
+
+class LineageIndex:
+    def __init__(self, lineage: Dict):
+        self.lineage = lineage
+        self.version = 0
+        self._views: Optional[Dict] = None
+        self._views_version = -1
+
+    def __len__(self) -> int:
+        return len(self.lineage.get('ancestors', [])) + len(self.lineage.get('descendants', [])) + 1
+
+    def extend(self, side: str, papers: List[Dict]) -> List[Dict]:
+        """把新論文接到祖先 (a) / 後代 (d) 尾端，並在加入時編好 A1/D1... 代號。"""
+        if not papers: return papers
+        target = self.lineage.setdefault(SIDES[side], [])
+        for i, p in enumerate(papers):
+            p['code'] = f"{CODE_PREFIX[side]}{len(target) + i + 1}"
+        target.extend(papers)
+        self.version += 1
+        return papers
+
+    def papers(self) -> List[Dict]:
+        """依祖先 -> 主角 -> 後代的順序列出 (與演進表相同)。"""
+        return self.lineage.get('ancestors', []) + [self.lineage.get('hero') or {}] + self.lineage.get('descendants', [])
+
+    def views(self) -> Dict:
+        """
+        一次走訪產生 UI 需要的衍生資料，系譜版本沒變時直接回傳上次結果：
+        table (演進表列)、pi_options (選單標籤 -> authorId)、bibliography (文獻詳情 markdown)、
+        context (給歷史學家的 code/title/year)。
+        """
+        if self._views is not None and self._views_version == self.version: return self._views
+        table, bibliography, context = [], [], []
+        pi_options: Dict[str, str] = {}
+        groups = [("a", self.lineage.get('ancestors', [])), ("hero", [self.lineage.get('hero') or {}]),
+                  ("d", self.lineage.get('descendants', []))]
+        for side, papers in groups:
+            for p in papers:
+                tldr_text = (p.get('tldr') or {}).get('text')
+                smry = (tldr_text or p.get('abstract') or "")[:100]
+                table.append({
+                    "角色": ROLES[side], "代號": p.get('code',''), "年份": p.get('year'),
+                    "關鍵作者群": author_display(p), "標題": p.get('title'), "摘要重點": smry
+                })
+                bibliography.append(
+                    f"**[{p.get('code','Hero')}]** {p.get('title','Unknown')} ({p.get('year','N/A')})<br>"
+                    f"🏛️ {p.get('venue','N/A')} | 🔗 Cited: {p.get('citationCount',0)}<br>👤 {author_html(p)}"
+                )
+                context.append({"code": p.get('code','Hero'), "title": p.get('title','Unknown'), "year": p.get('year','N/A')})
+
+                auths = p.get('authors', [])
+                if not auths: continue
+                safe_title = p.get('title', 'Unknown')[:20] + "..."
+                picks = [(auths[0], "第一作者")]
+                if len(auths) > 1: picks.append((auths[-1], "最後作者"))
+                if len(auths) >= 3: picks.append((auths[-2], "倒數第二"))
+                if len(auths) >= 4: picks.append((auths[-3], "倒數第三"))
+                for a_obj, label in picks:
+                    if a_obj.get('authorId'):
+                        lbl = f"[{label}] {a_obj.get('name')} (from {safe_title})"
+                        if lbl not in pi_options: pi_options[lbl] = a_obj['authorId']
+
+        self._views = {"table": table, "pi_options": pi_options, "bibliography": bibliography, "context": context}
+        self._views_version = self.version
+        return self._views
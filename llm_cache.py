@@ -0,0 +1,83 @@
+# ==========================================
+# Gemini 回應的內容定址快取
+# ==========================================
+# 鍵 = hash(模型, prompt, temperature)，值 = 完整回應文字 + 串流時的分段序列。
+# 存在共用的 SQLite (local_db.KVStore)，有 TTL 與 LRU 淘汰，跨使用者、跨重跑共用；
+# 同一份 prompt 第二次送出時直接回傳，不再重複計費與等待。
+# 只有成功且完整的回應才會寫入 (例外或串流中斷都不快取)。
+import json
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from local_db import KVStore, db_path
+
+NS = "llm"
+DEFAULT_TTL = 7 * 86400
+
+
+def prompt_key(model: str, prompt: Any, temperature: Optional[float] = None) -> str:
+    """prompt 可以是字串，或 (system, user) 之類可 JSON 化的結構。"""
+    payload = json.dumps({"model": model, "prompt": prompt, "temperature": temperature},
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache(KVStore):
+    def __init__(self, path: str, max_bytes: int = 128 * 1024 * 1024, ttl: int = DEFAULT_TTL):
+        super().__init__(path, max_bytes, {NS: ttl})
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def hit_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def lookup(self, model: str, prompt: Any, temperature: Optional[float] = None) -> Optional[Dict]:
+        entry = self.get(NS, prompt_key(model, prompt, temperature))
+        self._count("hits" if entry is not None else "misses")
+        return entry
+
+    def store(self, model: str, prompt: Any, temperature: Optional[float], text: str, chunks: Optional[list] = None):
+        self.put(NS, prompt_key(model, prompt, temperature), {"text": text, "chunks": chunks or [text]})
+
+    def cached_call(self, model: str, prompt: Any, temperature: Optional[float], producer: Callable[[], str]) -> str:
+        """命中就回傳快取；否則呼叫 producer() 並把結果存起來。producer 丟出的例外原樣往外拋。"""
+        entry = self.lookup(model, prompt, temperature)
+        if entry is not None: return entry["text"]
+        text = producer()
+        if text: self.store(model, prompt, temperature, text)
+        return text
+
+    def cached_stream(self, model: str, prompt: Any, temperature: Optional[float],
+                      producer: Callable[[], Iterable[str]]) -> Iterator[str]:
+        """
+        串流版：命中時依原本的分段順序重播；未命中時邊產生邊記錄，
+        只有在串流完整結束時才寫入快取。
+        """
+        entry = self.lookup(model, prompt, temperature)
+        if entry is not None:
+            yield from entry["chunks"]
+            return
+        chunks = []
+        for chunk in producer():
+            if not chunk: continue
+            chunks.append(chunk)
+            yield chunk
+        if chunks: self.store(model, prompt, temperature, "".join(chunks), chunks)
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(db_path("llm_cache.sqlite3"))
+    return _cache
@@ -0,0 +1,212 @@
+# ==========================================
+# 本地 SQLite 共用工具
+# ==========================================
+# 所有落地快取 / 資料庫都放在同一個資料夾 (預設為專案下的 .radar_data，
+# 可用環境變數 RADAR_DATA_DIR 覆寫)，並統一使用 WAL 模式，
+# 讓多個 Streamlit worker 程序可以同時讀寫同一個檔案。
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+DATA_DIR = os.environ.get("RADAR_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".radar_data"))
+
+
+def db_path(name: str) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, name)
+
+
+_TOKEN_RE = re.compile(r"[^\s\W_]+", re.UNICODE)
+
+
+def tokens(text: str) -> List[str]:
+    """以空白、標點切開的詞 (小寫)。"""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def trigrams(*texts: str, max_grams: int = 32) -> List[str]:
+    """每個詞拆成重疊的 trigram (去重、小寫)；不足 3 個字的詞 trigram 索引查不到，直接略過。"""
+    grams: List[str] = []
+    for text in texts:
+        for token in tokens(text):
+            if len(token) < 3: continue
+            grams.extend(token[i:i + 3] for i in range(len(token) - 2))
+    return list(dict.fromkeys(grams))[:max_grams]
+
+
+def trigram_match(*texts: str, max_grams: int = 32) -> str:
+    """給 FTS5 trigram 索引用的 MATCH 字串：trigram 以 OR 串起來，命中越多的列 bm25 越前面。"""
+    return " OR ".join('"' + g.replace('"', '""') + '"' for g in trigrams(*texts, max_grams=max_grams))
+
+
+def coverage(grams: Sequence[str], text: str) -> float:
+    """grams 中出現在 text 的比例；trigram 以 OR 查詢會撈出只沾到一兩個字的列，用這個比例再過濾一次。"""
+    if not grams: return 0.0
+    text = text.lower()
+    return sum(1 for g in grams if g in text) / len(grams)
+
+
+def span_coverage(query: str, text: str) -> float:
+    """
+    query 裡 (3 個字以上的詞) 被出現在 text 的 trigram 蓋到的字元比例。
+    沒有斷詞的議題 (例如「台積電美國設廠爭議」) 會拆出「積電美」、「設廠爭」這類跨詞的 trigram，
+    以 trigram 計算的 coverage 會被它們拉低；以字元計算時，每個字只要被一個命中的 trigram 蓋到就算。
+    """
+    text = text.lower()
+    covered = total = 0
+    for token in tokens(query):
+        if len(token) < 3: continue
+        hit = [False] * len(token)
+        for i in range(len(token) - 2):
+            if token[i:i + 3] in text: hit[i:i + 3] = [True] * 3
+        covered += sum(hit)
+        total += len(token)
+    return covered / total if total else 0.0
+
+
+class LocalDB:
+    """每個執行緒各自持有一條連線 (sqlite3 連線不可跨執行緒共用)。"""
+
+    def __init__(self, path: str, schema: str = ""):
+        self.path = path
+        self._schema = schema
+        self._local = threading.local()
+        if schema:
+            self.conn.executescript(schema)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.conn.execute(sql, params)
+
+    def executemany(self, sql: str, rows) -> sqlite3.Cursor:
+        return self.conn.executemany(sql, rows)
+
+    def transaction(self):
+        """with db.transaction(): ... — 以 BEGIN IMMEDIATE 包住一批寫入。"""
+        return _Transaction(self.conn)
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+KV_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at);
+CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries(expires_at);
+"""
+
+TOUCH_INTERVAL = 60        # 同一筆資料 60 秒內不重複更新讀取時間，減少寫入
+EVICT_CHECK_EVERY = 50     # 每 50 次寫入檢查一次容量
+
+
+class KVStore:
+    """
+    以 (命名空間, 鍵) 存放 JSON 值的 SQLite 快取。
+    每個命名空間有各自的預設 TTL；總容量超過 max_bytes 時依「最久未讀取」(LRU) 淘汰。
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttls: Optional[Dict[str, int]] = None,
+                 default_ttl: int = 3600):
+        self.db = LocalDB(path, KV_SCHEMA)
+        self.max_bytes = max_bytes
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    # ---------- 底層存取 ----------
+    def get_many(self, ns: str, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(k for k in keys if k))
+        if not keys: return {}
+        now = time.time()
+        found, stale_touch = {}, []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self.db.execute(
+                f"SELECT key, data, accessed_at FROM entries WHERE ns=? AND key IN ({marks}) AND expires_at>?",
+                [ns, *chunk, now]).fetchall()
+            for key, data, accessed_at in rows:
+                found[key] = json.loads(data)
+                if now - accessed_at > TOUCH_INTERVAL: stale_touch.append((now, ns, key))
+        if stale_touch:
+            self.db.executemany("UPDATE entries SET accessed_at=? WHERE ns=? AND key=?", stale_touch)
+        return found
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        return self.get_many(ns, [key]).get(key)
+
+    def put_many(self, ns: str, items: Dict[str, Any], ttl: Optional[int] = None):
+        if not items: return
+        now = time.time()
+        expires = now + (ttl if ttl is not None else self.ttls.get(ns, self.default_ttl))
+        rows = []
+        for key, value in items.items():
+            data = json.dumps(value, ensure_ascii=False)
+            rows.append((ns, key, data, len(data), expires, now))
+        with self.db.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO entries (ns, key, data, size, expires_at, accessed_at) VALUES (?,?,?,?,?,?)", rows)
+        self._maybe_evict(len(rows))
+
+    def put(self, ns: str, key: str, value: Any, ttl: Optional[int] = None):
+        self.put_many(ns, {key: value}, ttl)
+
+    # ---------- 容量控管 ----------
+    def _maybe_evict(self, n_writes: int):
+        with self._lock:
+            self._writes += n_writes
+            if self._writes < EVICT_CHECK_EVERY: return
+            self._writes = 0
+        self.evict()
+
+    def evict(self):
+        """先清掉過期資料，再依最久未讀取淘汰到容量上限的 90%。"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE expires_at<=?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes: return
+            target = total - int(self.max_bytes * 0.9)
+            freed = 0
+            victims = []
+            for ns, key, size in conn.execute("SELECT ns, key, size FROM entries ORDER BY accessed_at ASC"):
+                victims.append((ns, key))
+                freed += size
+                if freed >= target: break
+            conn.executemany("DELETE FROM entries WHERE ns=? AND key=?", victims)
+
+    def stats(self) -> Dict[str, int]:
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total}
@@ -4,22 +4,19 @@
 import warnings
 import os
 import json
-import re
-import pandas as pd
-import time
-import requests
-import concurrent.futures
-import random
-import markdown
-from urllib.parse import urlparse
 from typing import List, Dict, Any, Tuple, Optional
-from datetime import datetime, timedelta
 
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from tenacity import retry, stop_after_attempt, wait_exponential
-from tavily import TavilyClient
+
+from cofacts_mirror import REPLY_TYPES
+from topic_watch import (filter_unseen, get_topic_watch_store, merge_update, new_watch, touch, watch_key,
+                         watch_result, window_days)
+from report_stream import ReportStreamParser
+from stream_render import render_stream
+from news_core import (CSS_STYLE, MAP_REDUCE_MIN_SOURCES, build_delta_prompt, build_search_pipeline,
+                       build_system_prompt, format_citation_style, format_search_context, get_report_render,
+                       merge_search_results, parse_gemini_data, process_timeline_rows, run_map_reduce_analysis,
+                       stream_gemini)
 
 warnings.filterwarnings("ignore")
 os.environ["on_bad_lines"] = "skip"
@@ -29,602 +26,51 @@ os.environ["on_bad_lines"] = "skip"
 # ==========================================
 st.set_page_config(page_title="全域觀點解析 V37.3", page_icon="⚖️", layout="wide")
 
-CSS_STYLE = """
-<style>
-    body { font-family: "Microsoft JhengHei", "Georgia", sans-serif; line-height: 1.6; color: #333; }
-    .stButton button[kind="secondary"] { border: 2px solid #673ab7; color: #673ab7; font-weight: bold; }
-    
-    .report-paper {
-        background-color: #fdfbf7; 
-        color: #2c3e50; 
-        padding: 40px; 
-        border-radius: 4px; 
-        margin-bottom: 15px; 
-        border: 1px solid #e0e0e0;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-        font-family: "Microsoft JhengHei", "Georgia", serif;
-        line-height: 1.8;
-        font-size: 1.05rem;
-    }
-    
-    .citation {
-        font-size: 0.75em;          
-        color: #777777;             
-        background-color: #f4f4f4;  
-        padding: 2px 6px;           
-        border-radius: 4px;         
-        margin: 0 4px;              
-        font-family: sans-serif; 
-        border: 1px solid #e0e0e0;  
-        font-weight: 400;           
-        vertical-align: 1px;        
-        display: inline-block;      
-    }
-
-    .scrollable-table-container {
-        height: 600px; 
-        overflow-y: auto; 
-        border: 1px solid #e0e0e0;
-        border-radius: 8px;
-        background-color: white;
-        margin-bottom: 20px;
-    }
-    .custom-table {
-        width: 100%;
-        border-collapse: collapse;
-        font-family: "Microsoft JhengHei", sans-serif;
-        font-size: 0.95em;
-    }
-    .custom-table th {
-        position: sticky;
-        top: 0;
-        background-color: #f1f3f4;
-        color: #333;
-        font-weight: bold;
-        padding: 12px 15px;
-        text-align: left;
-        border-bottom: 2px solid #ddd;
-        z-index: 2;
-    }
-    .custom-table td {
-        padding: 10px 15px;
-        border-bottom: 1px solid #f0f0f0;
-        vertical-align: middle;
-        color: #333;
-    }
-    .custom-table tr:hover {
-        background-color: #f8f9fa;
-    }
-    .custom-table a {
-        color: #1a73e8;
-        text-decoration: none;
-        font-weight: 500;
-        font-size: 1.05em;
-    }
-    .custom-table a:hover {
-        text-decoration: underline;
-        color: #1557b0;
-    }
-    
-    @media print {
-        .scrollable-table-container { height: auto; overflow: visible; }
-        body { font-size: 12pt; }
-        a { text-decoration: none; color: #000; }
-        .report-paper { box-shadow: none; border: none; padding: 0; }
-    }
-</style>
-"""
 st.markdown(CSS_STYLE, unsafe_allow_html=True)
 
 # ==========================================
-# 2. 資料庫與共用常數 (Config)
-# ==========================================
-BLUE_WHITELIST = ["udn.com", "chinatimes.com", "tvbs.com.tw", "cti.com.tw", "nownews.com", "ctee.com.tw", "storm.mg"]
-GREEN_WHITELIST = ["ltn.com.tw", "ftvnews.com.tw", "setn.com", "rti.org.tw", "newtalk.tw", "mirrormedia.mg", "upmedia.mg"]
-OFFICIAL_WHITELIST = ["cna.com.tw", "pts.org.tw", "mnd.gov.tw", "mac.gov.tw", "tfc-taiwan.org.tw", "gov.tw"]
-FULL_TAIWAN_WHITELIST = BLUE_WHITELIST + GREEN_WHITELIST + OFFICIAL_WHITELIST + ["yahoo.com.tw", "ettoday.net", "businessweekly.com.tw"]
-
-INDIE_WHITELIST = ["twreporter.org", "theinitium.com", "thenewslens.com", "mindiworldnews.com", "vocus.cc", "matters.town", "plainlaw.me"]
-INTL_WHITELIST = ["bbc.com", "cnn.com", "reuters.com", "apnews.com", "bloomberg.com", "wsj.com", "nytimes.com", "dw.com", "voanews.com", "nikkei.com", "nhk.or.jp"]
-
-DOMAIN_NAME_MAP = {
-    "udn.com": "聯合報", "chinatimes.com": "中國時報", "tvbs.com.tw": "TVBS", "cti.com.tw": "中天新聞",
-    "nownews.com": "NOWnews", "ctee.com.tw": "工商時報", "storm.mg": "風傳媒",
-    "ltn.com.tw": "自由時報", "ftvnews.com.tw": "民視新聞", "setn.com": "三立新聞", "rti.org.tw": "央廣",
-    "newtalk.tw": "新頭殼", "mirrormedia.mg": "鏡週刊", "upmedia.mg": "上報",
-    "cna.com.tw": "中央社", "pts.org.tw": "公視", "twreporter.org": "報導者",
-    "theinitium.com": "端傳媒", "thenewslens.com": "關鍵評論網", "mindiworldnews.com": "敏迪選讀",
-    "vocus.cc": "方格子", "ptt.cc": "PTT", "dcard.tw": "Dcard",
-    "bbc.com": "BBC", "cnn.com": "CNN", "reuters.com": "路透社", "apnews.com": "美聯社",
-    "bloomberg.com": "彭博", "wsj.com": "華爾街日報", "nytimes.com": "紐約時報",
-    "mobile01.com": "Mobile01", "yahoo.com": "Yahoo新聞", "ettoday.net": "ETtoday",
-    "businessweekly.com.tw": "商業周刊", "mygopen.com": "MyGoPen"
-}
-
-DB_MAP = {
-    "CHINA": ["xinhuanet", "people.com.cn", "huanqiu", "cctv", "chinadaily", "taiwan.cn", "gwytb", "guancha"],
-    "GREEN": ["ltn", "ftv", "setn", "rti.org", "newtalk", "mirrormedia", "dpp", "upmedia"],
-    "BLUE": ["udn", "chinatimes", "tvbs", "cti", "nownews", "ctee", "kmt", "storm"],
-    "OFFICIAL": ["cna.com", "pts.org", "mnd.gov", "mac.gov", "tfc-taiwan", "gov.tw"],
-    "INDIE": ["twreporter", "theinitium", "thenewslens", "mindiworld", "vocus", "matters", "plainlaw"],
-    "INTL": ["bbc", "cnn", "reuters", "apnews", "bloomberg", "wsj", "nytimes", "dw.com", "voanews", "rfi"],
-    "FARM": ["kknews", "read01", "ppfocus", "buzzhand", "bomb01", "qiqi", "inf.news", "toutiao"],
-    "SOCIAL": ["ptt.cc", "dcard", "mobile01", "facebook", "youtube"]
-}
-
-NOISE_BLACKLIST = ["zhihu.com", "baidu.com", "pinterest.com", "instagram.com", "tiktok.com", "tmall.com", "taobao.com", "163.com", "sohu.com"]
-
-# ==========================================
-# 3. 輔助函式 (Helper Functions)
+# 2. 串流分析與議題追蹤 (需要 Streamlit 的部分；其餘業務邏輯在 news_core.py)
 # ==========================================
+watch_store = get_topic_watch_store()
+# 本地存檔模式：merge = 存檔與即時搜尋合併，off = 只用即時搜尋，only = 只用存檔 (不呼叫 Tavily)
+ARCHIVE_MODES = {"合併本地存檔與即時搜尋": "merge", "只用即時搜尋": "off", "只用本地存檔 (不呼叫 Tavily)": "only"}
 
-def get_domain_name(url: str) -> str:
-    try: return urlparse(url).netloc.replace("www.", "")
-    except: return ""
-
-def classify_source(url: str) -> str:
-    if not url or url == "#": return "OTHER"
-    try:
-        domain = urlparse(url).netloc.lower()
-        clean_domain = domain.replace("www.", "")
-    except: return "OTHER"
-    for cat, keywords in DB_MAP.items():
-        for kw in keywords:
-            if kw in domain: return cat
-    return "OTHER"
-
-def get_category_meta(cat: str) -> Tuple[str, str]:
-    meta = {
-        "CHINA": ("🇨🇳 中國官媒", "#d32f2f"),
-        "FARM": ("⛔ 內容農場", "#ef6c00"),
-        "BLUE": ("🔵 泛藍觀點", "#1565c0"),
-        "GREEN": ("🟢 泛綠觀點", "#2e7d32"),
-        "OFFICIAL": ("⚪ 官方/中立", "#546e7a"),
-        "INDIE": ("🕵️ 獨立/深度", "#fbc02d"),
-        "INTL": ("🌏 國際媒體", "#f57c00"),
-        "VIDEO": ("🟣 影音社群", "#7b1fa2"),
-        "SOCIAL": ("⚠️ 社群聲量", "#607d8b"),
-        "OTHER": ("📄 其他來源", "#9e9e9e")
-    }
-    return meta.get(cat, ("📄 其他來源", "#9e9e9e"))
-
-def format_citation_style(text: str) -> str:
-    if not text: return ""
-    def replacement(match):
-        nums = re.findall(r'\d+', match.group(0))
-        if not nums: return match.group(0)
-        unique_nums = sorted(list(set(nums)), key=int)
-        return f'<span class="citation">Source {", ".join(unique_nums)}</span>'
-    text = re.sub(r'(\[Source \d+\](?:[,;]?\s*\[Source \d+\])*)', replacement, text)
-    text = re.sub(r'([\[\(（]\s*Source\s+[\d,，、\s]+[\]\)）])', replacement, text)
-    return text
-
-def extract_date_from_url(url: str) -> Optional[str]:
-    if not url: return None
-    patterns = [r'/(\d{4})[-/](\d{2})[-/](\d{2})/', r'/(\d{4})(\d{2})(\d{2})/', r'-(\d{4})(\d{2})(\d{2})']
-    for p in patterns:
-        match = re.search(p, url)
-        if match: return f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
-    return None
-
-# [V37.3 New] 核心渲染邏輯抽取 (DRY Fix)
-def process_timeline_rows(timeline_data: List[Dict], sources: List[Dict], blind_mode: bool) -> str:
-    """
-    處理時間軸數據，執行嚴格清洗、排序與格式化。
-    回傳：已排序的 HTML 表格行 (tr/td) 字串。
-    """
-    if not timeline_data: return ""
-    
-    valid_rows = []
-    
-    for item in timeline_data:
-        s_id = item.get('source_id', 0)
-        # 1. 嚴格過濾：無效來源直接丟棄
-        if s_id == 0 or s_id > len(sources): continue
-        
-        source_data = sources[s_id-1]
-        real_url = source_data.get('url', '#')
-        if real_url == "#": continue 
-        
-        # 2. 日期瀑布流
-        meta_date = source_data.get('published_date')
-        url_date = extract_date_from_url(real_url)
-        llm_date = item.get('date')
-        
-        real_date = "1970-01-01" 
-        display_date = "------"
-        
-        if meta_date and meta_date != "Missing": 
-            real_date = meta_date
-            display_date = meta_date
-        elif url_date: 
-            real_date = url_date
-            display_date = url_date
-        elif llm_date and re.match(r'\d{4}-\d{2}-\d{2}', llm_date) and "XX" not in llm_date:
-            real_date = llm_date
-            display_date = llm_date
-        
-        # 3. 媒體名稱模糊匹配
-        cat = classify_source(real_url)
-        label, _ = get_category_meta(cat)
-        domain = get_domain_name(real_url)
-        
-        media_name = domain
-        # Fuzzy match domain name
-        for k, v in DOMAIN_NAME_MAP.items():
-            if k in domain: media_name = v
-        
-        emoji = "⚪"
-        if "中國" in label: emoji = "🔴"
-        elif "泛藍" in label: emoji = "🔵"
-        elif "泛綠" in label: emoji = "🟢"
-        elif "官方" in label: emoji = "⚪"
-        elif "獨立" in label: emoji = "🕵️"
-        elif "國際" in label: emoji = "🌏"
-        elif "農場" in label: emoji = "⛔"
-        elif "社群" in label: emoji = "⚠️"
-        
-        display_media = f"{emoji} {media_name}"
-        if blind_mode: display_media = "*****"
-        
-        title = item.get('title', 'No Title')
-        title_html = f'<a href="{real_url}" target="_blank">{title}</a>'
-        
-        valid_rows.append({
-            "sort_date": real_date,
-            "html": f"<tr><td style='white-space:nowrap;'>{display_date}</td><td style='white-space:nowrap;'>{display_media}</td><td>{title_html}</td></tr>"
-        })
-
-    # 4. 強制按日期排序 (最新的在上面)
-    valid_rows.sort(key=lambda x: x['sort_date'], reverse=True)
-    
-    return "".join([r['html'] for r in valid_rows])
-
-# ==========================================
-# 4. 業務邏輯 (Business Logic)
-# ==========================================
-
-@retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=2, max=5))
-def generate_dynamic_keywords(query: str, api_key: str) -> List[str]:
-    try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=api_key, temperature=0.3)
-        prompt = f"""
-        請針對議題「{query}」，生成 3 組最具情報價值的搜尋關鍵字，分別對應以下三個維度：
-        1. [事實軌]：針對事件發展、時間軸、新聞報導。
-        2. [觀點軌]：針對爭議、正反評論、社論。
-        3. [深度軌]：針對懶人包、影響分析、法規細節。
-        
-        請直接輸出 3 個字串，用逗號分隔，不要標號。
-        範例："{query} 事件進度, {query} 正反爭議, {query} 懶人包重點"
-        """
-        resp = llm.invoke(prompt).content
-        keywords = [k.strip() for k in resp.split(',') if k.strip()]
-        return keywords[:3] if len(keywords) >= 3 else [f"{query} 新聞 事件", f"{query} 爭議 評論", f"{query} 懶人包 分析"]
-    except:
-        return [f"{query} 新聞 事件", f"{query} 爭議 評論", f"{query} 懶人包 分析"] 
-
-def search_cofacts(query: str) -> str:
-    url = "https://cofacts-api.g0v.tw/graphql"
-    graphql_query = """query ListArticles($text: String!) { ListArticles(filter: {q: $text}, orderBy: [{_score: DESC}], first: 3) { edges { node { text articleReplies(status: NORMAL) { reply { text type } } } } } }"""
-    try:
-        response = requests.post(url, json={'query': graphql_query, 'variables': {'text': query}}, timeout=3)
-        if response.status_code == 200:
-            data = response.json()
-            articles = data.get('data', {}).get('ListArticles', {}).get('edges', [])
-            result_text = ""
-            if articles:
-                result_text += "【Cofacts 查核資料庫】\n"
-                for i, art in enumerate(articles):
-                    node = art.get('node', {})
-                    rumor = node.get('text', '')[:50]
-                    replies = node.get('articleReplies', [])
-                    if replies:
-                        r_type = replies[0].get('reply', {}).get('type')
-                        result_text += f"- 謠言: {rumor}... (判定: {r_type})\n"
-            return result_text
-    except: return ""
-    return ""
-
-def execute_hybrid_search(query: str, api_key_tavily: str, search_params: Dict, is_strict_mode: bool, dynamic_keywords: List[str], selected_regions: List[str]) -> List[Dict]:
-    tavily = TavilyClient(api_key=api_key_tavily)
-    seen_urls = set()
-    tasks = []
-    
-    # 1. 通用熱度搜尋 (Tri-Track)
-    general_domains = []
-    if "台灣" in str(selected_regions): general_domains.extend(FULL_TAIWAN_WHITELIST)
-    if "獨立" in str(selected_regions): general_domains.extend(INDIE_WHITELIST)
-    if "亞洲" in str(selected_regions): general_domains.extend(INTL_WHITELIST)
-    
-    general_params = search_params.copy()
-    general_params['max_results'] = 10 
-    if is_strict_mode and general_domains:
-        general_params['include_domains'] = list(set(general_domains))
-    
-    tasks.append({"name": "General_Main", "query": query, "params": general_params})
-    tasks.append({"name": "General_Fact", "query": dynamic_keywords[0], "params": general_params})
-    tasks.append({"name": "General_Opn", "query": dynamic_keywords[1], "params": general_params})
-    tasks.append({"name": "General_Deep", "query": dynamic_keywords[2], "params": general_params})
-    
-    # 2. 分眾保底搜尋 (Hybrid Weighted - Standard Guard)
-    if "台灣" in str(selected_regions):
-        blue_params = search_params.copy()
-        blue_params['max_results'] = 5 
-        blue_params['include_domains'] = BLUE_WHITELIST
-        tasks.append({"name": "Blue_Guard", "query": f"{query}", "params": blue_params})
-        
-        green_params = search_params.copy()
-        green_params['max_results'] = 5 
-        green_params['include_domains'] = GREEN_WHITELIST
-        tasks.append({"name": "Green_Guard", "query": f"{query}", "params": green_params})
-        
-        official_params = search_params.copy()
-        official_params['max_results'] = 5
-        official_params['include_domains'] = OFFICIAL_WHITELIST
-        tasks.append({"name": "Official_Guard", "query": f"{query} 聲明 新聞稿", "params": official_params})
-
-    def fetch(task):
-        try:
-            return tavily.search(query=task['query'], **task['params']).get('results', [])
-        except: return []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(fetch, t): t['name'] for t in tasks}
-        results_map = {}
-        for future in concurrent.futures.as_completed(futures):
-            t_name = futures[future]
-            results_map[t_name] = future.result()
-            
-    final_list = []
-    
-    # A. 優先加入保底
-    guards = ["Blue_Guard", "Green_Guard", "Official_Guard"]
-    for guard_name in guards:
-        if guard_name in results_map:
-            for item in results_map[guard_name]:
-                if item['url'] not in seen_urls:
-                    seen_urls.add(item['url'])
-                    final_list.append(item)
-    
-    # B. 再加入通用 (Tri-Track)
-    general_keys = ["General_Fact", "General_Opn", "General_Deep", "General_Main"]
-    max_len = max([len(results_map.get(k, [])) for k in general_keys]) if general_keys else 0
-    
-    for i in range(max_len):
-        for key in general_keys:
-            if key in results_map and i < len(results_map[key]):
-                item = results_map[key][i]
-                if item['url'] not in seen_urls:
-                    seen_urls.add(item['url'])
-                    final_list.append(item)
-                
-    return final_list
-
-def get_search_context(query: str, api_key_tavily: str, days_back: int, selected_regions: List[str], max_results: int, dynamic_keywords: List[str]):
-    try:
-        active_blacklist = NOISE_BLACKLIST
-
-        search_params = {
-            "search_depth": "advanced",
-            "topic": "general",
-            "days": days_back,
-            "exclude_domains": active_blacklist
-        }
-
-        is_strict_mode = bool(selected_regions)
-        results = execute_hybrid_search(query, api_key_tavily, search_params, is_strict_mode, dynamic_keywords, selected_regions)
-        
-        results.sort(key=lambda x: x.get('published_date') or "", reverse=True)
-        results = results[:max_results]
-        
-        context_text = ""
-        for i, res in enumerate(results):
-            title = res.get('title', 'No Title')
-            url = res.get('url', '#')
-            
-            pub_date = res.get('published_date')
-            if not pub_date:
-                url_date = extract_date_from_url(url)
-                pub_date = url_date if url_date else "Missing"
-            else:
-                pub_date = pub_date[:10]
-            
-            res['final_date'] = pub_date
-            content = res.get('content', '')[:3000]
-            context_text += f"Source {i+1}: [Date: {pub_date}] [Title: {title}] {content} (URL: {url})\n"
-            
-        return context_text, results, query, is_strict_mode
-        
-    except Exception as e:
-        return f"Error: {str(e)}", [], "Error", False
-
-@retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=2, max=5), reraise=True)
-def call_gemini(system_prompt: str, user_text: str, model_name: str, api_key: str) -> str:
-    os.environ["GOOGLE_API_KEY"] = api_key
-    llm = ChatGoogleGenerativeAI(model=model_name, temperature=0.0)
-    prompt = ChatPromptTemplate.from_messages([("system", system_prompt), ("human", "{input}")])
-    chain = prompt | llm
-    return chain.invoke({"input": user_text}).content
-
-def run_strategic_analysis(query: str, context_text: str, model_name: str, api_key: str, mode: str="FUSION") -> str:
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    
-    tone_instruction = """
-    【⚠️ 語氣風格指令】：
-    1. **極度審慎**：嚴禁臆測。若證據不足，請直接標示「目前資訊不足」。
-    2. **去軍事化**：嚴禁使用軍事隱喻。
-    3. **中性專業**：使用社會科學術語。
+def stream_strategic_analysis(query: str, context_text: str, model_name: str, api_key: str, sources: List[Dict],
+                              blind_mode: bool, mode: str="FUSION", system_prompt: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
     """
-
-    if mode == "FUSION":
-        system_prompt = f"""
-        你是一位極度嚴謹的情報分析師。
-        
-        【⚠️ 時間錨點】：今天是 {today_str}。
-        {tone_instruction}
-        
-        【⚠️ 數據結構指令】：輸出 Source ID (如 Source 1)。
-        
-        【分析方法論】：
-        1. **邏輯謬誤偵測**：指出滑坡謬誤、稻草人論證。
-        2. **證據強度分級**：評估證據力（強/弱）。
-        3. **聲量權重校正**：識別複讀機，挖掘長尾觀點。
-        
-        【輸出格式 (嚴格遵守)】：
-        ### [DATA_TIMELINE]
-        (格式：YYYY-MM-DD|媒體|標題|Source_ID)
-        *請注意：只能列出 Context 中實際存在的 Source，嚴禁捏造 Source ID。若無 Source ID 則不列出。*
-        
-        ### [REPORT_TEXT]
-        (Markdown 報告 - 繁體中文)
-        1. **📊 全域現況摘要 (Situational Analysis)**
-           - 請以 **Markdown 表格** 呈現關鍵事件時間軸 (欄位包含：日期 | 事件摘要 | 關鍵影響)。
-        2. **🔍 爭議點與事實查核 (Fact-Check & Logic Scan)**
-           - *包含：邏輯謬誤偵測、證據強度評估*
-        3. **⚖️ 媒體框架光譜分析 (Framing Analysis)**
-           - *請應用聲量權重校正，指出話語權是否失衡*
-        4. **🧠 深度識讀與利益分析 (Cui Bono)**
-        5. **🤔 結構性反思 (Structural Reflection)**
-        """
-        
-    elif mode == "DEEP_SCENARIO":
-        system_prompt = f"""
-        你是一位專精於未來學 (Futures Studies) 的戰略顧問。
-        
-        【⚠️ 時間錨點】：今天是 {today_str}。
-        {tone_instruction}
-        
-        【分析任務】：
-        1. **早期預警指標**：列出監測訊號。
-        2. **驗屍分析**：反推失敗變數。
-
-        【輸出格式】：
-        ### [DATA_TIMELINE]
-        (留空)
-        
-        ### [REPORT_TEXT]
-        (Markdown 報告 - 繁體中文)
-        1. **🎯 CLA 深度解構 (Causal Layered Analysis)**
-           - Litany / System / Worldview / Myth
-        2. **🔮 未來趨勢路徑模擬 (Scenario Planning)**
-           - **基準路徑 (Baseline)** + 🚩 預警指標
-           - **轉折路徑 (Alternative)** + 🚩 預警指標
-           - **極端路徑 (Wild Card)** + 🚩 預警指標
-        3. **💀 驗屍分析 (Pre-mortem Analysis)**
-        4. **💡 綜合發展與因應建議**
-        """
-    else:
-        system_prompt = f"請針對 {query} 進行分析。"
-
-    return call_gemini(system_prompt, context_text, model_name, api_key)
-
-def parse_gemini_data(text: str) -> Dict[str, Any]:
-    data = {"timeline": [], "report_text": ""}
-    if not text: return data
-
-    lines = text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if "|" in line and len(line.split("|")) >= 3 and (line[0].isdigit() or "20" in line or "Future" in line or "近期" in line):
-            parts = line.split("|")
-            try:
-                date = parts[0].strip()
-                name = parts[1].strip()
-                title = parts[2].strip()
-                source_id_str = "0"
-                if len(parts) >= 4: 
-                    raw_id = parts[3].strip()
-                    nums = re.findall(r'\d+', raw_id)
-                    if nums: source_id_str = nums[0]
-                if "XX" in date or "xx" in date: date = "近期"
-                
-                data["timeline"].append({
-                    "date": date,
-                    "media": name,
-                    "title": title,
-                    "source_id": int(source_id_str)
-                })
-            except: pass
-
-    if "### [REPORT_TEXT]" in text:
-        data["report_text"] = text.split("### [REPORT_TEXT]")[1].strip()
-    elif "### REPORT_TEXT" in text:
-        data["report_text"] = text.split("### REPORT_TEXT")[1].strip()
-    else:
-        match = re.search(r"(#+\s*.*摘要|1\.\s*.*摘要|#+\s*.*CLA)", text)
-        if match:
-            data["report_text"] = text[match.start():]
-        else:
-            data["report_text"] = text
-
-    return data
-
-def create_full_html_report(data_result, scenario_result, sources, blind_mode) -> str:
-    # [V37.3] 使用重構後的邏輯
-    table_rows = process_timeline_rows(data_result.get("timeline", []), sources, blind_mode)
-    
-    timeline_html = ""
-    if table_rows:
-        timeline_html = f"""
-        <h3>📅 關鍵發展時序</h3>
-        <table class="custom-table" border="1" cellspacing="0" cellpadding="5" style="width:100%; border-collapse:collapse;">
-            <thead><tr><th width="120">日期</th><th width="180">媒體來源 (Code Verified)</th><th>新聞標題 (點擊閱讀)</th></tr></thead>
-            <tbody>{table_rows}</tbody>
-        </table>
-        <hr>
-        """
-
-    report_html_1 = ""
-    if data_result:
-        raw_md = data_result.get("report_text", "")
-        html_content = markdown.markdown(raw_md, extensions=['tables'])
-        final_html = format_citation_style(html_content)
-        report_html_1 = f'<div class="report-paper"><h3>📝 平衡報導分析</h3>{final_html}</div>'
-
-    report_html_2 = ""
-    if scenario_result:
-        raw_md_2 = scenario_result.get("report_text", "")
-        html_content_2 = markdown.markdown(raw_md_2, extensions=['tables'])
-        final_html_2 = format_citation_style(html_content_2)
-        report_html_2 = f'<div class="report-paper"><h3>🔮 未來發展推演報告</h3>{final_html_2}</div>'
-
-    sources_html = ""
-    if sources:
-        s_rows = ""
-        for i, s in enumerate(sources):
-            domain = get_domain_name(s.get('url'))
-            media_name = domain
-            for k, v in DOMAIN_NAME_MAP.items():
-                if k in domain: media_name = v
-                
-            title = s.get('title', 'No Title')
-            url = s.get('url')
-            s_rows += f"<li><b>[{i+1}]</b> {media_name} - <a href='{url}' target='_blank'>{title}</a></li>"
-        sources_html = f"<hr><h3>📚 引用文獻列表</h3><ul>{s_rows}</ul>"
-
-    full_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>全域觀點分析報告</title>
-        {CSS_STYLE}
-    </head>
-    <body style="padding: 20px; max-width: 900px; margin: 0 auto;">
-        <h1>全域觀點分析報告 (V37.3)</h1>
-        <p>生成時間: {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-        {timeline_html}
-        {report_html_1}
-        {report_html_2}
-        {sources_html}
-    </body>
-    </html>
+    串流執行分析並即時渲染：時間軸列一解析出來就畫進時序表，報告本文邊產生邊顯示。
+    回傳 (原始全文, parse_gemini_data 相同結構的結果)；中途出錯時保留已產生的部分。
+    system_prompt 未指定時使用 build_system_prompt(query, mode)。
     """
-    return full_html
-
-def render_html_timeline(timeline_data, sources, blind_mode):
-    # [V37.3] 直接呼叫重構後的邏輯
-    table_rows = process_timeline_rows(timeline_data, sources, blind_mode)
+    parser = ReportStreamParser()
+    timeline_box = st.empty()
+    report_box = st.empty()
+    shown_rows = [0]
+
+    def tap(chunks):
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield chunk
+
+    def render(text, done):
+        if len(parser.timeline) != shown_rows[0]:
+            shown_rows[0] = len(parser.timeline)
+            render_html_timeline(parser.timeline, sources, blind_mode, timeline_box.container())
+        body = format_citation_style(parser.report_text)
+        if body: report_box.markdown(f'<div class="report-paper">{body}{"" if done else " ▌"}</div>', unsafe_allow_html=True)
+
+    chunks = stream_gemini(system_prompt or build_system_prompt(query, mode), context_text, model_name, api_key)
+    text, error = render_stream(tap(chunks), render)
+    result = parser.result()
+    if error is not None:
+        result["report_text"] += f"\n\n> ⚠️ 生成中斷：{error}（以上為中斷前已產生的內容）"
+    timeline_box.empty()
+    report_box.empty()
+    return text, result
+
+def render_html_timeline(timeline_data, sources, blind_mode, target=st, table_rows: Optional[str] = None):
+    # [V37.3] 直接呼叫重構後的邏輯；已經算好的 table_rows (渲染快取) 可直接傳入
+    if table_rows is None: table_rows = process_timeline_rows(timeline_data, sources, blind_mode)
     if not table_rows: return
 
     full_html = f"""
@@ -643,31 +89,10 @@ def render_html_timeline(timeline_data, sources, blind_mode):
     </table>
     </div>
     """
-    st.markdown("### 📅 關鍵發展時序")
-    st.markdown(full_html, unsafe_allow_html=True)
-
-def export_full_state():
-    data = {
-        "result": st.session_state.result,
-        "scenario_result": st.session_state.scenario_result,
-        "sources": st.session_state.sources
-    }
-    return json.dumps(data, indent=2, ensure_ascii=False)
-
-def convert_data_to_md(data):
-    return f"""
-# 全域觀點分析報告 (V37.3)
-产生時間: {datetime.now()}
-
-## 1. 平衡報導分析
-{data.get('report_text')}
-
-## 2. 時間軸
-{pd.DataFrame(data.get('timeline')).to_markdown(index=False)}
-    """
-
+    target.markdown("### 📅 關鍵發展時序")
+    target.markdown(full_html, unsafe_allow_html=True)
 # ==========================================
-# 5. UI
+# 3. UI
 # ==========================================
 with st.sidebar:
     st.title("全域觀點解析 V37.3")
@@ -695,6 +120,13 @@ with st.sidebar:
         
         search_days = st.number_input("搜尋時間範圍 (天數)", min_value=1, max_value=1825, value=30, step=1)
         max_results = st.slider("搜尋篇數上限", 10, 100, 30)
+        context_budget = st.number_input("分析素材預算 (tokens，0 = 不限)", min_value=0, max_value=1000000, value=60000, step=10000, help="超過預算時，依議題與關鍵字挑出每篇最相關的句子，Source 編號不變")
+        fusion_strategy = st.selectbox("分析策略 (全域深度解析)", ["自動", "單次呼叫", "分片：依媒體陣營", "分片：依時間"], index=0, help=f"分片模式先平行摘要各批來源，再合併成報告；「自動」在來源超過 {MAP_REDUCE_MIN_SOURCES} 篇時依陣營分片")
+        use_cache_stale = st.toggle("⚡ 先用快取結果、背景更新", value=True, help="相同搜尋條件的過期快取會先直接使用，同時在背景重新搜尋；關閉則過期時一律重新搜尋")
+        watch_mode = st.toggle("👁️ 追蹤議題 (只分析上次之後的新報導)", value=False, help="同一議題 + 視角第一次完整分析並存檔；之後只搜尋高水位以後的時間窗，模型只分析新報導並對照前次報告 (僅限全域深度解析)")
+        archive_mode = ARCHIVE_MODES[st.selectbox("本地新聞存檔", list(ARCHIVE_MODES), index=0, help="每次搜尋到的來源都會存進本地存檔；追蹤同一議題時可直接取用，不必再付一次搜尋費用")]
+        cofacts_top_k = st.number_input("Cofacts 查核筆數", min_value=0, max_value=20, value=3, step=1, help="已匯入本地鏡像 (python cofacts_mirror.py import) 時離線查詢，否則使用即時 API")
+        cofacts_types = st.multiselect("Cofacts 回應類型", list(REPLY_TYPES), default=list(REPLY_TYPES), format_func=REPLY_TYPES.get)
         
         selected_regions = st.multiselect(
             "搜尋視角 (Region) - 可複選",
@@ -795,15 +227,11 @@ with st.sidebar:
         
     st.markdown("### 📥 報告匯出")
     if st.session_state.get('result') or st.session_state.get('scenario_result'):
-        html_report = create_full_html_report(st.session_state.result, st.session_state.scenario_result, st.session_state.sources, blind_mode)
-        st.download_button("📥 列印用檔案 (HTML)", html_report, "Printable_Report.html", "text/html")
-        full_state_json = export_full_state()
-        st.download_button("📥 完整狀態 (JSON)", full_state_json, "Full_State.json", "application/json")
-        
-        export_data = st.session_state.get('result').copy()
-        if st.session_state.get('scenario_result'):
-            export_data['report_text'] += "\n\n# 未來發展推演報告\n" + st.session_state.get('scenario_result')['report_text']
-        st.download_button("📥 純文字 (Markdown)", convert_data_to_md(export_data), "report.md", "text/markdown")
+        # 傳入 callable：按下下載時才產生檔案，rerun 時不再重新轉檔
+        report_render = get_report_render(st.session_state.result, st.session_state.scenario_result, st.session_state.sources, blind_mode)
+        st.download_button("📥 列印用檔案 (HTML)", report_render.full_html, "Printable_Report.html", "text/html")
+        st.download_button("📥 完整狀態 (JSON)", report_render.state_json, "Full_State.json", "application/json")
+        st.download_button("📥 純文字 (Markdown)", report_render.markdown_text, "report.md", "text/markdown")
 
 st.title(f"{analysis_mode.split(' ')[0]}")
 query = st.text_input("輸入議題關鍵字", placeholder="例如：台積電美國設廠爭議")
@@ -813,88 +241,124 @@ if 'result' not in st.session_state: st.session_state.result = None
 if 'scenario_result' not in st.session_state: st.session_state.scenario_result = None
 if 'sources' not in st.session_state: st.session_state.sources = None
 
-if search_btn and query and google_key and tavily_key:
+if search_btn and query and google_key and (tavily_key or archive_mode == "only"):
     st.session_state.result = None
     st.session_state.scenario_result = None
     
     with st.status("🚀 啟動 V37.3 平衡報導分析引擎...", expanded=True) as status:
         
-        st.write("🧠 1. 生成動態搜尋策略...")
-        dynamic_keywords = generate_dynamic_keywords(query, google_key)
-        st.write(f"   ↳ 鎖定戰略關鍵字: {', '.join(dynamic_keywords)}")
-        
         regions_label = ", ".join([r.split(" ")[1] for r in selected_regions])
-        st.write(f"📡 2. 執行混和權重搜尋 (視角: {regions_label})...")
-        st.write("   ↳ 啟動機制：分眾保底 (藍/綠/官方) + 熱度補完 (動態三軌)")
+        st.write(f"🧠 1. 生成動態搜尋策略 ‖ 📡 2. 混和權重搜尋 (視角: {regions_label}) ‖ 🛡️ 3. Cofacts 謠言資料庫")
+        st.write("   ↳ 啟動機制：分眾保底 (藍/綠/官方) + 熱度補完 (動態三軌)；不依賴關鍵字的搜尋與 Cofacts 同時開始")
+        
+        def on_stage_done(stage):
+            if stage.skipped:
+                st.write(f"   ⏭️ {stage.name}：上游失敗，略過")
+            elif stage.error is not None:
+                st.write(f"   ⚠️ {stage.name} 失敗 ({stage.elapsed:.1f}s)：{stage.error}")
+            elif stage.name == "keywords":
+                st.write(f"   ↳ 鎖定戰略關鍵字: {', '.join(stage.result)} ({stage.elapsed:.1f}s)")
+            elif stage.name == "cofacts":
+                st.write(f"   ↳ Cofacts 查詢完成 ({stage.elapsed:.1f}s)")
+            else:
+                st.write(f"   ↳ {stage.name}：{len(stage.result)} 篇 ({stage.elapsed:.1f}s)")
         
-        context_text, sources, actual_query, is_strict_tw = get_search_context(
-            query, tavily_key, search_days, selected_regions, max_results, dynamic_keywords
-        )
+        mode_code = "DEEP_SCENARIO" if "未來" in analysis_mode else "FUSION"
+        topic_key = watch_key(query, selected_regions)
+        watch = watch_store.load(topic_key) if (watch_mode and mode_code == "FUSION") else None
+        days_back = window_days(watch, search_days) if watch else search_days
+        if watch:
+            st.write(f"👁️ 追蹤模式：高水位 {watch.get('high_water') or watch.get('last_run')}，只搜尋最近 {days_back} 天 (已累積 {len(watch['sources'])} 篇)")
+        
+        pipe = build_search_pipeline(query, google_key, tavily_key, days_back, selected_regions, use_cache_stale,
+                                     cofacts_top_k, cofacts_types, archive_mode)
+        stage_results = pipe.run(on_stage_done)
+        results_map = {k: v for k, v in stage_results.items() if k not in ("keywords", "cofacts") and v is not None}
+        query_texts = [query] + list(stage_results.get("keywords") or [])
+        merged_results = merge_search_results(results_map)
+        if watch:
+            fresh = filter_unseen(watch, merged_results)
+            st.write(f"   ↳ 追蹤模式：{len(merged_results)} 篇中有 {len(fresh)} 篇是新報導")
+            context_text, new_sources = format_search_context(fresh, max_results, query_texts, context_budget, first_id=len(watch['sources']) + 1)
+            sources = watch['sources'] + new_sources
+        else:
+            context_text, sources = format_search_context(merged_results, max_results, query_texts, context_budget)
+        is_strict_tw = bool(selected_regions)
         
         st.write(f"   ↳ 搜尋完成：共獲取 {len(sources)} 篇資料 (已去重)。")
         if is_strict_tw:
-            st.write(f"🛡️ 網域圍籬已啟動。")
+            st.write("🛡️ 網域圍籬已啟動。")
+        timing = pipe.timing()
+        st.write(f"⏱️ 關鍵路徑：{' → '.join(s.name for s in pipe.critical_path())}；實際耗時 {timing['wall']:.1f}s (循序執行需 {timing['serial']:.1f}s)")
         
         st.session_state.sources = sources
         
-        st.write("🛡️ 3. 查詢 Cofacts 謠言資料庫...")
-        cofacts_txt = search_cofacts(query)
+        cofacts_txt = stage_results.get("cofacts")
+        sources_context = context_text
         if cofacts_txt: context_text += f"\n{cofacts_txt}\n"
         
         st.write("🧠 4. AI 進行深度戰略分析 (ACH 競爭假設 + 邏輯偵錯)...")
         
-        mode_code = "DEEP_SCENARIO" if "未來" in analysis_mode else "FUSION"
         analysis_context = past_report_input if (mode_code == "DEEP_SCENARIO" and past_report_input) else context_text
 
-        raw_report = run_strategic_analysis(query, analysis_context, model_name, google_key, mode=mode_code)
-        st.session_state.result = parse_gemini_data(raw_report)
+        shard_by = {"分片：依媒體陣營": "category", "分片：依時間": "time"}.get(fusion_strategy)
+        if fusion_strategy == "自動" and len(sources) > MAP_REDUCE_MIN_SOURCES: shard_by = "category"
+        if watch and not new_sources:
+            st.write("   ↳ 沒有新報導，沿用前次報告")
+            watch = touch(watch)
+            st.session_state.result = watch_result(watch)
+        elif watch:
+            st.write(f"   ↳ 增量分析：只送出 {len(new_sources)} 篇新報導，對照前次報告")
+            raw_report, delta = stream_strategic_analysis(
+                query, context_text, model_name, google_key, sources, blind_mode, mode="FUSION",
+                system_prompt=build_delta_prompt(query, watch)
+            )
+            watch = merge_update(watch, new_sources, delta)
+            st.session_state.result = watch_result(watch)
+        elif mode_code == "FUSION" and shard_by:
+            st.write(f"   ↳ 分片 Map-Reduce ({'媒體陣營' if shard_by == 'category' else '時間'})：各分片平行摘要後再合併")
+            raw_report = run_map_reduce_analysis(
+                query, sources_context, sources, model_name, google_key, shard_by, cofacts_txt or "",
+                on_shard_done=lambda label, ids: st.write(f"   ↳ 分片完成：{label} ({len(ids)} 篇)")
+            )
+            st.session_state.result = parse_gemini_data(raw_report)
+        else:
+            raw_report, st.session_state.result = stream_strategic_analysis(
+                query, analysis_context, model_name, google_key, sources, blind_mode, mode=mode_code
+            )
+        if watch_mode and mode_code == "FUSION":
+            watch_store.save(topic_key, watch or new_watch(query, selected_regions, sources, st.session_state.result))
             
         status.update(label="✅ 分析完成", state="complete", expanded=False)
         
     st.rerun()
 
+report_render = get_report_render(st.session_state.result, st.session_state.scenario_result, st.session_state.sources, blind_mode)
+
 if st.session_state.result:
     data = st.session_state.result
-    render_html_timeline(data.get("timeline"), st.session_state.sources, blind_mode)
+    render_html_timeline(data.get("timeline"), st.session_state.sources, blind_mode, table_rows=report_render.timeline_rows)
 
     st.markdown("---")
     st.markdown("### 📝 平衡報導分析")
-    formatted_text = format_citation_style(data.get("report_text", ""))
-    html_content = markdown.markdown(formatted_text, extensions=['tables'])
-    st.markdown(f'<div class="report-paper">{html_content}</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="report-paper">{report_render.report_html}</div>', unsafe_allow_html=True)
     
     if "未來" not in analysis_mode and not st.session_state.scenario_result:
         st.markdown("---")
         if st.button("🚀 將此結果餵給未來發展推演 (資訊滾動)", type="secondary"):
-            with st.spinner("🔮 正在讀取前次情報，啟動 CLA 層次分析與未來推演..."):
-                current_report = data.get("report_text", "")
-                raw_text = run_strategic_analysis(query, current_report, model_name, google_key, mode="DEEP_SCENARIO")
-                st.session_state.scenario_result = parse_gemini_data(raw_text) 
-                st.rerun()
+            st.caption("🔮 正在讀取前次情報，啟動 CLA 層次分析與未來推演...")
+            current_report = data.get("report_text", "")
+            _, st.session_state.scenario_result = stream_strategic_analysis(
+                query, current_report, model_name, google_key, st.session_state.sources or [], blind_mode, mode="DEEP_SCENARIO"
+            )
+            st.rerun()
 
 if st.session_state.scenario_result:
     st.markdown("---")
     st.markdown("### 🔮 未來發展推演報告")
-    scenario_data = st.session_state.scenario_result
-    formatted_scenario = format_citation_style(scenario_data.get("report_text", ""))
-    html_scenario = markdown.markdown(formatted_scenario, extensions=['tables'])
-    st.markdown(f'<div class="report-paper">{html_scenario}</div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="report-paper">{report_render.scenario_html}</div>', unsafe_allow_html=True)
 
 if st.session_state.sources:
     st.markdown("---")
     st.markdown("### 📚 引用文獻列表")
-    md_table = "| 編號 | 媒體/網域 | 標題摘要 | 連結 |\n|:---:|:---|:---|:---|\n"
-    for i, s in enumerate(st.session_state.sources):
-        domain = get_domain_name(s.get('url'))
-        
-        media_name = domain
-        for k, v in DOMAIN_NAME_MAP.items():
-            if k in domain: media_name = v
-            
-        if blind_mode: media_name = "*****"
-        
-        title = s.get('title', 'No Title')
-        if len(title) > 60: title = title[:60] + "..."
-        url = s.get('url')
-        md_table += f"| **{i+1}** | `{media_name}` | {title} | [點擊]({url}) |\n"
-    st.markdown(md_table)
+    st.markdown(report_render.sources_md)
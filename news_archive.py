@@ -0,0 +1,142 @@
+# ==========================================
+# 跨 session 的新聞存檔 (SQLite FTS5)
+# ==========================================
+# 每次掃描抓回來的來源在 session 結束後就丟掉了，追蹤同一個議題時只能再付一次 Tavily。
+# 這裡把每篇抓到的來源 (title / url / content / published_date / 立場分類) 落地：
+# - 以 canonical_url 去重；同一篇再次抓到時保留較長的內文，並更新 last_seen
+# - 標題 + 內文建 FTS5 trigram 索引，query() 以 bm25 排序，可限定天數、立場分類與網域
+#   (網域比照 Tavily 的 include_domains：gov.tw 也涵蓋 mnd.gov.tw)
+# - 回傳的格式與 Tavily 結果相同，可以直接丟進 merge_search_results
+# trigram 以 OR 查詢時，只共用一兩個 trigram 的無關報導也會被撈出來；
+# 因此候選結果還要再過一道「涵蓋率」門檻 (見 coverage)。
+import time
+import threading
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from local_db import LocalDB, coverage, db_path, trigram_match, trigrams
+from source_dedup import canonical_url
+
+MIN_COVERAGE = 0.5       # 至少要含有某一組查詢詞一半的 trigram，擋掉只沾到一兩個字的舊報導
+CANDIDATES = 3           # 先取 limit 的幾倍候選，再依涵蓋率過濾
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    pk INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    published_date TEXT,
+    pub_day TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT 'OTHER',
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sources_day ON sources(pub_day);
+CREATE VIRTUAL TABLE IF NOT EXISTS sources_fts USING fts5(title, content, content='sources', content_rowid='pk', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS sources_ai AFTER INSERT ON sources BEGIN
+    INSERT INTO sources_fts(rowid, title, content) VALUES (new.pk, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS sources_ad AFTER DELETE ON sources BEGIN
+    INSERT INTO sources_fts(sources_fts, rowid, title, content) VALUES ('delete', old.pk, old.title, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS sources_au AFTER UPDATE OF title, content ON sources BEGIN
+    INSERT INTO sources_fts(sources_fts, rowid, title, content) VALUES ('delete', old.pk, old.title, old.content);
+    INSERT INTO sources_fts(rowid, title, content) VALUES (new.pk, new.title, new.content);
+END;
+"""
+
+
+def normalize_day(published_date: Optional[str]) -> str:
+    """Tavily 的 published_date 有 ISO 與 RFC 2822 兩種寫法，統一成 YYYY-MM-DD；無法解析時回傳空字串。"""
+    if not published_date: return ""
+    text = published_date.strip()
+    try: return datetime.fromisoformat(text.replace("Z", "+00:00")).strftime("%Y-%m-%d")
+    except ValueError: pass
+    try: return parsedate_to_datetime(text).strftime("%Y-%m-%d")
+    except (TypeError, ValueError): return ""
+
+
+class NewsArchive:
+    def __init__(self, path: str):
+        self.db = LocalDB(path, ARCHIVE_SCHEMA)
+
+    def ingest(self, results: Iterable[Dict], category_fn: Callable[[str], str] = lambda u: "OTHER") -> int:
+        """寫入 (或更新) 一批 Tavily 結果，回傳處理的筆數。"""
+        now = time.time()
+        rows = []
+        for r in results:
+            url = r.get("url")
+            if not url or url == "#": continue
+            published = r.get("published_date")
+            rows.append((canonical_url(url), url, r.get("title") or "", r.get("content") or "", published,
+                         normalize_day(published), category_fn(url), now, now))
+        if not rows: return 0
+        with self.db.transaction() as conn:
+            conn.executemany(
+                """INSERT INTO sources (key, url, title, content, published_date, pub_day, category, first_seen, last_seen)
+                   VALUES (?,?,?,?,?,?,?,?,?)
+                   ON CONFLICT(key) DO UPDATE SET
+                       last_seen = excluded.last_seen,
+                       published_date = COALESCE(sources.published_date, excluded.published_date),
+                       pub_day = CASE WHEN sources.pub_day = '' THEN excluded.pub_day ELSE sources.pub_day END,
+                       title = CASE WHEN length(excluded.content) > length(sources.content) THEN excluded.title ELSE sources.title END,
+                       content = CASE WHEN length(excluded.content) > length(sources.content) THEN excluded.content ELSE sources.content END""",
+                rows)
+        return len(rows)
+
+    def query(self, query_texts: Sequence[str], days_back: Optional[int] = None, limit: int = 20,
+              categories: Optional[Sequence[str]] = None, domains: Optional[Sequence[str]] = None,
+              min_coverage: float = MIN_COVERAGE) -> List[Dict]:
+        """
+        以議題 / 關鍵字全文檢索存檔，依 bm25 取前 limit 篇。
+        days_back 限定發布日期 (沒有發布日期的以最後抓到的時間判斷)；categories 限定立場分類；
+        domains 限定網域 (含子網域)；
+        每篇至少要涵蓋某一組查詢詞 min_coverage 比例的 trigram。
+        """
+        match = trigram_match(*query_texts)
+        if not match or limit <= 0: return []
+        sql = ["""SELECT s.url, s.title, s.content, s.published_date, s.category, bm25(sources_fts, 3.0, 1.0)
+                  FROM sources_fts JOIN sources s ON s.pk = sources_fts.rowid
+                  WHERE sources_fts MATCH ?"""]
+        params: List = [match]
+        if days_back:
+            cutoff = datetime.now() - timedelta(days=days_back)
+            sql.append("AND (s.pub_day >= ? OR (s.pub_day = '' AND s.last_seen >= ?))")
+            params += [cutoff.strftime("%Y-%m-%d"), cutoff.timestamp()]
+        if categories:
+            sql.append(f"AND s.category IN ({','.join('?' * len(categories))})")
+            params += list(categories)
+        if domains:
+            # key 是 canonical_url (//host/path?query)，host 已轉小寫
+            hosts = [d.lower() for d in domains]
+            sql.append("AND (" + " OR ".join("s.key LIKE ? OR s.key LIKE ?" for _ in hosts) + ")")
+            for h in hosts: params += [f"//{h}/%", f"//%.{h}/%"]
+        sql.append("ORDER BY bm25(sources_fts, 3.0, 1.0) LIMIT ?")
+        params.append(limit * CANDIDATES)
+        gram_sets = [g for g in (trigrams(t) for t in query_texts) if g]
+        hits = []
+        for url, title, content, published, category, rank in self.db.execute(" ".join(sql), params):
+            if max(coverage(g, f"{title} {content}") for g in gram_sets) < min_coverage: continue
+            hits.append({"url": url, "title": title, "content": content, "published_date": published,
+                         "category": category, "score": -rank, "archived": True})
+            if len(hits) >= limit: break
+        return hits
+
+    def stats(self) -> Dict[str, int]:
+        count, days = self.db.execute("SELECT COUNT(*), COUNT(DISTINCT pub_day) FROM sources").fetchone()
+        return {"sources": count, "days": days}
+
+
+_archive: Optional[NewsArchive] = None
+_archive_lock = threading.Lock()
+
+def get_news_archive() -> NewsArchive:
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = NewsArchive(db_path("news_archive.sqlite3"))
+    return _archive
@@ -0,0 +1,174 @@
+# ==========================================
+# 全域觀點解析：批次 / 排程執行 (不需要 Streamlit)
+# ==========================================
+# 一次跑一整份議題清單 (例如每晚 50 個議題簡報)，每個議題依序經過：
+#   keywords (generate_dynamic_keywords) → search (get_search_context) → cofacts (search_cofacts)
+#   → analysis (run_strategic_analysis / 分片 map-reduce) → outputs (HTML / JSON / MD)
+# - 多個議題同時執行 (--concurrency)；對外呼叫仍受 provider_slot 的行程層級上限約束
+#   (Tavily / Cofacts / Gemini 各自的同時連線數，可用 RADAR_LIMIT_<NAME> 覆寫)
+# - 每完成一個階段就寫入 <out>/<議題>/checkpoint.json；重跑同一個指令時已完成的階段直接沿用，
+#   失敗的議題從失敗的那個階段接著跑。設定 (天數、模型、視角…) 改變時該議題從頭開始
+#   關鍵字、Cofacts、分片分析以 strict=True 呼叫：失敗時拋出例外而不是回傳預設值 / 空字串 /「分片失敗」，
+#   降級的結果不會寫進檢查點，重跑時會重試
+# - 結束時輸出每個議題各階段耗時的 summary.json，並印出摘要表
+# 用法：python news_batch.py topics.txt -o batch_out --concurrency 4
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import concurrent.futures
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from news_core import (MAP_REDUCE_MIN_SOURCES, convert_data_to_md, create_full_html_report,
+                       export_full_state, generate_dynamic_keywords, get_search_context, parse_gemini_data,
+                       run_map_reduce_analysis, run_strategic_analysis, search_cofacts)
+from stage_checkpoint import StageCheckpoint, read_list, safe_name, write_atomic
+
+STAGES = ("keywords", "search", "cofacts", "analysis", "outputs")
+REGIONS = {
+    "taiwan": "🇹🇼 台灣 (Taiwan)",
+    "asia": "🌏 亞洲 (Asia)",
+    "europe": "🌍 歐洲 (Europe)",
+    "americas": "🌎 美洲 (Americas)",
+    "indie": "🕵️ 獨立/自媒體 (Indie)",
+}
+STRATEGIES = ("auto", "single", "category", "time")
+
+_print_lock = threading.Lock()
+
+def log(msg: str):
+    with _print_lock: print(f"[{datetime.now():%H:%M:%S}] {msg}", flush=True)
+
+
+class TopicRun(StageCheckpoint):
+    """單一議題的階段檢查點，存在 <out>/<議題>/checkpoint.json。"""
+
+    def __init__(self, query: str, out_dir: str, config: Dict[str, Any], fresh: bool = False):
+        self.query = query
+        self.dir = os.path.join(out_dir, safe_name(query))
+        super().__init__(os.path.join(self.dir, "checkpoint.json"), [query, config], STAGES, fresh)
+
+
+def run_topic(run: TopicRun, args) -> Dict[str, Any]:
+    query = run.query
+    regions = [REGIONS[r] for r in args.regions]
+    mode = "DEEP_SCENARIO" if args.scenario else "FUSION"
+
+    keywords = run.stage("keywords", lambda: generate_dynamic_keywords(query, args.google_key, strict=True))
+
+    def search():
+        context_text, sources, _, _ = get_search_context(query, args.tavily_key, args.days, regions, args.max_results, keywords,
+                                                         True, args.token_budget, args.archive)
+        if context_text.startswith("Error:"): raise RuntimeError(context_text)
+        return {"context": context_text, "sources": sources}
+    searched = run.stage("search", search)
+    sources = searched["sources"]
+
+    cofacts_txt = run.stage("cofacts", lambda: search_cofacts(query, args.cofacts_k, strict=True))
+
+    shard_by = {"category": "category", "time": "time"}.get(args.strategy)
+    if args.strategy == "auto" and len(sources) > MAP_REDUCE_MIN_SOURCES: shard_by = "category"
+
+    def analyse():
+        if mode == "FUSION" and shard_by:
+            return run_map_reduce_analysis(query, searched["context"], sources, args.model, args.google_key, shard_by, cofacts_txt or "",
+                                           strict=True)
+        context_text = searched["context"] + (f"\n{cofacts_txt}\n" if cofacts_txt else "")
+        return run_strategic_analysis(query, context_text, args.model, args.google_key, mode)
+    raw_report = run.stage("analysis", analyse)
+
+    def outputs():
+        result = parse_gemini_data(raw_report)
+        files = {
+            "report.html": create_full_html_report(result, None, sources, args.blind),
+            "state.json": export_full_state(result, None, sources),
+            "report.md": convert_data_to_md(result),
+        }
+        for name, text in files.items(): write_atomic(os.path.join(run.dir, name), text)
+        return sorted(files)
+    run.stage("outputs", outputs)
+    return {"sources": len(sources), "keywords": keywords}
+
+
+def run_batch(topics: List[str], args) -> List[Dict[str, Any]]:
+    config = {k: getattr(args, k) for k in ("days", "regions", "max_results", "token_budget", "archive", "cofacts_k",
+                                            "model", "strategy", "scenario", "blind")}
+    runs = [TopicRun(q, args.out, config, args.fresh) for q in topics]
+
+    def work(run: TopicRun) -> Dict[str, Any]:
+        started = time.time()
+        row = {"query": run.query, "dir": run.dir, "status": "ok", "error": None}
+        try:
+            row.update(run_topic(run, args))
+        except Exception as e:
+            row.update(status="failed", error=f"{type(e).__name__}: {e}")
+        row.update(elapsed=round(time.time() - started, 2), stages=run.timing(), resumed=list(run.resumed))
+        log(f"{'✅' if row['status'] == 'ok' else '❌'} {run.query} ({row['elapsed']:.1f}s)"
+            + (f" 沿用: {', '.join(run.resumed)}" if run.resumed else "") + (f" — {row['error']}" if row["error"] else ""))
+        return row
+
+    # 議題層級用自己的執行緒：議題執行緒大多在等待，真正的搜尋 / 分片呼叫會再排進 concurrency 的共用池；
+    # 若議題本身也佔用共用池，議題數接近池的上限時內層工作會排不進去。
+    rows: Dict[str, Dict[str, Any]] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(args.concurrency, 1), thread_name_prefix="topic") as pool:
+        futures = {pool.submit(work, r): r.query for r in runs}
+        for fut in concurrent.futures.as_completed(futures):
+            rows[futures[fut]] = fut.result()
+    return [rows[q] for q in topics]
+
+
+def print_summary(rows: List[Dict[str, Any]], wall: float):
+    header = f"{'議題':<24}{'狀態':<8}" + "".join(f"{s:>10}" for s in STAGES) + f"{'合計':>10}"
+    print(header)
+    for row in rows:
+        cells = "".join(f"{'-' if v is None else f'{v:.1f}':>10}" for v in row["stages"].values())
+        print(f"{row['query'][:22]:<24}{row['status']:<8}{cells}{row['elapsed']:>10.1f}")
+    ok = sum(1 for r in rows if r["status"] == "ok")
+    print(f"完成 {ok}/{len(rows)} 個議題，總耗時 {wall:.1f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="全域觀點解析：批次執行議題清單")
+    parser.add_argument("topics", help="議題清單 (.txt 一行一個，或 .json 字串陣列)")
+    parser.add_argument("-o", "--out", default="batch_out", help="輸出資料夾 (含各議題的檢查點)")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時執行的議題數")
+    parser.add_argument("--google-key", default=os.environ.get("GOOGLE_API_KEY", ""))
+    parser.add_argument("--tavily-key", default=os.environ.get("TAVILY_API_KEY", ""))
+    parser.add_argument("--model", default="gemini-2.5-pro", choices=["gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite"])
+    parser.add_argument("--days", type=int, default=30, help="搜尋時間範圍 (天數)")
+    parser.add_argument("--max-results", type=int, default=30, help="搜尋篇數上限")
+    parser.add_argument("--token-budget", type=int, default=60000, help="分析素材預算 (tokens，0 = 不限)")
+    parser.add_argument("--regions", default="taiwan", help=f"搜尋視角，逗號分隔：{','.join(REGIONS)}；空字串為不限")
+    parser.add_argument("--archive", default="merge", choices=["merge", "off", "only"], help="本地新聞存檔模式")
+    parser.add_argument("--cofacts-k", type=int, default=3, help="Cofacts 查核筆數")
+    parser.add_argument("--strategy", default="auto", choices=STRATEGIES, help="分析策略：自動 / 單次呼叫 / 依陣營分片 / 依時間分片")
+    parser.add_argument("--scenario", action="store_true", help="改用未來發展推演 (Scenario) 引擎")
+    parser.add_argument("--blind", action="store_true", help="盲測模式 (報告不顯示媒體名稱)")
+    parser.add_argument("--fresh", action="store_true", help="忽略既有檢查點，全部重跑")
+    args = parser.parse_args(argv)
+
+    args.regions = [r.strip().lower() for r in args.regions.split(",") if r.strip()]
+    unknown = [r for r in args.regions if r not in REGIONS]
+    if unknown: parser.error(f"未知的搜尋視角: {', '.join(unknown)}")
+    if not args.google_key: parser.error("需要 Gemini Key (--google-key 或 GOOGLE_API_KEY)")
+    if not args.tavily_key and args.archive != "only": parser.error("需要 Tavily Key (--tavily-key 或 TAVILY_API_KEY)，或使用 --archive only")
+
+    topics = read_list(args.topics)
+    if not topics: parser.error("議題清單是空的")
+    os.makedirs(args.out, exist_ok=True)
+    log(f"共 {len(topics)} 個議題，同時執行 {args.concurrency} 個 → {args.out}")
+
+    started = time.time()
+    rows = run_batch(topics, args)
+    wall = time.time() - started
+    summary = {"finished": datetime.now().isoformat(timespec="seconds"), "wall": round(wall, 2), "topics": rows}
+    write_atomic(os.path.join(args.out, "summary.json"), json.dumps(summary, ensure_ascii=False, indent=2))
+    print_summary(rows, wall)
+    return 0 if all(r["status"] == "ok" for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
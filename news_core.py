@@ -0,0 +1,908 @@
+# ==========================================
+# 全域觀點解析：不依賴 Streamlit 的核心邏輯
+# ==========================================
+# news_app.py (互動介面) 與 news_batch.py (批次 / 排程) 共用這裡的來源分類、混和搜尋、
+# 分析素材組裝、Gemini 呼叫與報告匯出。這個模組不可以呼叫任何 st.*，
+# import 時也不會建立任何介面元件。
+import json
+import re
+import pandas as pd
+import requests
+import hashlib
+import threading
+import markdown
+from urllib.parse import urlparse
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional
+from datetime import datetime
+
+from langchain_core.prompts import ChatPromptTemplate
+from tenacity import retry, stop_after_attempt, wait_exponential
+from tavily import TavilyClient
+
+from llm_cache import get_llm_cache
+from gemini_pool import get_gemini_pool
+from cofacts_mirror import get_cofacts_mirror
+from news_archive import get_news_archive
+from topic_watch import previous_report
+from search_cache import get_search_cache
+from pipeline import Pipeline
+from concurrency import bounded_as_completed, provider_slot, slotted_stream
+from domain_index import DomainClassifier, SourceInfo
+from source_dedup import canonical_url, collapse_near_duplicates
+from context_packer import estimate_tokens, pack_passages
+from report_stream import parse_report
+
+# ==========================================
+# 1. 報告樣式 (頁面與 HTML 匯出共用)
+# ==========================================
+CSS_STYLE = """
+<style>
+    body { font-family: "Microsoft JhengHei", "Georgia", sans-serif; line-height: 1.6; color: #333; }
+    .stButton button[kind="secondary"] { border: 2px solid #673ab7; color: #673ab7; font-weight: bold; }
+    
+    .report-paper {
+        background-color: #fdfbf7; 
+        color: #2c3e50; 
+        padding: 40px; 
+        border-radius: 4px; 
+        margin-bottom: 15px; 
+        border: 1px solid #e0e0e0;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.08);
+        font-family: "Microsoft JhengHei", "Georgia", serif;
+        line-height: 1.8;
+        font-size: 1.05rem;
+    }
+    
+    .citation {
+        font-size: 0.75em;          
+        color: #777777;             
+        background-color: #f4f4f4;  
+        padding: 2px 6px;           
+        border-radius: 4px;         
+        margin: 0 4px;              
+        font-family: sans-serif; 
+        border: 1px solid #e0e0e0;  
+        font-weight: 400;           
+        vertical-align: 1px;        
+        display: inline-block;      
+    }
+
+    .scrollable-table-container {
+        height: 600px; 
+        overflow-y: auto; 
+        border: 1px solid #e0e0e0;
+        border-radius: 8px;
+        background-color: white;
+        margin-bottom: 20px;
+    }
+    .custom-table {
+        width: 100%;
+        border-collapse: collapse;
+        font-family: "Microsoft JhengHei", sans-serif;
+        font-size: 0.95em;
+    }
+    .custom-table th {
+        position: sticky;
+        top: 0;
+        background-color: #f1f3f4;
+        color: #333;
+        font-weight: bold;
+        padding: 12px 15px;
+        text-align: left;
+        border-bottom: 2px solid #ddd;
+        z-index: 2;
+    }
+    .custom-table td {
+        padding: 10px 15px;
+        border-bottom: 1px solid #f0f0f0;
+        vertical-align: middle;
+        color: #333;
+    }
+    .custom-table tr:hover {
+        background-color: #f8f9fa;
+    }
+    .custom-table a {
+        color: #1a73e8;
+        text-decoration: none;
+        font-weight: 500;
+        font-size: 1.05em;
+    }
+    .custom-table a:hover {
+        text-decoration: underline;
+        color: #1557b0;
+    }
+    
+    @media print {
+        .scrollable-table-container { height: auto; overflow: visible; }
+        body { font-size: 12pt; }
+        a { text-decoration: none; color: #000; }
+        .report-paper { box-shadow: none; border: none; padding: 0; }
+    }
+</style>
+"""
+
+# ==========================================
+# 2. 資料庫與共用常數 (Config)
+# ==========================================
+BLUE_WHITELIST = ["udn.com", "chinatimes.com", "tvbs.com.tw", "cti.com.tw", "nownews.com", "ctee.com.tw", "storm.mg"]
+GREEN_WHITELIST = ["ltn.com.tw", "ftvnews.com.tw", "setn.com", "rti.org.tw", "newtalk.tw", "mirrormedia.mg", "upmedia.mg"]
+OFFICIAL_WHITELIST = ["cna.com.tw", "pts.org.tw", "mnd.gov.tw", "mac.gov.tw", "tfc-taiwan.org.tw", "gov.tw"]
+FULL_TAIWAN_WHITELIST = BLUE_WHITELIST + GREEN_WHITELIST + OFFICIAL_WHITELIST + ["yahoo.com.tw", "ettoday.net", "businessweekly.com.tw"]
+
+INDIE_WHITELIST = ["twreporter.org", "theinitium.com", "thenewslens.com", "mindiworldnews.com", "vocus.cc", "matters.town", "plainlaw.me"]
+INTL_WHITELIST = ["bbc.com", "cnn.com", "reuters.com", "apnews.com", "bloomberg.com", "wsj.com", "nytimes.com", "dw.com", "voanews.com", "nikkei.com", "nhk.or.jp"]
+
+DOMAIN_NAME_MAP = {
+    "udn.com": "聯合報", "chinatimes.com": "中國時報", "tvbs.com.tw": "TVBS", "cti.com.tw": "中天新聞",
+    "nownews.com": "NOWnews", "ctee.com.tw": "工商時報", "storm.mg": "風傳媒",
+    "ltn.com.tw": "自由時報", "ftvnews.com.tw": "民視新聞", "setn.com": "三立新聞", "rti.org.tw": "央廣",
+    "newtalk.tw": "新頭殼", "mirrormedia.mg": "鏡週刊", "upmedia.mg": "上報",
+    "cna.com.tw": "中央社", "pts.org.tw": "公視", "twreporter.org": "報導者",
+    "theinitium.com": "端傳媒", "thenewslens.com": "關鍵評論網", "mindiworldnews.com": "敏迪選讀",
+    "vocus.cc": "方格子", "ptt.cc": "PTT", "dcard.tw": "Dcard",
+    "bbc.com": "BBC", "cnn.com": "CNN", "reuters.com": "路透社", "apnews.com": "美聯社",
+    "bloomberg.com": "彭博", "wsj.com": "華爾街日報", "nytimes.com": "紐約時報",
+    "mobile01.com": "Mobile01", "yahoo.com": "Yahoo新聞", "ettoday.net": "ETtoday",
+    "businessweekly.com.tw": "商業周刊", "mygopen.com": "MyGoPen"
+}
+
+DB_MAP = {
+    "CHINA": ["xinhuanet", "people.com.cn", "huanqiu", "cctv", "chinadaily", "taiwan.cn", "gwytb", "guancha"],
+    "GREEN": ["ltn", "ftv", "setn", "rti.org", "newtalk", "mirrormedia", "dpp", "upmedia"],
+    "BLUE": ["udn", "chinatimes", "tvbs", "cti", "nownews", "ctee", "kmt", "storm"],
+    "OFFICIAL": ["cna.com", "pts.org", "mnd.gov", "mac.gov", "tfc-taiwan", "gov.tw"],
+    "INDIE": ["twreporter", "theinitium", "thenewslens", "mindiworld", "vocus", "matters", "plainlaw"],
+    "INTL": ["bbc", "cnn", "reuters", "apnews", "bloomberg", "wsj", "nytimes", "dw.com", "voanews", "rfi"],
+    "FARM": ["kknews", "read01", "ppfocus", "buzzhand", "bomb01", "qiqi", "inf.news", "toutiao"],
+    "SOCIAL": ["ptt.cc", "dcard", "mobile01", "facebook", "youtube"]
+}
+
+CATEGORY_META = {
+    "CHINA": ("🇨🇳 中國官媒", "#d32f2f"),
+    "FARM": ("⛔ 內容農場", "#ef6c00"),
+    "BLUE": ("🔵 泛藍觀點", "#1565c0"),
+    "GREEN": ("🟢 泛綠觀點", "#2e7d32"),
+    "OFFICIAL": ("⚪ 官方/中立", "#546e7a"),
+    "INDIE": ("🕵️ 獨立/深度", "#fbc02d"),
+    "INTL": ("🌏 國際媒體", "#f57c00"),
+    "VIDEO": ("🟣 影音社群", "#7b1fa2"),
+    "SOCIAL": ("⚠️ 社群聲量", "#607d8b"),
+    "OTHER": ("📄 其他來源", "#9e9e9e")
+}
+
+# 時間軸的媒體標記：沿用原本逐筆比對分類標籤關鍵字的規則 (依序比對，第一個符合的為準，都不符合為 ⚪)，
+# 只是改成啟動時對每個分類算一次。例如 VIDEO 的標籤「影音社群」含「社群」，所以是 ⚠️。
+LABEL_EMOJI_RULES = [("中國", "🔴"), ("泛藍", "🔵"), ("泛綠", "🟢"), ("官方", "⚪"), ("獨立", "🕵️"),
+                     ("國際", "🌏"), ("農場", "⛔"), ("社群", "⚠️")]
+CATEGORY_EMOJI = {cat: next((emoji for kw, emoji in LABEL_EMOJI_RULES if kw in label), "⚪")
+                  for cat, (label, _) in CATEGORY_META.items()}
+
+# 分類 / 媒體名稱一次編譯好，以 netloc 為鍵記憶 (見 domain_index.py)
+SOURCE_INDEX = DomainClassifier(DB_MAP, DOMAIN_NAME_MAP, CATEGORY_META, CATEGORY_EMOJI)
+
+NOISE_BLACKLIST = ["zhihu.com", "baidu.com", "pinterest.com", "instagram.com", "tiktok.com", "tmall.com", "taobao.com", "163.com", "sohu.com"]
+
+# ==========================================
+# 3. 輔助函式 (Helper Functions)
+# ==========================================
+
+def get_domain_name(url: str) -> str:
+    try: return urlparse(url).netloc.replace("www.", "")
+    except: return ""
+
+def source_info(url: str) -> SourceInfo:
+    """(category, label, color, emoji, name) 一次取得。"""
+    return SOURCE_INDEX.lookup(url)
+
+def classify_source(url: str) -> str:
+    return SOURCE_INDEX.lookup(url).category
+
+def get_category_meta(cat: str) -> Tuple[str, str]:
+    return CATEGORY_META.get(cat, ("📄 其他來源", "#9e9e9e"))
+
+def format_citation_style(text: str) -> str:
+    if not text: return ""
+    def replacement(match):
+        nums = re.findall(r'\d+', match.group(0))
+        if not nums: return match.group(0)
+        unique_nums = sorted(list(set(nums)), key=int)
+        return f'<span class="citation">Source {", ".join(unique_nums)}</span>'
+    text = re.sub(r'(\[Source \d+\](?:[,;]?\s*\[Source \d+\])*)', replacement, text)
+    text = re.sub(r'([\[\(（]\s*Source\s+[\d,，、\s]+[\]\)）])', replacement, text)
+    return text
+
+def extract_date_from_url(url: str) -> Optional[str]:
+    if not url: return None
+    patterns = [r'/(\d{4})[-/](\d{2})[-/](\d{2})/', r'/(\d{4})(\d{2})(\d{2})/', r'-(\d{4})(\d{2})(\d{2})']
+    for p in patterns:
+        match = re.search(p, url)
+        if match: return f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+    return None
+
+# [V37.3 New] 核心渲染邏輯抽取 (DRY Fix)
+def process_timeline_rows(timeline_data: List[Dict], sources: List[Dict], blind_mode: bool) -> str:
+    """
+    處理時間軸數據，執行嚴格清洗、排序與格式化。
+    回傳：已排序的 HTML 表格行 (tr/td) 字串。
+    """
+    if not timeline_data: return ""
+    
+    valid_rows = []
+    
+    for item in timeline_data:
+        s_id = item.get('source_id', 0)
+        # 1. 嚴格過濾：無效來源直接丟棄
+        if s_id == 0 or s_id > len(sources): continue
+        
+        source_data = sources[s_id-1]
+        real_url = source_data.get('url', '#')
+        if real_url == "#": continue 
+        
+        # 2. 日期瀑布流
+        meta_date = source_data.get('published_date')
+        url_date = extract_date_from_url(real_url)
+        llm_date = item.get('date')
+        
+        real_date = "1970-01-01" 
+        display_date = "------"
+        
+        if meta_date and meta_date != "Missing": 
+            real_date = meta_date
+            display_date = meta_date
+        elif url_date: 
+            real_date = url_date
+            display_date = url_date
+        elif llm_date and re.match(r'\d{4}-\d{2}-\d{2}', llm_date) and "XX" not in llm_date:
+            real_date = llm_date
+            display_date = llm_date
+        
+        # 3. 媒體名稱與立場分類
+        info = source_info(real_url)
+        display_media = f"{info.emoji} {info.name}"
+        if blind_mode: display_media = "*****"
+        
+        title = item.get('title', 'No Title')
+        title_html = f'<a href="{real_url}" target="_blank">{title}</a>'
+        
+        valid_rows.append({
+            "sort_date": real_date,
+            "html": f"<tr><td style='white-space:nowrap;'>{display_date}</td><td style='white-space:nowrap;'>{display_media}</td><td>{title_html}</td></tr>"
+        })
+
+    # 4. 強制按日期排序 (最新的在上面)
+    valid_rows.sort(key=lambda x: x['sort_date'], reverse=True)
+    
+    return "".join([r['html'] for r in valid_rows])
+
+# ==========================================
+# 4. 業務邏輯 (Business Logic)
+# ==========================================
+llm_cache = get_llm_cache()
+search_cache = get_search_cache()
+gemini_pool = get_gemini_pool()
+ARCHIVE_MAX_RESULTS = 20
+# 系統提示以變數傳入：模板只建一次，提示內容裡的大括號也不會被當成模板變數
+ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([("system", "{system}"), ("human", "{input}")])
+
+@retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=2, max=5), reraise=True)
+def generate_dynamic_keywords(query: str, api_key: str, strict: bool = False) -> List[str]:
+    # strict (批次執行)：呼叫失敗時拋出例外，不回傳預設關鍵字，免得降級的結果被寫進檢查點
+    try:
+        prompt = f"""
+        請針對議題「{query}」，生成 3 組最具情報價值的搜尋關鍵字，分別對應以下三個維度：
+        1. [事實軌]：針對事件發展、時間軸、新聞報導。
+        2. [觀點軌]：針對爭議、正反評論、社論。
+        3. [深度軌]：針對懶人包、影響分析、法規細節。
+        
+        請直接輸出 3 個字串，用逗號分隔，不要標號。
+        範例："{query} 事件進度, {query} 正反爭議, {query} 懶人包重點"
+        """
+        def produce():
+            with provider_slot("gemini"):
+                return gemini_pool.chat(api_key, "gemini-2.5-flash", 0.3).invoke(prompt).content
+        resp = llm_cache.cached_call("gemini-2.5-flash", prompt, 0.3, produce)
+        keywords = [k.strip() for k in resp.split(',') if k.strip()]
+        return keywords[:3] if len(keywords) >= 3 else [f"{query} 新聞 事件", f"{query} 爭議 評論", f"{query} 懶人包 分析"]
+    except:
+        if strict: raise
+        return [f"{query} 新聞 事件", f"{query} 爭議 評論", f"{query} 懶人包 分析"] 
+
+def format_cofacts_hits(hits: List[Dict]) -> str:
+    """[{"text", "replies": [{"type", ...}]}] -> 提示用的查核摘要；沒有任何回應時回傳空字串。"""
+    result_text = ""
+    for hit in hits:
+        replies = hit.get('replies') or []
+        if not replies: continue
+        rumor = (hit.get('text') or '')[:50]
+        result_text += f"- 謠言: {rumor}... (判定: {replies[0].get('type')})\n"
+    return "【Cofacts 查核資料庫】\n" + result_text if result_text else ""
+
+def search_cofacts(query: str, top_k: int = 3, reply_types: Optional[List[str]] = None, strict: bool = False) -> str:
+    # 匯入過資料集 (cofacts_mirror.py import) 就查本地鏡像，否則退回即時 API；
+    # 鏡像無法開啟 (SQLite 不支援 FTS5 trigram、資料夾無法寫入) 或查詢出錯時也退回即時 API
+    # strict (批次執行)：即時 API 也失敗時拋出例外，不回傳空字串 (空字串代表「查無資料」)
+    try:
+        mirror = get_cofacts_mirror()
+        if mirror.available(): return format_cofacts_hits(mirror.search(query, top_k, reply_types))
+    except Exception: pass
+
+    url = "https://cofacts-api.g0v.tw/graphql"
+    graphql_query = """query ListArticles($text: String!, $first: Int) { ListArticles(filter: {q: $text}, orderBy: [{_score: DESC}], first: $first) { edges { node { text articleReplies(status: NORMAL) { reply { text type } } } } } }"""
+    try:
+        with provider_slot("cofacts"):
+            response = requests.post(url, json={'query': graphql_query, 'variables': {'text': query, 'first': top_k}}, timeout=3)
+        if response.status_code == 200:
+            data = response.json()
+            articles = data.get('data', {}).get('ListArticles', {}).get('edges', [])
+            hits = []
+            for art in articles:
+                node = art.get('node', {})
+                replies = [r.get('reply', {}) for r in node.get('articleReplies', [])]
+                if reply_types: replies = [r for r in replies if r.get('type') in reply_types]
+                hits.append({'text': node.get('text', ''), 'replies': replies})
+            return format_cofacts_hits(hits)
+    except:
+        if strict: raise
+        return ""
+    if strict: raise RuntimeError(f"Cofacts API HTTP {response.status_code}")
+    return ""
+
+def build_search_params(days_back: int) -> Dict:
+    return {
+        "search_depth": "advanced",
+        "topic": "general",
+        "days": days_back,
+        "exclude_domains": NOISE_BLACKLIST
+    }
+
+def region_domains(selected_regions: List[str]) -> List[str]:
+    """嚴格模式下通用搜尋的網域白名單 (保底搜尋的白名單都是它的子集)；沒有對應白名單的視角回傳空清單。"""
+    domains = []
+    if "台灣" in str(selected_regions): domains.extend(FULL_TAIWAN_WHITELIST)
+    if "獨立" in str(selected_regions): domains.extend(INDIE_WHITELIST)
+    if "亞洲" in str(selected_regions): domains.extend(INTL_WHITELIST)
+    return sorted(set(domains))
+
+def build_search_tasks(query: str, search_params: Dict, is_strict_mode: bool, selected_regions: List[str]) -> List[Dict]:
+    """
+    列出所有 Tavily 搜尋任務。三軌通用搜尋以 "keyword" 指向 dynamic_keywords 的索引
+    (要等關鍵字生成完才能送出)；General_Main 與保底搜尋只需要原始議題，可以立刻開始。
+    """
+    tasks = []
+    
+    # 1. 通用熱度搜尋 (Tri-Track)
+    general_domains = region_domains(selected_regions)
+    
+    general_params = search_params.copy()
+    general_params['max_results'] = 10 
+    if is_strict_mode and general_domains:
+        general_params['include_domains'] = general_domains
+    
+    tasks.append({"name": "General_Main", "query": query, "params": general_params})
+    tasks.append({"name": "General_Fact", "keyword": 0, "params": general_params})
+    tasks.append({"name": "General_Opn", "keyword": 1, "params": general_params})
+    tasks.append({"name": "General_Deep", "keyword": 2, "params": general_params})
+    
+    # 2. 分眾保底搜尋 (Hybrid Weighted - Standard Guard)
+    if "台灣" in str(selected_regions):
+        blue_params = search_params.copy()
+        blue_params['max_results'] = 5 
+        blue_params['include_domains'] = BLUE_WHITELIST
+        tasks.append({"name": "Blue_Guard", "query": f"{query}", "params": blue_params})
+        
+        green_params = search_params.copy()
+        green_params['max_results'] = 5 
+        green_params['include_domains'] = GREEN_WHITELIST
+        tasks.append({"name": "Green_Guard", "query": f"{query}", "params": green_params})
+        
+        official_params = search_params.copy()
+        official_params['max_results'] = 5
+        official_params['include_domains'] = OFFICIAL_WHITELIST
+        tasks.append({"name": "Official_Guard", "query": f"{query} 聲明 新聞稿", "params": official_params})
+    return tasks
+
+def run_search_task(tavily: TavilyClient, task: Dict, task_query: str, use_cache_stale: bool = True) -> List[Dict]:
+    try:
+        results = search_cache.search(tavily, task_query, task['params'], stale_while_revalidate=use_cache_stale)
+    except: return []
+    archive_sources(results)
+    return results
+
+def archive_sources(results: List[Dict]):
+    # 每篇抓到的來源都寫進跨 session 的存檔 (以 canonical_url 去重)；存檔失敗不影響搜尋
+    # 存檔在第一次用到時才開啟：SQLite 不支援 FTS5 trigram 或資料夾無法寫入時，只有存檔功能失效
+    try: get_news_archive().ingest(results, classify_source)
+    except Exception: pass
+
+def search_archive(query_texts: List[str], days_back: int, limit: int = ARCHIVE_MAX_RESULTS,
+                   selected_regions: List[str] = ()) -> List[Dict]:
+    # 嚴格模式 (有選視角) 時存檔也只取白名單網域，和 Tavily 的 include_domains 一致，網域圍籬才不會被存檔繞過
+    try: return get_news_archive().query(query_texts, days_back, limit, domains=region_domains(selected_regions))
+    except Exception: return []
+
+def merge_search_results(results_map: Dict[str, List[Dict]]) -> List[Dict]:
+    """保底優先、通用輪流合併；網址先正規化再去重，最後合併近似重複的轉載稿。"""
+    seen_urls = set()
+    final_list = []
+    
+    # A. 優先加入保底
+    guards = ["Blue_Guard", "Green_Guard", "Official_Guard"]
+    for guard_name in guards:
+        if guard_name in results_map:
+            for item in results_map[guard_name]:
+                key = canonical_url(item['url'])
+                if key not in seen_urls:
+                    seen_urls.add(key)
+                    final_list.append(item)
+    
+    # B. 再加入通用 (Tri-Track)
+    general_keys = ["General_Fact", "General_Opn", "General_Deep", "General_Main"]
+    max_len = max([len(results_map.get(k, [])) for k in general_keys]) if general_keys else 0
+    
+    for i in range(max_len):
+        for key in general_keys:
+            if key in results_map and i < len(results_map[key]):
+                item = results_map[key][i]
+                url_key = canonical_url(item['url'])
+                if url_key not in seen_urls:
+                    seen_urls.add(url_key)
+                    final_list.append(item)
+
+    # C. 最後補上本地存檔 (即時搜尋已有的同一篇以即時結果為準)
+    for item in results_map.get("Archive", []):
+        url_key = canonical_url(item['url'])
+        if url_key not in seen_urls:
+            seen_urls.add(url_key)
+            final_list.append(item)
+                
+    return collapse_near_duplicates(final_list, name_fn=lambda u: source_info(u).name)
+
+def execute_hybrid_search(query: str, api_key_tavily: str, search_params: Dict, is_strict_mode: bool, dynamic_keywords: List[str], selected_regions: List[str], use_cache_stale: bool = True,
+                          archived: Optional[List[Dict]] = None) -> List[Dict]:
+    tavily = TavilyClient(api_key=api_key_tavily)
+    tasks = build_search_tasks(query, search_params, is_strict_mode, selected_regions)
+
+    def fetch(task):
+        task_query = task['query'] if 'query' in task else dynamic_keywords[task['keyword']]
+        return run_search_task(tavily, task, task_query, use_cache_stale)
+
+    results_map = {"Archive": archived or []}
+    for task, future in bounded_as_completed(fetch, tasks, 8):
+        results_map[task['name']] = future.result()
+            
+    return merge_search_results(results_map)
+
+def format_search_context(results: List[Dict], max_results: int, query_texts: List[str] = (), token_budget: int = 0,
+                          first_id: int = 1) -> Tuple[str, List[Dict]]:
+    """
+    組出 Source N 格式的分析素材。token_budget > 0 時，依議題 / 關鍵字挑選每篇的重點句
+    塞進預算 (見 context_packer.py)；0 則維持每篇取前 3000 字。
+    first_id 為第一篇的編號 (追蹤模式的新報導接續在既有來源之後)。
+    """
+    results.sort(key=lambda x: x.get('published_date') or "", reverse=True)
+    results = results[:max_results]
+    
+    heads, tails = [], []
+    for i, res in enumerate(results):
+        title = res.get('title', 'No Title')
+        url = res.get('url', '#')
+        
+        pub_date = res.get('published_date')
+        if not pub_date:
+            url_date = extract_date_from_url(url)
+            pub_date = url_date if url_date else "Missing"
+        else:
+            pub_date = pub_date[:10]
+        
+        res['final_date'] = pub_date
+        outlets = res.get('outlets') or []
+        carried = f" [Also carried by: {', '.join(outlets[1:])}]" if len(outlets) > 1 else ""
+        heads.append(f"Source {i+first_id}: [Date: {pub_date}] [Title: {title}]{carried} ")
+        tails.append(f" (URL: {url})\n")
+    
+    contents = [res.get('content', '') for res in results]
+    if token_budget > 0:
+        reserved = sum(estimate_tokens(h) + estimate_tokens(t) for h, t in zip(heads, tails))
+        contents = pack_passages(contents, list(query_texts), token_budget, reserved)
+    else:
+        contents = [c[:3000] for c in contents]
+    context_text = "".join(h + c + t for h, c, t in zip(heads, contents, tails))
+    return context_text, results
+
+def get_search_context(query: str, api_key_tavily: str, days_back: int, selected_regions: List[str], max_results: int, dynamic_keywords: List[str], use_cache_stale: bool = True, token_budget: int = 0,
+                       archive_mode: str = "merge"):
+    try:
+        search_params = build_search_params(days_back)
+        is_strict_mode = bool(selected_regions)
+        # 先查本地存檔；only 模式完全不呼叫 Tavily
+        archived = search_archive([query] + list(dynamic_keywords), days_back, max(max_results, ARCHIVE_MAX_RESULTS), selected_regions) if archive_mode != "off" else []
+        if archive_mode == "only":
+            results = merge_search_results({"Archive": archived})
+        else:
+            results = execute_hybrid_search(query, api_key_tavily, search_params, is_strict_mode, dynamic_keywords, selected_regions, use_cache_stale, archived)
+        context_text, results = format_search_context(results, max_results, [query] + list(dynamic_keywords), token_budget)
+        return context_text, results, query, is_strict_mode
+        
+    except Exception as e:
+        return f"Error: {str(e)}", [], "Error", False
+
+def build_search_pipeline(query: str, google_key: str, api_key_tavily: str, days_back: int, selected_regions: List[str], use_cache_stale: bool = True,
+                          cofacts_top_k: int = 3, cofacts_types: Optional[List[str]] = None, archive_mode: str = "merge") -> Pipeline:
+    """
+    關鍵字生成、各路 Tavily 搜尋、Cofacts 查詢、本地存檔查詢的依賴圖：
+    三軌通用搜尋與存檔查詢要等 keywords，General_Main / 保底搜尋 / Cofacts 一開始就並行送出。
+    archive_mode 為 only 時不排任何 Tavily 搜尋。
+    """
+    tasks = build_search_tasks(query, build_search_params(days_back), bool(selected_regions), selected_regions)
+    if archive_mode == "only": tasks = []
+    tavily = TavilyClient(api_key=api_key_tavily) if tasks else None
+    pipe = Pipeline()
+    pipe.add("keywords", lambda: generate_dynamic_keywords(query, google_key))
+    if archive_mode != "off":
+        pipe.add("Archive", lambda kws: search_archive([query] + list(kws), days_back, selected_regions=selected_regions), deps=["keywords"])
+    for t in tasks:
+        if 'keyword' in t:
+            pipe.add(t['name'], lambda kws, t=t: run_search_task(tavily, t, kws[t['keyword']], use_cache_stale), deps=["keywords"])
+        else:
+            pipe.add(t['name'], lambda t=t: run_search_task(tavily, t, t['query'], use_cache_stale))
+    pipe.add("cofacts", lambda: search_cofacts(query, cofacts_top_k, cofacts_types))
+    return pipe
+
+@retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=2, max=5), reraise=True)
+def call_gemini(system_prompt: str, user_text: str, model_name: str, api_key: str) -> str:
+    def produce():
+        chain = ANALYSIS_PROMPT | gemini_pool.chat(api_key, model_name, 0.0)
+        with provider_slot("gemini"):
+            return chain.invoke({"system": system_prompt, "input": user_text}).content
+    return llm_cache.cached_call(model_name, [system_prompt, user_text], 0.0, produce)
+
+def stream_gemini(system_prompt: str, user_text: str, model_name: str, api_key: str):
+    """call_gemini 的串流版；與 call_gemini 共用同一個快取鍵，命中時直接重播。"""
+    def produce():
+        chain = ANALYSIS_PROMPT | gemini_pool.chat(api_key, model_name, 0.0)
+        # 與 call_gemini 相同：佔用 gemini 名額，第一段之前失敗重試一次
+        return slotted_stream("gemini", lambda: (chunk.content for chunk in chain.stream({"system": system_prompt, "input": user_text})))
+    return llm_cache.cached_stream(model_name, [system_prompt, user_text], 0.0, produce)
+
+def build_system_prompt(query: str, mode: str="FUSION") -> str:
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    
+    tone_instruction = """
+    【⚠️ 語氣風格指令】：
+    1. **極度審慎**：嚴禁臆測。若證據不足，請直接標示「目前資訊不足」。
+    2. **去軍事化**：嚴禁使用軍事隱喻。
+    3. **中性專業**：使用社會科學術語。
+    """
+
+    if mode == "FUSION":
+        system_prompt = f"""
+        你是一位極度嚴謹的情報分析師。
+        
+        【⚠️ 時間錨點】：今天是 {today_str}。
+        {tone_instruction}
+        
+        【⚠️ 數據結構指令】：輸出 Source ID (如 Source 1)。
+        
+        【分析方法論】：
+        1. **邏輯謬誤偵測**：指出滑坡謬誤、稻草人論證。
+        2. **證據強度分級**：評估證據力（強/弱）。
+        3. **聲量權重校正**：識別複讀機，挖掘長尾觀點。
+        
+        【輸出格式 (嚴格遵守)】：
+        ### [DATA_TIMELINE]
+        (格式：YYYY-MM-DD|媒體|標題|Source_ID)
+        *請注意：只能列出 Context 中實際存在的 Source，嚴禁捏造 Source ID。若無 Source ID 則不列出。*
+        
+        ### [REPORT_TEXT]
+        (Markdown 報告 - 繁體中文)
+        1. **📊 全域現況摘要 (Situational Analysis)**
+           - 請以 **Markdown 表格** 呈現關鍵事件時間軸 (欄位包含：日期 | 事件摘要 | 關鍵影響)。
+        2. **🔍 爭議點與事實查核 (Fact-Check & Logic Scan)**
+           - *包含：邏輯謬誤偵測、證據強度評估*
+        3. **⚖️ 媒體框架光譜分析 (Framing Analysis)**
+           - *請應用聲量權重校正，指出話語權是否失衡*
+        4. **🧠 深度識讀與利益分析 (Cui Bono)**
+        5. **🤔 結構性反思 (Structural Reflection)**
+        """
+        
+    elif mode == "DEEP_SCENARIO":
+        system_prompt = f"""
+        你是一位專精於未來學 (Futures Studies) 的戰略顧問。
+        
+        【⚠️ 時間錨點】：今天是 {today_str}。
+        {tone_instruction}
+        
+        【分析任務】：
+        1. **早期預警指標**：列出監測訊號。
+        2. **驗屍分析**：反推失敗變數。
+
+        【輸出格式】：
+        ### [DATA_TIMELINE]
+        (留空)
+        
+        ### [REPORT_TEXT]
+        (Markdown 報告 - 繁體中文)
+        1. **🎯 CLA 深度解構 (Causal Layered Analysis)**
+           - Litany / System / Worldview / Myth
+        2. **🔮 未來趨勢路徑模擬 (Scenario Planning)**
+           - **基準路徑 (Baseline)** + 🚩 預警指標
+           - **轉折路徑 (Alternative)** + 🚩 預警指標
+           - **極端路徑 (Wild Card)** + 🚩 預警指標
+        3. **💀 驗屍分析 (Pre-mortem Analysis)**
+        4. **💡 綜合發展與因應建議**
+        """
+    else:
+        system_prompt = f"請針對 {query} 進行分析。"
+    return system_prompt
+
+def run_strategic_analysis(query: str, context_text: str, model_name: str, api_key: str, mode: str="FUSION") -> str:
+    return call_gemini(build_system_prompt(query, mode), context_text, model_name, api_key)
+
+# ------------------------------------------
+# 分片 Map-Reduce：來源多時，先依陣營 / 時間分片並行摘要，再合併成標準報告
+# ------------------------------------------
+MAP_REDUCE_MIN_SOURCES = 30     # 「自動」模式下超過這個篇數才分片
+SHARD_SIZE = 12
+MIN_SHARD = 3                   # 太小的陣營併進「混合」分片
+MAP_WORKERS = 4
+SOURCE_BLOCK_RE = re.compile(r"^Source (\d+): ", re.M)
+
+def split_source_blocks(context_text: str) -> Dict[int, str]:
+    """把 format_search_context 的輸出切回 {Source 編號: 該段文字}。"""
+    starts = list(SOURCE_BLOCK_RE.finditer(context_text))
+    return {int(m.group(1)): context_text[m.start():nxt.start() if nxt else len(context_text)]
+            for m, nxt in zip(starts, starts[1:] + [None])}
+
+def shard_sources(source_ids: List[int], sources: List[Dict], by: str = "category") -> List[Tuple[str, List[int]]]:
+    """回傳 [(分片名稱, [Source 編號...])]；by 為 category (classify_source) 或 time (final_date)。"""
+    if by == "time":
+        ordered = sorted(source_ids, key=lambda n: sources[n-1].get('final_date') or "")
+        chunks = [ordered[i:i + SHARD_SIZE] for i in range(0, len(ordered), SHARD_SIZE)]
+        return [(f"{sources[c[0]-1].get('final_date')} ~ {sources[c[-1]-1].get('final_date')}", c) for c in chunks]
+    
+    groups: Dict[str, List[int]] = {}
+    for n in source_ids: groups.setdefault(classify_source(sources[n-1].get('url')), []).append(n)
+    shards, mixed = [], []
+    for cat, ids in groups.items():
+        if len(ids) < MIN_SHARD:
+            mixed.extend(ids)
+            continue
+        label, _ = get_category_meta(cat)
+        for i in range(0, len(ids), SHARD_SIZE): shards.append((label, ids[i:i + SHARD_SIZE]))
+    for i in range(0, len(mixed), SHARD_SIZE): shards.append(("🧩 混合來源", mixed[i:i + SHARD_SIZE]))
+    return shards
+
+def build_delta_prompt(query: str, watch: Dict) -> str:
+    """追蹤模式：模型只看新報導，並以前次報告為比較基準。"""
+    base = build_system_prompt(query, "FUSION")
+    return base + f"""
+        【🔁 追蹤模式：增量分析】
+        輸入只包含 {watch.get('high_water') or watch.get('last_run')} 之後新出現的報導，Source 編號接續前次報告。
+        請只針對這些新報導撰寫：相較前次報告的新進展、各陣營框架或聲量的變化、哪些前次判斷被強化或推翻。
+        不必重述前次已涵蓋的內容；時間軸只列新報導，Source_ID 沿用輸入中的編號。
+        
+        【前次報告 (供比較，勿重複)】
+        {previous_report(watch)}
+        """
+
+def build_map_prompt(query: str, shard_label: str) -> str:
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    return f"""
+    你是一位極度嚴謹的情報分析師，負責議題「{query}」的其中一批來源 (分片：{shard_label})。
+    【⚠️ 時間錨點】：今天是 {today_str}。只根據這批來源作答，嚴禁臆測。
+    
+    【輸出格式 (嚴格遵守)】：
+    ### [DATA_TIMELINE]
+    (格式：YYYY-MM-DD|媒體|標題|Source_ID；Source_ID 必須沿用輸入中的編號，嚴禁捏造)
+    
+    ### [FRAMING_NOTES]
+    (條列，每點附 Source ID，繁體中文，精簡)
+    - 核心主張與關鍵事實
+    - 框架 / 用語傾向與消息來源
+    - 證據強度 (強/弱) 與邏輯謬誤
+    - 這批來源之間的重複或互相矛盾之處
+    """
+
+def build_reduce_prompt(query: str) -> str:
+    base = build_system_prompt(query, "FUSION")
+    return base + """
+        【⚠️ 輸入說明】：輸入是多個分析分片的 [FRAMING_NOTES] 與合併後的時間軸，而非原始全文。
+        請跨分片比較框架與聲量、整合成一份報告；時間軸已另外處理，
+        **只需輸出 ### [REPORT_TEXT] 段落**，引用時沿用筆記中的 Source ID。
+        """
+
+def run_map_reduce_analysis(query: str, context_text: str, sources: List[Dict], model_name: str, api_key: str,
+                            shard_by: str = "category", extra_context: str = "", on_shard_done=None,
+                            strict: bool = False) -> str:
+    """
+    Map：每個分片各自呼叫 Gemini，產出時間軸列 + 框架筆記 (共用執行緒池，最多 MAP_WORKERS 個同時)。
+    Reduce：把所有筆記交給一次 FUSION 呼叫寫成 [REPORT_TEXT]；時間軸列直接合併去重。
+    分片失敗時寫成「此分片分析失敗」繼續合併；strict (批次執行) 則直接拋出例外。
+    回傳與 run_strategic_analysis 相同結構的文字，可直接交給 parse_gemini_data。
+    """
+    blocks = split_source_blocks(context_text)
+    shards = shard_sources(sorted(blocks), sources, shard_by)
+
+    def run_shard(item):
+        label, ids = shards[item]
+        shard_text = "".join(blocks[n] for n in ids)
+        return call_gemini(build_map_prompt(query, label), shard_text, model_name, api_key)
+
+    outputs = [""] * len(shards)
+    for i, fut in bounded_as_completed(run_shard, range(len(shards)), MAP_WORKERS):
+        try: outputs[i] = fut.result()
+        except Exception as e:
+            if strict: raise
+            outputs[i] = f"(此分片分析失敗: {e})"
+        if on_shard_done: on_shard_done(*shards[i])
+
+    timeline_rows, notes = [], []
+    for (label, ids), text in zip(shards, outputs):
+        head, _, tail = text.partition("### [FRAMING_NOTES]")
+        timeline_rows.extend(l.strip() for l in head.replace("### [DATA_TIMELINE]", "").split("\n") if l.count("|") >= 3)
+        notes.append(f"#### 分片：{label} (Source {', '.join(map(str, ids))})\n{(tail or head).strip()}")
+    timeline_rows = list(dict.fromkeys(timeline_rows))
+
+    reduce_input = "【合併時間軸】\n" + "\n".join(timeline_rows) + "\n\n【分片筆記】\n" + "\n\n".join(notes)
+    if extra_context: reduce_input += f"\n\n{extra_context}"
+    report = call_gemini(build_reduce_prompt(query), reduce_input, model_name, api_key)
+    if "### [REPORT_TEXT]" in report: report = report.split("### [REPORT_TEXT]", 1)[1]
+    return "### [DATA_TIMELINE]\n" + "\n".join(timeline_rows) + "\n\n### [REPORT_TEXT]\n" + report.strip()
+
+def parse_gemini_data(text: str) -> Dict[str, Any]:
+    return parse_report(text)
+
+# ---------- 報告渲染快取 ----------
+# 每次 rerun (切換任何側欄元件) 都會重畫整頁：報告 markdown 轉 HTML、時間軸重建，
+# 側欄還會把 HTML / JSON / Markdown 三種匯出檔全部重新產生一次。
+# 這裡以 (result, scenario_result, sources, blind_mode) 的內容雜湊為鍵保留一份 ReportRender，
+# 頁面與匯出共用同一批 HTML 片段；匯出檔只在按下下載時才產生。
+RENDER_CACHE_SIZE = 16
+_render_cache: "OrderedDict[str, ReportRender]" = OrderedDict()
+_render_lock = threading.Lock()
+
+def content_digest(*parts) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+class ReportRender:
+    """同一份分析結果的 HTML 片段與匯出檔；每個片段第一次用到才產生。"""
+
+    def __init__(self, data_result, scenario_result, sources, blind_mode):
+        self.data_result = data_result
+        self.scenario_result = scenario_result
+        self.sources = sources or []
+        self.blind_mode = blind_mode
+        self._parts: Dict[str, str] = {}
+
+    def _part(self, name: str, build) -> str:
+        if name not in self._parts: self._parts[name] = build()
+        return self._parts[name]
+
+    @staticmethod
+    def _markdown_html(report: Optional[Dict]) -> str:
+        if not report: return ""
+        return markdown.markdown(format_citation_style(report.get("report_text", "")), extensions=['tables'])
+
+    @property
+    def timeline_rows(self) -> str:
+        timeline = (self.data_result or {}).get("timeline", [])
+        return self._part("timeline", lambda: process_timeline_rows(timeline, self.sources, self.blind_mode))
+
+    @property
+    def report_html(self) -> str:
+        return self._part("report", lambda: self._markdown_html(self.data_result))
+
+    @property
+    def scenario_html(self) -> str:
+        return self._part("scenario", lambda: self._markdown_html(self.scenario_result))
+
+    @property
+    def sources_md(self) -> str:
+        """頁面上的引用文獻表格 (盲測模式隱藏媒體名稱)。"""
+        def build():
+            md_table = "| 編號 | 媒體/網域 | 標題摘要 | 連結 |\n|:---:|:---|:---|:---|\n"
+            for i, s in enumerate(self.sources):
+                media_name = source_info(s.get('url')).name
+                if self.blind_mode: media_name = "*****"
+                title = s.get('title', 'No Title')
+                if len(title) > 60: title = title[:60] + "..."
+                md_table += f"| **{i+1}** | `{media_name}` | {title} | [點擊]({s.get('url')}) |\n"
+            return md_table
+        return self._part("sources_md", build)
+
+    def full_html(self) -> str:
+        # [V37.3] 使用重構後的邏輯
+        table_rows = self.timeline_rows
+        timeline_html = ""
+        if table_rows:
+            timeline_html = f"""
+        <h3>📅 關鍵發展時序</h3>
+        <table class="custom-table" border="1" cellspacing="0" cellpadding="5" style="width:100%; border-collapse:collapse;">
+            <thead><tr><th width="120">日期</th><th width="180">媒體來源 (Code Verified)</th><th>新聞標題 (點擊閱讀)</th></tr></thead>
+            <tbody>{table_rows}</tbody>
+        </table>
+        <hr>
+        """
+
+        report_html_1 = ""
+        if self.data_result:
+            report_html_1 = f'<div class="report-paper"><h3>📝 平衡報導分析</h3>{self.report_html}</div>'
+
+        report_html_2 = ""
+        if self.scenario_result:
+            report_html_2 = f'<div class="report-paper"><h3>🔮 未來發展推演報告</h3>{self.scenario_html}</div>'
+
+        sources_html = ""
+        if self.sources:
+            s_rows = ""
+            for i, s in enumerate(self.sources):
+                media_name = source_info(s.get('url')).name
+                title = s.get('title', 'No Title')
+                url = s.get('url')
+                s_rows += f"<li><b>[{i+1}]</b> {media_name} - <a href='{url}' target='_blank'>{title}</a></li>"
+            sources_html = f"<hr><h3>📚 引用文獻列表</h3><ul>{s_rows}</ul>"
+
+        return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>全域觀點分析報告</title>
+        {CSS_STYLE}
+    </head>
+    <body style="padding: 20px; max-width: 900px; margin: 0 auto;">
+        <h1>全域觀點分析報告 (V37.3)</h1>
+        <p>生成時間: {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
+        {timeline_html}
+        {report_html_1}
+        {report_html_2}
+        {sources_html}
+    </body>
+    </html>
+    """
+
+    def state_json(self) -> str:
+        return export_full_state(self.data_result, self.scenario_result, self.sources)
+
+    def markdown_text(self) -> str:
+        export_data = dict(self.data_result or {})
+        if self.scenario_result:
+            export_data['report_text'] = export_data.get('report_text', '') + "\n\n# 未來發展推演報告\n" + self.scenario_result['report_text']
+        return convert_data_to_md(export_data)
+
+def get_report_render(data_result, scenario_result, sources, blind_mode) -> ReportRender:
+    key = content_digest(data_result, scenario_result, sources, blind_mode)
+    with _render_lock:
+        render = _render_cache.get(key)
+        if render is not None:
+            _render_cache.move_to_end(key)
+            return render
+        render = _render_cache[key] = ReportRender(data_result, scenario_result, sources, blind_mode)
+        while len(_render_cache) > RENDER_CACHE_SIZE: _render_cache.popitem(last=False)
+    return render
+
+def create_full_html_report(data_result, scenario_result, sources, blind_mode) -> str:
+    return get_report_render(data_result, scenario_result, sources, blind_mode).full_html()
+
+def export_full_state(result, scenario_result, sources) -> str:
+    # 下載按鈕的 callable 在另一個執行緒執行，拿不到 st.session_state，內容由呼叫端傳入
+    data = {
+        "result": result,
+        "scenario_result": scenario_result,
+        "sources": sources
+    }
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+def convert_data_to_md(data):
+    return f"""
+# 全域觀點分析報告 (V37.3)
+产生時間: {datetime.now()}
+
+## 1. 平衡報導分析
+{data.get('report_text')}
+
+## 2. 時間軸
+{pd.DataFrame(data.get('timeline')).to_markdown(index=False)}
+    """
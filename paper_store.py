@@ -0,0 +1,57 @@
+# ==========================================
+# 論文 / 引用邊 / 作者 的落地快取
+# ==========================================
+# 以 paperId / authorId 為鍵存在 SQLite (local_db)，跨重啟、跨 worker 程序共用。
+# 每個命名空間有各自的 TTL；總容量超過上限時依「最久未讀取」淘汰 (見 local_db.KVStore)。
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from local_db import KVStore, db_path
+
+# 命名空間 -> 預設 TTL (秒)
+DEFAULT_TTLS = {
+    "paper": 7 * 86400,          # 完整論文資料 (RICH_FIELDS)
+    "paper_light": 86400,        # 骨架用的輕量主角資料
+    "references": 7 * 86400,     # 參考文獻分頁，很少變動
+    "citations": 86400,          # 被引用分頁，每天都在長
+    "author": 3 * 86400,
+    "lookup": 30 * 86400,        # DOI / arXiv / 使用者輸入 -> paperId
+    "search": 3600,              # 廣度搜尋結果
+}
+
+
+class PaperStore(KVStore):
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttls: Optional[Dict[str, int]] = None):
+        super().__init__(path, max_bytes, {**DEFAULT_TTLS, **(ttls or {})})
+
+    # ---------- 語意化介面 ----------
+    def get_papers(self, paper_ids: Iterable[str]) -> Dict[str, Dict]:
+        return self.get_many("paper", paper_ids)
+
+    def put_papers(self, papers: List[Dict]):
+        self.put_many("paper", {p["paperId"]: p for p in papers if p and p.get("paperId")})
+
+    def get_edge_page(self, paper_id: str, direction: str, offset: int) -> Optional[Dict]:
+        """direction 為 references / citations；一頁為 {"data": [...], "next": offset 或 None}。"""
+        return self.get(direction, f"{paper_id}@{offset}")
+
+    def put_edge_page(self, paper_id: str, direction: str, offset: int, page: Dict):
+        self.put(direction, f"{paper_id}@{offset}", page)
+
+    def get_author(self, author_id: str) -> Optional[Dict]:
+        return self.get("author", author_id)
+
+    def put_author(self, author: Dict):
+        if author and author.get("authorId"): self.put("author", author["authorId"], author)
+
+
+_store: Optional[PaperStore] = None
+_store_lock = threading.Lock()
+
+def get_paper_store() -> PaperStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PaperStore(db_path("papers.sqlite3"))
+    return _store
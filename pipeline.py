@@ -0,0 +1,100 @@
+# ==========================================
+# DAG 式的階段排程
+# ==========================================
+# 每個階段宣告它依賴哪些階段；沒有依賴 (或依賴都完成) 的階段立刻丟進共用執行緒池，
+# 完成時在呼叫端執行緒回呼 on_done (可以直接寫 st.status)。
+# 端到端延遲因此是「最長依賴鏈」而不是所有階段的總和；run() 會回報這條關鍵路徑。
+# 某階段丟出例外時，依賴它的階段一律跳過 (不執行、結果為 None)。
+import time
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from concurrency import get_executor
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.skipped = False
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None or self.finished is None: return 0.0
+        return self.finished - self.started
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.t0: Optional[float] = None
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> "Pipeline":
+        """fn 會以依賴階段的結果 (依 deps 順序) 作為位置參數呼叫。"""
+        if name in self.stages: raise ValueError(f"duplicate stage: {name}")
+        for d in deps:
+            if d not in self.stages: raise ValueError(f"stage {name} depends on unknown stage {d}")
+        self.stages[name] = Stage(name, fn, deps)
+        return self
+
+    def _call(self, stage: Stage, args: List[Any]) -> Any:
+        stage.started = time.monotonic()
+        try:
+            return stage.fn(*args)
+        finally:
+            stage.finished = time.monotonic()
+
+    def run(self, on_done: Optional[Callable[[Stage], None]] = None) -> Dict[str, Any]:
+        """執行所有階段，回傳 {階段名稱: 結果}；on_done(stage) 在呼叫端執行緒依完成順序呼叫。"""
+        self.t0 = time.monotonic()
+        waiting = dict(self.stages)
+        running: Dict[concurrent.futures.Future, Stage] = {}
+        settled = set()       # 結果已在本執行緒寫回的階段 (finished 是在工作執行緒設定的，不能拿來判斷)
+
+        def settle(stage: Stage):
+            settled.add(stage.name)
+            if on_done: on_done(stage)
+
+        executor = get_executor()
+        while waiting or running:
+            for name, stage in list(waiting.items()):
+                deps = [self.stages[d] for d in stage.deps]
+                if any(d.error is not None or d.skipped for d in deps):
+                    stage.skipped = True
+                    del waiting[name]
+                    settle(stage)
+                elif all(d.name in settled for d in deps):
+                    del waiting[name]
+                    running[executor.submit(self._call, stage, [d.result for d in deps])] = stage
+            if not running: continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                stage = running.pop(fut)
+                try:
+                    stage.result = fut.result()
+                except Exception as e:
+                    stage.error = e
+                settle(stage)
+        return {name: s.result for name, s in self.stages.items()}
+
+    def critical_path(self) -> List[Stage]:
+        """從最晚結束的階段往回，每步選最晚結束的依賴，得到決定總耗時的那條鏈。"""
+        finished = [s for s in self.stages.values() if s.finished is not None]
+        if not finished: return []
+        path = [max(finished, key=lambda s: s.finished)]
+        while True:
+            deps = [self.stages[d] for d in path[-1].deps if self.stages[d].finished is not None]
+            if not deps: break
+            path.append(max(deps, key=lambda s: s.finished))
+        return path[::-1]
+
+    def timing(self) -> Dict[str, float]:
+        """wall = 實際總耗時；serial = 各階段耗時加總 (循序執行的耗時)。"""
+        finished = [s.finished for s in self.stages.values() if s.finished is not None]
+        wall = (max(finished) - self.t0) if finished and self.t0 is not None else 0.0
+        return {"wall": wall, "serial": sum(s.elapsed for s in self.stages.values())}
@@ -0,0 +1,99 @@
+# ==========================================
+# 分析報告的增量解析
+# ==========================================
+# Gemini 的輸出格式是：
+#   ### [DATA_TIMELINE]
+#   YYYY-MM-DD|媒體|標題|Source_ID
+#   ### [REPORT_TEXT]
+#   (Markdown 報告)
+# 串流時每收到一段文字就 feed()：完整的行立刻判斷是否為時間軸列 (與原本
+# parse_gemini_data 的規則相同)，報告本文則從 [REPORT_TEXT] 標記之後開始累積。
+# 時間軸因此能在報告還在產生時就先畫出來；結束時 result() 的結果與一次解析全文相同。
+import re
+from typing import Any, Dict, List, Optional
+
+REPORT_MARKERS = ("### [REPORT_TEXT]", "### REPORT_TEXT")
+FALLBACK_RE = re.compile(r"(#+\s*.*摘要|1\.\s*.*摘要|#+\s*.*CLA)")
+
+
+def parse_timeline_line(line: str) -> Optional[Dict[str, Any]]:
+    """'日期|媒體|標題|Source_ID' -> dict；不是時間軸列時回傳 None。"""
+    line = line.strip()
+    if not ("|" in line and len(line.split("|")) >= 3 and (line[0].isdigit() or "20" in line or "Future" in line or "近期" in line)):
+        return None
+    parts = line.split("|")
+    try:
+        date = parts[0].strip()
+        name = parts[1].strip()
+        title = parts[2].strip()
+        source_id_str = "0"
+        if len(parts) >= 4:
+            nums = re.findall(r'\d+', parts[3].strip())
+            if nums: source_id_str = nums[0]
+        if "XX" in date or "xx" in date: date = "近期"
+        return {"date": date, "media": name, "title": title, "source_id": int(source_id_str)}
+    except Exception:
+        return None
+
+
+class ReportStreamParser:
+    def __init__(self):
+        self.timeline: List[Dict[str, Any]] = []
+        self.text = ""
+        self._pending = ""                   # 尚未遇到換行的最後一行
+        self._report_start: Optional[int] = None
+        self._marker_rank = len(REPORT_MARKERS)
+
+    def _scan_markers(self, start: int):
+        """找 [REPORT_TEXT] 標記；優先順序與 parse_gemini_data 相同 (先找 '### [REPORT_TEXT]')。"""
+        for rank, marker in enumerate(REPORT_MARKERS):
+            if rank >= self._marker_rank: break
+            pos = self.text.find(marker, max(0, start - len(marker)))
+            if pos >= 0:
+                self._report_start = pos + len(marker)
+                self._marker_rank = rank
+                break
+
+    def feed(self, chunk: str) -> int:
+        """加入一段串流文字，回傳這次新增的時間軸列數。"""
+        if not chunk: return 0
+        start = len(self.text)
+        self.text += chunk
+        if self._marker_rank > 0: self._scan_markers(start)
+
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        added = 0
+        for line in lines:
+            row = parse_timeline_line(line)
+            if row:
+                self.timeline.append(row)
+                added += 1
+        return added
+
+    @property
+    def report_text(self) -> str:
+        """目前為止的報告本文 (串流中途也可以呼叫)；與原本的 split(marker)[1] 相同，到下一個同樣的標記為止。"""
+        if self._report_start is None: return ""
+        end = self.text.find(REPORT_MARKERS[self._marker_rank], self._report_start)
+        return self.text[self._report_start:end if end >= 0 else None].strip()
+
+    def result(self) -> Dict[str, Any]:
+        """串流結束後呼叫：處理最後一行，並在沒有標記時套用原本的退路規則。"""
+        if self._pending:
+            row = parse_timeline_line(self._pending)
+            if row: self.timeline.append(row)
+            self._pending = ""
+        text = self.text
+        if self._report_start is not None:
+            report = self.report_text
+        else:
+            match = FALLBACK_RE.search(text)
+            report = text[match.start():] if match else text
+        return {"timeline": self.timeline, "report_text": report}
+
+
+def parse_report(text: str) -> Dict[str, Any]:
+    parser = ReportStreamParser()
+    if text: parser.feed(text)
+    return parser.result()
@@ -0,0 +1,171 @@
+# ==========================================
+# Semantic Scholar Graph API 共用客戶端
+# ==========================================
+# 同一個 Python 程序內的所有 Streamlit session 共用：
+# - 一個 keep-alive 的 requests.Session (連線池，免去每次 TCP+TLS 握手)
+# - 一個令牌桶限流器 (整個程序合計的請求速率)
+# - 遵守 Retry-After 的退避重試 (429 / 5xx / 連線錯誤)
+# - 命中、重試、節流等計數器，供側邊欄或批次腳本觀察
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from concurrency import provider_slot
+
+S2_BASE_URL = "https://api.semanticscholar.org/graph/v1"
+USER_AGENT = "AcademicRadar/12.9"
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """執行緒安全的令牌桶：rate 為每秒補充的令牌數，capacity 為可累積的突發量。"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 0.01)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """取得令牌；必要時阻塞等待。超過 timeout 仍拿不到則回傳 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = max(self._blocked_until - now, (tokens - self._tokens) / self.rate)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def penalize(self, seconds: float):
+        """伺服器要求冷卻 (429 Retry-After) 時，讓所有使用者一起暫停並清空令牌。"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 可能是秒數或 HTTP 日期，統一轉成秒數。"""
+    if not value: return None
+    value = value.strip()
+    if value.isdigit(): return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class S2Client:
+    def __init__(self, api_key: Optional[str] = None, rate: float = 1.0, burst: float = 3.0,
+                 max_retries: int = 4, timeout: float = 10, pool_size: int = 16,
+                 max_backoff: float = 30.0):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        if api_key: self.session.headers["x-api-key"] = api_key
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "hits": 0, "misses": 0, "retries": 0, "throttles": 0, "errors": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.max_backoff, (2 ** attempt) + random.uniform(0, 1))
+
+    def request(self, method: str, path: str, params: Optional[Dict] = None, json: Any = None,
+                timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        發送請求並回傳解析後的 JSON。
+        404/400 等不可重試的狀態回傳 None；429/5xx/連線錯誤依 Retry-After 或指數退避重試。
+        """
+        url = path if path.startswith("http") else f"{S2_BASE_URL}{path}"
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                with provider_slot("s2"):
+                    r = self.session.request(method, url, params=params, json=json, timeout=timeout or self.timeout)
+            except requests.RequestException:
+                self._count("errors")
+                if attempt >= self.max_retries: return None
+                self._count("retries")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if r.status_code == 200:
+                self._count("hits")
+                try: return r.json()
+                except ValueError:
+                    self._count("errors")
+                    return None
+
+            if r.status_code not in RETRY_STATUS:
+                self._count("misses")
+                return None
+
+            if r.status_code == 429:
+                self._count("throttles")
+                delay = parse_retry_after(r.headers.get("Retry-After"))
+                if delay is None: delay = self._backoff(attempt)
+                self.bucket.penalize(min(delay, self.max_backoff))
+            else:
+                self._count("errors")
+                delay = parse_retry_after(r.headers.get("Retry-After")) or self._backoff(attempt)
+
+            if attempt >= self.max_retries: return None
+            self._count("retries")
+            time.sleep(min(delay, self.max_backoff))
+        return None
+
+    def get(self, path: str, params: Optional[Dict] = None, **kwargs) -> Optional[Any]:
+        return self.request("GET", path, params=params, **kwargs)
+
+    def post(self, path: str, params: Optional[Dict] = None, json: Any = None, **kwargs) -> Optional[Any]:
+        return self.request("POST", path, params=params, json=json, **kwargs)
+
+
+_client: Optional[S2Client] = None
+_client_lock = threading.Lock()
+
+def get_s2_client() -> S2Client:
+    """程序層級單例。速率可用環境變數 S2_RATE_LIMIT / S2_BURST 調整，S2_API_KEY 為選填。"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = S2Client(
+                    api_key=os.environ.get("S2_API_KEY"),
+                    rate=float(os.environ.get("S2_RATE_LIMIT", "1.0")),
+                    burst=float(os.environ.get("S2_BURST", "3")),
+                )
+    return _client
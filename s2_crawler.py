@@ -0,0 +1,162 @@
+# ==========================================
+# 分頁式引用 / 參考文獻爬取器
+# ==========================================
+# 以 /paper/{id}/references 與 /paper/{id}/citations 分頁端點逐頁抓取，
+# 取代 LIGHT_FIELDS 內嵌 references.* / citations.* 的一次性 GET
+# (內嵌欄位對經典論文會被 API 靜默截斷)。
+# 每一頁都會寫入 paper_store，重開同一篇論文時直接讀本地。
+import heapq
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+from s2_client import S2Client, get_s2_client
+from paper_store import PaperStore, get_paper_store
+
+EDGE_FIELDS = "paperId,citationCount,year"
+PAGE_SIZE = 500          # API 單頁上限為 1000
+MAX_OFFSET = 10000       # API 可翻頁的上限 (offset + limit)；到這裡才算資料結束
+DEFAULT_LOOKAHEAD = 200  # 排序緩衝：至少累積這麼多候選才吐出下一名
+
+EDGE_KEYS = {"references": "citedPaper", "citations": "citingPaper"}
+
+SORT_KEYS: Dict[str, Callable[[Dict], float]] = {
+    "citationCount": lambda p: p.get("citationCount") or 0,
+    "year": lambda p: p.get("year") or 0,
+}
+
+
+class EdgePageError(RuntimeError):
+    """分頁請求失敗 (S2 重試用盡、5xx、連線錯誤)；和「沒有下一頁」不同，之後可以從同一個 offset 重試。"""
+
+
+def load_edge_page(paper_id: str, direction: str, offset: int, page_size: int = PAGE_SIZE,
+                   client: Optional[S2Client] = None, store: Optional[PaperStore] = None,
+                   allow_request: Optional[Callable[[], bool]] = None) -> Optional[Dict]:
+    """
+    取得從 offset 開始的一頁 {"data": [...], "next": 下一頁 offset 或 None}，先查 paper_store。
+    allow_request 在真的要打 API 前呼叫，回傳 False 時回傳 None；請求失敗時拋出 EdgePageError。
+    """
+    store = store or get_paper_store()
+    page = store.get_edge_page(paper_id, direction, offset)
+    if page is not None: return page
+    limit = min(page_size, MAX_OFFSET - offset)
+    if limit <= 0: return {"data": [], "next": None}
+    if allow_request and not allow_request(): return None
+    data = (client or get_s2_client()).get(f"/paper/{paper_id}/{direction}",
+                                            params={"fields": EDGE_FIELDS, "offset": offset, "limit": limit})
+    if data is None: raise EdgePageError(f"{direction} of {paper_id} @ offset {offset}")
+    edge_key = EDGE_KEYS[direction]
+    page = {
+        "data": [e[edge_key] for e in data.get("data", []) if (e.get(edge_key) or {}).get("paperId")],
+        "next": data.get("next") if data.get("data") else None,
+    }
+    store.put_edge_page(paper_id, direction, offset, page)
+    return page
+
+
+def iter_edge_pages(paper_id: str, direction: str, page_size: int = PAGE_SIZE,
+                    client: Optional[S2Client] = None, store: Optional[PaperStore] = None,
+                    allow_request: Optional[Callable[[], bool]] = None) -> Iterator[List[Dict]]:
+    """
+    逐頁產生 (yield) 某篇論文的參考文獻或被引用論文，不預先載入整份列表。
+    allow_request 在每次真的要打 API (本地沒有快取) 前呼叫，回傳 False 即停止，供爬蟲控管請求預算。
+    請求失敗時拋出 EdgePageError，不會當成資料已結束。
+    """
+    offset = 0
+    while offset is not None:
+        page = load_edge_page(paper_id, direction, offset, page_size, client, store, allow_request)
+        if page is None: return
+        if page["data"]: yield page["data"]
+        offset = page["next"]
+
+
+class EdgeFrontier:
+    """
+    依需求消費分頁結果的排序前緣。
+    已抓到但尚未吐出的候選放在 heap 中 (依 sort_key 由大到小)，
+    需要第 n 名時才繼續翻頁，直到緩衝區至少有 lookahead 筆或資料已抓完。
+    ranked 為已吐出的名次列表，可直接作為 skeleton['all_ancestors'] 使用。
+    翻頁失敗時 EdgePageError 往外拋，下一頁的 offset 不變，之後呼叫 ensure 會從同一頁重試。
+    """
+
+    def __init__(self, paper_id: str, direction: str, sort_key: str, lookahead: int = DEFAULT_LOOKAHEAD):
+        self.paper_id = paper_id
+        self.direction = direction
+        self.sort_key = sort_key
+        self.lookahead = lookahead
+        self.ranked: List[Dict] = []
+        self.fetched = 0
+        self.exhausted = False
+        self._next: Optional[int] = 0
+        self._heap = []
+        self._seen = set()
+        self._seq = 0
+        self._key = SORT_KEYS[sort_key]
+        self._priority: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, p: Dict, seq: int):
+        # 有外部優先分數 (例如 graph_rank) 時先比分數，再比原本的 sort_key
+        return (-self._priority.get(p["paperId"], 0.0), -self._key(p), seq, p)
+
+    def _pull_page(self):
+        page = load_edge_page(self.paper_id, self.direction, self._next)
+        self._next = page["next"]
+        if self._next is None: self.exhausted = True
+        for p in page["data"]:
+            pid = p["paperId"]
+            if pid in self._seen: continue
+            self._seen.add(pid)
+            self.fetched += 1
+            heapq.heappush(self._heap, self._entry(p, self._seq))
+            self._seq += 1
+
+    def restore(self, ranked: List[Dict]):
+        """
+        以存檔的名次 (skeleton['all_ancestors'] 等) 接續：這些論文保持原順序、之後翻頁遇到就略過。
+        頁面在 paper_store 有快取，重新翻到原本的位置不需要再打 API。
+        """
+        with self._lock:
+            for p in ranked:
+                pid = p.get("paperId")
+                if not pid or pid in self._seen: continue
+                self._seen.add(pid)
+                self.ranked.append(p)
+
+    def ensure(self, n: int):
+        """確保 ranked 至少有 n 筆 (除非資料已抓完)。"""
+        with self._lock:
+            while len(self.ranked) < n:
+                while not self.exhausted and len(self._heap) < self.lookahead:
+                    self._pull_page()
+                if not self._heap: break
+                self.ranked.append(heapq.heappop(self._heap)[-1])
+
+    def set_priority(self, scores: Dict[str, float], keep: int):
+        """
+        改用外部分數重新排序：ranked 前 keep 筆 (已展示給使用者) 保持不動，
+        其餘已排出但未使用的候選放回 heap 與緩衝區一起重排。
+        """
+        with self._lock:
+            self._priority = dict(scores)
+            pending = self.ranked[keep:] + [e[-1] for e in self._heap]
+            del self.ranked[keep:]
+            self._heap = [self._entry(p, self._seq + i) for i, p in enumerate(pending)]
+            self._seq += len(pending)
+            heapq.heapify(self._heap)
+
+    def window(self, start: int, size: int) -> List[Dict]:
+        self.ensure(start + size)
+        return self.ranked[start:start + size]
+
+    def has_more(self, start: int) -> bool:
+        with self._lock:
+            return start < len(self.ranked) or bool(self._heap) or not self.exhausted
+
+
+def open_frontiers(paper_id: str, lookahead: int = DEFAULT_LOOKAHEAD) -> Dict[str, EdgeFrontier]:
+    """祖先依引用數排序、後代依年份排序 (與舊版 fetch_network_skeleton 相同的排序準則)。"""
+    return {
+        "a": EdgeFrontier(paper_id, "references", "citationCount", lookahead),
+        "d": EdgeFrontier(paper_id, "citations", "year", lookahead),
+    }
@@ -1,7 +1,9 @@
 import streamlit as st
-import google.generativeai as genai
 from tavily import TavilyClient
 
+from llm_cache import get_llm_cache
+from gemini_pool import get_gemini_pool
+
 # --- 頁面設定 ---
 st.set_page_config(
     page_title="Gemini 2.5 x Tavily 終極搜尋引擎", 
@@ -71,10 +73,8 @@ def get_tavily_search(query, api_key, depth="advanced", max_results=5):
 
 def generate_gemini_response(query, search_results, api_key, model_name):
     """將搜尋結果餵給指定的 Gemini 模型進行總結"""
-    genai.configure(api_key=api_key)
-    
-    # 使用使用者選擇的模型 (例如 gemini-2.5-pro)
-    model = genai.GenerativeModel(model_name)
+    # 使用使用者選擇的模型 (例如 gemini-2.5-pro)；用戶端池以金鑰區分，不動全域設定
+    model = get_gemini_pool().model(api_key, model_name)
     
     # 組合 Context
     context_text = ""
@@ -102,9 +102,11 @@ def generate_gemini_response(query, search_results, api_key, model_name):
     請開始撰寫報告：
     """
     
-    # 生成內容 (Stream 模式)
-    response = model.generate_content(prompt, stream=True)
-    return response
+    # 生成內容 (Stream 模式)：回傳文字片段的 iterator，相同 prompt 直接重播快取
+    def produce():
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text: yield chunk.text
+    return get_llm_cache().cached_stream(model_name, prompt, None, produce)
 
 # --- 主介面邏輯 ---
 
@@ -141,10 +143,9 @@ if search_btn and query:
             # 傳入 selected_model
             response_stream = generate_gemini_response(query, search_data, gemini_key, selected_model)
             
-            for chunk in response_stream:
-                if chunk.text:
-                    full_response += chunk.text
-                    result_container.markdown(full_response + "▌")
+            for text in response_stream:
+                full_response += text
+                result_container.markdown(full_response + "▌")
             
             result_container.markdown(full_response)
             
@@ -0,0 +1,125 @@
+# ==========================================
+# Tavily 搜尋結果的 TTL 快取 (stale-while-revalidate)
+# ==========================================
+# 鍵 = 正規化後的 (query, search_depth, topic, days, include/exclude domains, max_results)，
+# 存在共用的 SQLite (local_db.KVStore)，跨重跑、跨使用者共用。
+# 「新鮮期」依搜尋天數分級：只查最近 1 天的新聞很快就過時，查一年的結果可以放久一點。
+# 超過新鮮期但還在 MAX_STALE 內的結果：
+# - stale_while_revalidate=True 時先回傳舊結果，背景重新搜尋後覆寫
+# - 否則同步重新搜尋
+# 搜尋失敗 (例外) 不寫入快取。
+import copy
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from local_db import KVStore, db_path
+from concurrency import coalesce, get_executor, provider_slot
+
+NS = "tavily"
+
+# (搜尋天數上限, 新鮮期秒數)；None 代表其餘所有範圍
+DEFAULT_FRESHNESS: Sequence[Tuple[Optional[int], int]] = (
+    (1, 15 * 60),
+    (3, 3600),
+    (7, 3 * 3600),
+    (30, 6 * 3600),
+    (None, 86400),
+)
+MAX_STALE = 3 * 86400
+
+KEY_PARAMS = ("search_depth", "topic", "days", "max_results", "include_domains", "exclude_domains")
+
+
+def search_key(query: str, params: Dict[str, Any]) -> str:
+    """大小寫、多餘空白、網域清單順序與重複都不影響鍵。"""
+    norm = {"query": " ".join(query.split()).lower()}
+    for name in KEY_PARAMS:
+        value = params.get(name)
+        if value is None: continue
+        if isinstance(value, (list, tuple, set)): value = sorted({str(v).strip().lower() for v in value})
+        norm[name] = value
+    payload = json.dumps(norm, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SearchCache(KVStore):
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024,
+                 freshness: Sequence[Tuple[Optional[int], int]] = DEFAULT_FRESHNESS, max_stale: int = MAX_STALE):
+        super().__init__(path, max_bytes, {NS: max_stale})
+        self.freshness = list(freshness)
+        self._inflight = set()
+        self._stats_lock = threading.Lock()
+        self._stats = {"fresh": 0, "stale": 0, "misses": 0, "refreshes": 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def hit_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def fresh_for(self, days: Optional[int]) -> int:
+        """依搜尋天數決定新鮮期 (秒)。"""
+        for max_days, ttl in self.freshness:
+            if max_days is None or (days is not None and days <= max_days): return ttl
+        return self.freshness[-1][1]
+
+    def _fetch(self, client, key: str, query: str, params: Dict[str, Any]) -> List[Dict]:
+        """
+        同一組搜尋條件同時只打一次 Tavily，其他 session 等待並共用結果。
+        每個呼叫端拿到自己的副本：下游會直接改寫結果 (outlets / duplicate_urls / final_date)。
+        """
+        def upstream():
+            with provider_slot("tavily"):
+                results = client.search(query=query, **params).get('results', [])
+            self.put(NS, key, {"fetched_at": time.time(), "results": results})
+            return results
+        return copy.deepcopy(coalesce(("tavily", key), upstream))
+
+    def _revalidate(self, client, key: str, query: str, params: Dict[str, Any]):
+        """同一個鍵同時只會有一個背景更新。"""
+        with self._stats_lock:
+            if key in self._inflight: return
+            self._inflight.add(key)
+
+        def job():
+            try:
+                self._fetch(client, key, query, params)
+                self._count("refreshes")
+            except Exception:
+                pass
+            finally:
+                with self._stats_lock:
+                    self._inflight.discard(key)
+        get_executor().submit(job)
+
+    def search(self, client, query: str, params: Dict[str, Any], stale_while_revalidate: bool = True) -> List[Dict]:
+        """TavilyClient.search 的快取版，回傳 results 清單；未命中時的例外原樣往外拋。"""
+        key = search_key(query, params)
+        entry = self.get(NS, key)
+        if entry is not None:
+            if time.time() - entry["fetched_at"] < self.fresh_for(params.get("days")):
+                self._count("fresh")
+                return entry["results"]
+            if stale_while_revalidate:
+                self._count("stale")
+                self._revalidate(client, key, query, params)
+                return entry["results"]
+        self._count("misses")
+        return self._fetch(client, key, query, params)
+
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+def get_search_cache() -> SearchCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache(db_path("search_cache.sqlite3"))
+    return _cache
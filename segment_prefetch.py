@@ -0,0 +1,70 @@
+# ==========================================
+# 祖先 / 後代分段的背景預取
+# ==========================================
+# 初次挖掘完成後，立刻在執行緒池上先把接下來 N 段 (每段 5 篇) 的
+# enrich_segment 跑完並暫存；使用者按「找更早祖先 / 找更新後代」時直接取用。
+# 換主角論文時 reset()：未開始的工作取消，進行中的工作結果作廢。
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from concurrency import get_executor
+
+WindowLoader = Callable[[str, int, int], List[Dict]]   # (side, start, size) -> 骨架論文
+Enricher = Callable[[List[Dict]], List[Dict]]
+
+
+class SegmentPrefetcher:
+    def __init__(self, enrich_fn: Enricher, window_size: int = 5, depth: int = 2, max_entries: int = 32):
+        self.enrich_fn = enrich_fn
+        self.window_size = window_size
+        self.depth = depth
+        self.max_entries = max_entries
+        self.hero_id: Optional[str] = None
+        self._loader: Optional[WindowLoader] = None
+        self._generation = 0
+        self._futures: "OrderedDict[Tuple[str, int], concurrent.futures.Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self, hero_id: Optional[str], loader: Optional[WindowLoader]):
+        """切換主角：取消所有尚未開始的預取，進行中的結果一律丟棄。"""
+        with self._lock:
+            self._generation += 1
+            for fut in self._futures.values(): fut.cancel()
+            self._futures.clear()
+            self.hero_id = hero_id
+            self._loader = loader
+
+    def _job(self, generation: int, side: str, start: int) -> Optional[List[Dict]]:
+        if generation != self._generation: return None
+        objs = self._loader(side, start, self.window_size)
+        if not objs or generation != self._generation: return None
+        return self.enrich_fn(objs)
+
+    def schedule(self, offsets: Dict[str, int], sides: Tuple[str, ...] = ("a", "d")):
+        """從目前 offsets 起，為每個方向排入 depth 段預取。"""
+        if not self._loader or self.depth <= 0: return
+        with self._lock:
+            for side in sides:
+                for k in range(self.depth):
+                    key = (side, offsets[side] + k * self.window_size)
+                    if key in self._futures: continue
+                    self._futures[key] = get_executor().submit(self._job, self._generation, *key)
+            while len(self._futures) > self.max_entries:
+                _, oldest = self._futures.popitem(last=False)
+                oldest.cancel()
+
+    def take(self, side: str, start: int, timeout: Optional[float] = None) -> Optional[List[Dict]]:
+        """取出預取結果；若仍在執行則等它完成 (比重新發請求快)。沒有排程或失敗時回傳 None。"""
+        with self._lock:
+            fut = self._futures.pop((side, start), None)
+        if fut is None or fut.cancelled(): return None
+        try:
+            return fut.result(timeout=timeout)
+        except Exception:
+            return None
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for f in self._futures.values() if not f.done())
@@ -0,0 +1,106 @@
+# ==========================================
+# 搜尋結果的近似重複合併
+# ==========================================
+# 同一則通訊社稿會同時出現在 Yahoo、ETtoday、各家鏡像站，同一個網址也常帶著
+# utm / fbclid 等追蹤參數或 AMP / 行動版變體；只靠完全相同的 url 去重擋不住，
+# 白白吃掉 prompt 的篇幅。這裡分兩步：
+# 1. canonical_url：去掉追蹤參數、www / m. / amp 變體、fragment 後再比對
+# 2. MinHash：以標題 + 內文的字元 4-gram 算 64 維簽章 (numpy 向量化)，
+#    估計的 Jaccard 相似度超過門檻視為同一則報導 (新聞摘要多半只有幾百字，
+#    短文本上 MinHash 比 SimHash 穩定)
+# 每一群只保留第一篇 (保底搜尋排在前面，優先保留)，並在 outlets / duplicate_urls
+# 記下所有轉載媒體，保留框架分析需要的「聲量」訊號。
+import re
+import hashlib
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+# 只去掉純點擊追蹤參數；ref / from / share / amp / outputtype 之類在不少新聞 CMS 裡
+# 用來指定文章或版本，去掉會把不同的頁面併成同一篇
+TRACKING_PARAMS = {"fbclid", "gclid", "gbraid", "wbraid", "dclid", "msclkid", "yclid", "ttclid", "twclid",
+                   "igshid", "mc_cid", "mc_eid", "_ga", "_gl"}
+TRACKING_PREFIXES = ("utm_",)
+HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+SHINGLE = 4
+MIN_TEXT = 80                 # 內容太短無法判斷相似度，只做網址去重
+NUM_PERM = 64
+DEFAULT_THRESHOLD = 0.6       # 估計 Jaccard 相似度門檻
+
+_PRIME = np.uint64(4294967311)                   # > 2^32，(a*x+b) 不會溢位 uint64
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2 ** 32 - 1, NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 1, NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+_SPACE_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def canonical_url(url: str) -> str:
+    if not url: return ""
+    try: parts = urlsplit(url.strip())
+    except ValueError: return url
+    host = (parts.hostname or "").lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix): host = host[len(prefix):]
+    try: port = parts.port
+    except ValueError: port = None
+    if port and port not in (80, 443): host = f"{host}:{port}"
+    path = re.sub(r"/amp/?$|\.amp$|/amp(?=/)", "", parts.path) or "/"
+    if len(path) > 1: path = path.rstrip("/")
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=False)
+                   if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES))
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """字元 4-gram 的 MinHash 簽章 (NUM_PERM 維)；文字太短時回傳 None。"""
+    norm = _SPACE_RE.sub(" ", text or "").strip().lower()
+    if len(norm) < MIN_TEXT: return None
+    grams = {norm[i:i + SHINGLE] for i in range(len(norm) - SHINGLE + 1)}
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest() for g in grams)
+    x = np.frombuffer(digests, dtype=np.uint32).astype(np.uint64)
+    return ((np.outer(x, _A) + _B) % _PRIME).min(axis=0)
+
+
+def collapse_near_duplicates(results: List[Dict], name_fn: Callable[[str], str] = lambda u: u,
+                             threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    依序走訪 results，把網址相同 (正規化後) 或 MinHash 相似度超過門檻的併入第一個代表。
+    代表會多兩個欄位：outlets (轉載媒體名稱，不重複) 與 duplicate_urls (被併掉的網址)。
+    """
+    kept: List[Dict] = []
+    by_url: Dict[str, Dict] = {}
+    signatures: List[np.ndarray] = []
+    owners: List[Dict] = []
+
+    def absorb(rep: Dict, item: Dict):
+        name = name_fn(item.get('url', ''))
+        if name and name not in rep['outlets']: rep['outlets'].append(name)
+        rep['duplicate_urls'].append(item.get('url', ''))
+
+    for item in results:
+        key = canonical_url(item.get('url', ''))
+        rep = by_url.get(key)
+        if rep is not None:
+            rep['duplicate_urls'].append(item.get('url', ''))
+            continue
+
+        sig = minhash(f"{item.get('title', '')} {item.get('content', '')}")
+        if sig is not None and signatures:
+            sims = (np.vstack(signatures) == sig).mean(axis=1)
+            best = int(sims.argmax())
+            if sims[best] >= threshold:
+                absorb(owners[best], item)
+                by_url[key] = owners[best]
+                continue
+
+        item['outlets'] = [name_fn(item.get('url', ''))]
+        item['duplicate_urls'] = []
+        kept.append(item)
+        by_url[key] = item
+        if sig is not None:
+            signatures.append(sig)
+            owners.append(item)
+    return kept
@@ -0,0 +1,69 @@
+# ==========================================
+# 批次執行的階段檢查點 (news_batch / academic_batch 共用)
+# ==========================================
+# 每個工作項目 (一個議題 / 一篇論文) 一個 JSON 檔，每完成一個階段就把結果原子寫入：
+# 重跑同一批時已完成的階段直接沿用，失敗的項目從失敗的那個階段接著跑。
+# 檔案記錄設定的雜湊 (config)，設定改變時舊的檢查點作廢、從頭開始。
+# 階段結果必須可以 JSON 序列化。
+import os
+import re
+import json
+import time
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+def safe_name(text: str, max_len: int = 40) -> str:
+    """檔名安全的名稱；加上雜湊避免不同輸入清理後撞名。"""
+    slug = re.sub(r"[^\w]+", "_", text).strip("_")[:max_len] or "item"
+    return f"{slug}_{hashlib.blake2b(text.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def write_atomic(path: str, text: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(text)
+    os.replace(tmp, path)
+
+
+def read_list(path: str) -> List[str]:
+    """一行一項 (# 開頭為註解)；.json 檔則為字串陣列。空白正規化後去重，保留原順序。"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"): items = [str(t) for t in json.load(f)]
+        else: items = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return list(dict.fromkeys(" ".join(t.split()) for t in items if t.strip()))
+
+
+class StageCheckpoint:
+    def __init__(self, path: str, config: Any, stages: Sequence[str], fresh: bool = False):
+        self.path = path
+        self.stages = tuple(stages)
+        config_key = hashlib.blake2b(json.dumps(config, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"),
+                                     digest_size=16).hexdigest()
+        self.state: Dict[str, Any] = {"config": config_key, "stages": {}}
+        self.resumed: List[str] = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if fresh: return
+        try:
+            with open(path, encoding="utf-8") as f: saved = json.load(f)
+            if saved.get("config") == config_key: self.state = saved
+        except (OSError, ValueError): pass
+
+    def save(self):
+        write_atomic(self.path, json.dumps(self.state, ensure_ascii=False, indent=1))
+
+    def stage(self, name: str, fn: Callable[[], Any]) -> Any:
+        """已有檢查點就直接回傳；否則執行、計時並寫入檢查點。例外往外拋，不寫入。"""
+        done = self.state["stages"].get(name)
+        if done is not None:
+            self.resumed.append(name)
+            return done["result"]
+        started = time.time()
+        result = fn()
+        self.state["stages"][name] = {"result": result, "elapsed": round(time.time() - started, 2)}
+        self.save()
+        return result
+
+    def timing(self) -> Dict[str, Optional[float]]:
+        """這次執行各階段的耗時；沿用檢查點的階段記為 0，還沒跑到的為 None。"""
+        stages = self.state["stages"]
+        return {s: (0.0 if s in self.resumed else stages[s]["elapsed"]) if s in stages else None for s in self.stages}
@@ -0,0 +1,35 @@
+# ==========================================
+# 串流輸出的節流渲染
+# ==========================================
+# Streamlit 每次 placeholder.markdown() 都要送一次前端更新，
+# 逐 chunk 重繪在長報告上很浪費；這裡限制最短重繪間隔，
+# 並保證串流中途出錯時，已產生的部分內容仍會留下來。
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+DEFAULT_INTERVAL = 0.15   # 秒
+
+
+def render_stream(chunks: Iterable[str], render: Callable[[str, bool], None],
+                  min_interval: float = DEFAULT_INTERVAL,
+                  error_note: str = "\n\n> ⚠️ 生成中斷：{error}（以上為中斷前已產生的內容）") -> Tuple[str, Optional[Exception]]:
+    """
+    消費文字串流並呼叫 render(目前全文, 是否結束)。
+    回傳 (全文, 例外或 None)；出錯時全文 = 已收到的部分 + error_note。
+    """
+    text = ""
+    error = None
+    last = 0.0
+    try:
+        for chunk in chunks:
+            if not chunk: continue
+            text += chunk
+            now = time.monotonic()
+            if now - last >= min_interval:
+                render(text, False)
+                last = now
+    except Exception as e:
+        error = e
+        text += error_note.format(error=e)
+    render(text, True)
+    return text, error
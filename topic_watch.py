@@ -0,0 +1,145 @@
+# ==========================================
+# 議題追蹤：高水位、已讀網址與增量合併
+# ==========================================
+# 同一個議題每天以 search_days=30 重跑，抓回來、送進模型的幾乎都是同一批報導。
+# 追蹤模式為每個 (議題, 搜尋視角) 存一份 watch：
+# - high_water：看過的報導中最新的發布日期；下次只搜尋這天之後的時間窗
+# - seen：看過的 canonical_url (含被合併掉的轉載網址)，時間窗重疊的部分用它過濾
+# - sources / timeline：累積的來源與時間軸；新來源的 Source 編號接續在後面，舊的引用不會失效
+# - base_report + updates：第一次的完整報告，加上每次只針對新報導的增量分析
+# 每天的成本因此只和新報導的數量有關，與時間窗長短無關。
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from local_db import KVStore, db_path
+from source_dedup import canonical_url
+
+WATCH_TTL = 180 * 86400
+SEEN_LIMIT = 5000            # 已讀網址只保留最新的 5000 筆
+MAX_UPDATES = 7              # 報告最多保留最近 7 次增量分析
+STORED_CONTENT_CHARS = 3000  # 與 format_search_context 的預設截斷一致
+PREVIOUS_REPORT_CHARS = 6000 # 增量分析時附給模型的前次報告長度上限
+
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def watch_key(query: str, regions: Sequence[str]) -> str:
+    return " ".join(query.split()).lower() + "|" + ",".join(sorted(regions))
+
+
+def high_water(sources: Sequence[Dict], current: str = "") -> str:
+    """sources 中最新的 final_date (YYYY-MM-DD)；沒有可用日期時維持 current。"""
+    days = [s.get("final_date") or "" for s in sources]
+    return max([current] + [d for d in days if _DAY_RE.match(d)])
+
+
+def window_days(watch: Dict, max_days: int, today: Optional[datetime] = None) -> int:
+    """從高水位 (沒有時用上次執行日) 到今天的天數，含當天，介於 1 ~ max_days。"""
+    today = today or datetime.now()
+    anchor = watch.get("high_water") or watch.get("last_run", "")
+    try: since = datetime.strptime(anchor[:10], "%Y-%m-%d")
+    except ValueError: return max_days
+    return max(1, min(max_days, (today.date() - since.date()).days + 1))
+
+
+def _seen_urls(sources: Sequence[Dict]) -> List[str]:
+    urls = []
+    for s in sources:
+        urls.append(canonical_url(s.get("url", "")))
+        urls.extend(canonical_url(u) for u in s.get("duplicate_urls") or [])
+    return [u for u in urls if u]
+
+
+def filter_unseen(watch: Dict, results: Sequence[Dict]) -> List[Dict]:
+    """去掉已經看過的報導 (網址或任一轉載網址在 seen 中)。"""
+    seen = set(watch.get("seen", []))
+    fresh = []
+    for r in results:
+        urls = [canonical_url(r.get("url", ""))] + [canonical_url(u) for u in r.get("duplicate_urls") or []]
+        if not any(u in seen for u in urls): fresh.append(r)
+    return fresh
+
+
+def _stored(sources: Sequence[Dict]) -> List[Dict]:
+    return [{**s, "content": (s.get("content") or "")[:STORED_CONTENT_CHARS]} for s in sources]
+
+
+def new_watch(query: str, regions: Sequence[str], sources: Sequence[Dict], result: Dict) -> Dict:
+    today = datetime.now().strftime("%Y-%m-%d")
+    return {
+        "query": query,
+        "regions": list(regions),
+        "created": today,
+        "last_run": today,
+        "high_water": high_water(sources),
+        "seen": _seen_urls(sources)[-SEEN_LIMIT:],
+        "sources": _stored(sources),
+        "timeline": list(result.get("timeline", [])),
+        "base_report": result.get("report_text", ""),
+        "updates": [],
+    }
+
+
+def merge_update(watch: Dict, new_sources: Sequence[Dict], delta: Dict) -> Dict:
+    """
+    併入一次增量分析：new_sources 的 Source 編號必須已接續在 watch["sources"] 之後
+    (format_search_context(first_id=len(watch["sources"]) + 1))，delta 的時間軸因此可以直接附加。
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    timeline = list(watch.get("timeline", []))
+    known = {(r.get("date"), r.get("title"), r.get("source_id")) for r in timeline}
+    for row in delta.get("timeline", []):
+        if (row.get("date"), row.get("title"), row.get("source_id")) not in known: timeline.append(row)
+    update = {"date": today, "count": len(new_sources), "report_text": delta.get("report_text", "")}
+    return {
+        **watch,
+        "last_run": today,
+        "high_water": high_water(new_sources, watch.get("high_water", "")),
+        "seen": (watch.get("seen", []) + _seen_urls(new_sources))[-SEEN_LIMIT:],
+        "sources": watch.get("sources", []) + _stored(new_sources),
+        "timeline": timeline,
+        "updates": ([update] + watch.get("updates", []))[:MAX_UPDATES],
+    }
+
+
+def touch(watch: Dict) -> Dict:
+    """沒有新報導時只更新執行日。"""
+    return {**watch, "last_run": datetime.now().strftime("%Y-%m-%d")}
+
+
+def watch_result(watch: Dict) -> Dict:
+    """組出與 parse_gemini_data 相同結構的結果：最新的增量分析在前，完整報告在後。"""
+    parts = [f"## 🆕 {u['date']} 追蹤更新 (新增 {u['count']} 篇)\n{u['report_text']}" for u in watch.get("updates", [])]
+    if parts: parts.append(f"## 📌 基準報告 ({watch.get('created')})\n{watch.get('base_report', '')}")
+    else: parts.append(watch.get("base_report", ""))
+    return {"timeline": watch.get("timeline", []), "report_text": "\n\n---\n\n".join(parts)}
+
+
+def previous_report(watch: Dict) -> str:
+    """附給模型的前次報告：最近一次增量 + 基準報告，截到 PREVIOUS_REPORT_CHARS。"""
+    return watch_result({**watch, "updates": watch.get("updates", [])[:1]})["report_text"][:PREVIOUS_REPORT_CHARS]
+
+
+class TopicWatchStore(KVStore):
+    def __init__(self, path: str):
+        super().__init__(path, ttls={"watch": WATCH_TTL})
+
+    def load(self, key: str) -> Optional[Dict]:
+        return self.get("watch", key)
+
+    def save(self, key: str, watch: Dict):
+        self.put("watch", key, watch)
+
+
+_store: Optional[TopicWatchStore] = None
+_store_lock = threading.Lock()
+
+def get_topic_watch_store() -> TopicWatchStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TopicWatchStore(db_path("topic_watch.sqlite3"))
+    return _store